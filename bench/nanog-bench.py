@@ -0,0 +1,601 @@
+#!/usr/bin/env python3
+
+import argparse
+import contextlib
+import datetime
+import importlib.util
+import itertools
+import json
+import os
+import os.path
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# nanog-bench.py
+#
+# benchmarks over the checked-in agenda and attendee corpus:
+#
+# - agenda-*: get_agenda_tables() over each era's agendas (NANOG <= 70, >= 71)
+# - attendees-*: get_attendees_table() for each html layout in
+#   ATTENDEE_LAYOUTS, and parse_attendees_pdf() over the pdf lists
+# - gen-talk-rows, fuzzy-preso-url: the row generation over every talk
+# - nanog-merge-*, liz-merge-*: the merge tools, end to end, over synthetic
+#   datasets SCALE times the size of the archive
+#
+# each benchmark is set up once and then timed --repeat times.  --json writes
+# the results out, --compare checks them against an earlier run's JSON and
+# exits non-zero where a benchmark's median has slowed by more than
+# --max-ratio.
+#
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+import nanog_batch  # noqa: E402
+import nanog_cache  # noqa: E402
+import nanog_columnar  # noqa: E402
+import nanog_html  # noqa: E402
+import nanog_records  # noqa: E402
+
+RESULTS_VERSION = 1
+
+# synthetic merge data: the share of scraped talks in the raw speaker data,
+# and of those the share with a typo in the title
+RAW_KEPT = 0.85
+RAW_TYPOS = 0.10
+LIZ_KEPT = 0.90
+
+AGENDA_FIELDS = [
+    "NANOG",
+    "SPEAKER",
+    "AFFILIATION",
+    "TITLE",
+    "YOUTUBE",
+    "PRESO_FILES",
+    "ORIGIN",
+]
+
+LIZ_FIELDS = [
+    "NANOG",
+    "DATE",
+    "LOCATION",
+    "TALK_ORDER",
+    "SPEAKER",
+    "AFFILIATION",
+    "TITLE",
+    "TALK_TYPE",
+    "YOUTUBE",
+    "PRESO_FILES",
+    "DURATION_MIN",
+    "TAGS",
+    "ORIGIN",
+    "TOPICS",
+    "ACADEMIC",
+]
+
+
+def load_script(name):
+    """load_script - import one of the repo's (hyphenated) scripts as a module"""
+    path = os.path.join(REPO_DIR, name)
+    spec = importlib.util.spec_from_file_location(
+        name.replace("-", "_").removesuffix(".py"), path
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+def corpus_files(file_re, subdir, nanogs):
+    """corpus_files - the checked-in source files for the NANOGs, in order"""
+    files = nanog_batch.find_nanog_files(
+        os.path.join(REPO_DIR, subdir), file_re, nanogs
+    )
+
+    return [(nanog, files[nanog]) for nanog in sorted(files)]
+
+
+def time_runs(run, repeat):
+    """time_runs - wall time of repeat calls of run, in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+
+    return timings
+
+
+def summarize(name, timings, items):
+    """summarize - result entry for a benchmark's timings"""
+    return {
+        "name": name,
+        "repeat": len(timings),
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.mean(timings),
+        "stdev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "items": items,
+    }
+
+
+def agenda_benchmarks(agenda, parser, quick):
+    """agenda_benchmarks - (name, setup) for each agenda era.  setup returns
+    (run, number of items run over).
+    """
+    eras = [("agenda-le70", range(1, 71)), ("agenda-ge71", range(71, 100))]
+    for (name, nanogs) in eras:
+        files = corpus_files(agenda.AGENDA_FILE_RE, "agendas", nanogs)
+        if quick:
+            files = files[-1:]
+
+        def setup(files=files):
+            def run():
+                for (nanog, path) in files:
+                    for _ in agenda.get_agenda_tables(
+                        path, nanog, "archive.nanog.org", parser=parser
+                    ):
+                        pass
+
+            return (run, len(files))
+
+        yield (name, setup)
+
+
+def attendee_benchmarks(attendees, parser, quick):
+    """attendee_benchmarks - (name, setup) for each attendee layout"""
+    for (first, last, layout) in attendees.ATTENDEE_LAYOUTS:
+        nanogs = range(first, (last or 99) + 1)
+        files = corpus_files(attendees.ATTENDEES_FILE_RE, "attendees", nanogs)
+        if quick:
+            files = files[-1:]
+        name = f"attendees-{layout['format']}-{first}-{last or ''}".rstrip("-")
+
+        if layout["format"] == "html":
+
+            def setup(files=files, layout=layout):
+                def run():
+                    for (nanog, path) in files:
+                        attendees.get_attendees_table(path, nanog, layout, parser)
+
+                return (run, len(files))
+
+        else:
+
+            def setup(files=files, layout=layout):
+                # the tabula-java extraction is cached, the benchmark is the
+                # row handling over its output
+                tables = {
+                    path: attendees.load_pdf_tables(
+                        path, nanog_cache.DEFAULT_CACHE_DIR
+                    )
+                    for (_, path) in files
+                }
+
+                def run():
+                    for (nanog, path) in files:
+                        attendees.parse_attendees_pdf(
+                            path, nanog, layout, None, tables
+                        )
+
+                return (run, len(files))
+
+        yield (name, setup)
+
+
+def collect_talks(agenda, parser):
+    """collect_talks - the talk dicts gen_talk_rows() is handed over the whole
+    agenda archive
+    """
+    talks = []
+    gen_talk_rows = agenda.gen_talk_rows
+
+    def record(talk):
+        talks.append(talk)
+        return gen_talk_rows(talk)
+
+    agenda.gen_talk_rows = record
+    try:
+        files = corpus_files(agenda.AGENDA_FILE_RE, "agendas", range(1, 100))
+        for (nanog, path) in files:
+            for _ in agenda.get_agenda_tables(
+                path, nanog, "archive.nanog.org", parser=parser
+            ):
+                pass
+    finally:
+        agenda.gen_talk_rows = gen_talk_rows
+
+    return talks
+
+
+def talk_benchmarks(agenda, parser):
+    """talk_benchmarks - (name, setup) for the talk row generation"""
+    talks = []
+
+    def setup_rows():
+        talks.extend(collect_talks(agenda, parser))
+
+        def run():
+            for talk in talks:
+                agenda.gen_talk_rows(talk)
+
+        return (run, len(talks))
+
+    def setup_presos():
+        if not talks:
+            talks.extend(collect_talks(agenda, parser))
+        panels = [
+            t for t in talks if len(t["speakers"]) > 1 and len(t["presentation"]) > 1
+        ]
+
+        def run():
+            for talk in panels:
+                agenda.fuzzy_preso_url(talk["speakers"], talk["presentation"])
+
+        return (run, len(panels))
+
+    yield ("gen-talk-rows", setup_rows)
+    yield ("fuzzy-preso-url", setup_presos)
+
+
+def typo(rng, text):
+    """typo - text with a pair of adjacent characters swapped"""
+    if len(text) < 4:
+        return text
+    pos = rng.randrange(len(text) - 1)
+
+    return text[:pos] + text[pos + 1] + text[pos] + text[pos + 2 :]
+
+
+def write_csv(path, fields, records):
+    """write_csv - write SpeakerRecords out as fields"""
+    getter = nanog_records.row_getter(fields)
+    with contextlib.ExitStack() as stack:
+        write = nanog_columnar.table_writer(stack, path, fields)
+        write(map(getter, records))
+
+
+def synthetic_datasets(data_dir, agenda_rows, scale, seed=1):
+    """synthetic_datasets - merge tool inputs built from the scraped agenda
+    rows, repeated scale times over (NANOG 100 + n for the second copy, etc.).
+
+    :data_dir: directory to write the datasets to
+    :agenda_rows: the agenda rows for the whole archive
+    :scale: number of copies of the archive
+    :seed: random seed, the datasets are the same for the same seed
+    :returns: dict of the dataset paths
+
+    """
+    rng = random.Random(seed)
+    paths = {
+        kind: os.path.join(data_dir, f"{kind}-{scale}.csv")
+        for kind in ["scraped", "raw", "gsd", "liz", "dates"]
+    }
+
+    scraped = []
+    raw = []
+    gsd = []
+    liz = []
+    dates = []
+    for copy in range(scale):
+        order = {}
+        for row in agenda_rows:
+            nanog = int(row[0]) + 100 * copy
+            if nanog not in order:
+                order[nanog] = 0
+                dates.append(
+                    nanog_records.SpeakerRecord(
+                        nanog=nanog, date=f"{nanog % 12 + 1:02d}/1999", location="X"
+                    )
+                )
+            order[nanog] += 1
+
+            talk = nanog_records.SpeakerRecord(
+                nanog=nanog,
+                speaker=row[1],
+                affiliation=row[2],
+                title=row[3],
+                youtube=row[4],
+                preso_files=row[5],
+                origin=row[6],
+            )
+            scraped.append(talk)
+
+            record = nanog_records.overlay(
+                talk,
+                nanog_records.SpeakerRecord(
+                    talk_order=str(order[nanog]),
+                    talk_type="talk",
+                    duration_min="30",
+                    origin="gdrive",
+                ),
+            )
+            gsd.append(record)
+            if rng.random() < RAW_KEPT:
+                raw_record = record.copy()
+                if rng.random() < RAW_TYPOS:
+                    raw_record.title = typo(rng, raw_record.title)
+                raw.append(raw_record)
+            if rng.random() < LIZ_KEPT:
+                tagged = record.copy()
+                tagged.tags = rng.choice(["routing", "security", "peering", ""])
+                tagged.academic = rng.choice(["TRUE", "FALSE"])
+                liz.append(tagged)
+
+    write_csv(paths["scraped"], AGENDA_FIELDS, scraped)
+    write_csv(paths["raw"], nanog_records.MERGED_FIELDS, raw)
+    write_csv(paths["gsd"], nanog_records.MERGED_FIELDS, gsd)
+    write_csv(paths["liz"], LIZ_FIELDS, liz)
+    write_csv(paths["dates"], ["NANOG", "DATE", "LOCATION"], dates)
+
+    return (paths, len(scraped))
+
+
+def run_script(args):
+    """run_script - run one of the repo's scripts, output discarded"""
+    subprocess.run(
+        [sys.executable] + args,
+        cwd=REPO_DIR,
+        stdout=subprocess.DEVNULL,
+        check=True,
+    )
+
+
+def merge_benchmarks(agenda, parser, scales, data_dir):
+    """merge_benchmarks - (name, setup) for the merge tools at each scale"""
+    agenda_rows = []
+
+    def rows():
+        if not agenda_rows:
+            files = corpus_files(agenda.AGENDA_FILE_RE, "agendas", range(1, 100))
+            for (nanog, path) in files:
+                agenda_rows.extend(
+                    agenda.get_agenda_tables(
+                        path, nanog, "archive.nanog.org", parser=parser
+                    )
+                )
+        return agenda_rows
+
+    for scale in scales:
+        datasets = {}
+
+        def dataset(scale=scale, datasets=datasets):
+            if not datasets:
+                datasets.update(synthetic_datasets(data_dir, rows(), scale)[0])
+                datasets["items"] = len(rows()) * scale
+            return datasets
+
+        for engine in ["search", "matrix"]:
+
+            def setup(engine=engine, dataset=dataset):
+                paths = dataset()
+                out = os.path.join(data_dir, "merged.csv")
+
+                def run():
+                    run_script(
+                        [
+                            "nanog-merge.py",
+                            "--raw-speaker-data",
+                            paths["raw"],
+                            "--scraped-speaker-data",
+                            paths["scraped"],
+                            "--nanog-dates-locs",
+                            paths["dates"],
+                            "--merged-csv-out",
+                            out,
+                            "--engine",
+                            engine,
+                        ]
+                    )
+
+                return (run, paths["items"])
+
+            yield (f"nanog-merge-{engine}-{scale}x", setup)
+
+        def setup_liz(dataset=dataset):
+            paths = dataset()
+            out = os.path.join(data_dir, "tagged.csv")
+
+            def run():
+                run_script(
+                    [
+                        "liz-merge.py",
+                        "--gsd",
+                        paths["gsd"],
+                        "--liz",
+                        paths["liz"],
+                        "--out",
+                        out,
+                    ]
+                )
+
+            return (run, paths["items"])
+
+        yield (f"liz-merge-{scale}x", setup_liz)
+
+
+def git_commit():
+    """git_commit - the repo's current commit, None outside of a checkout"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=REPO_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(results, baseline_file, max_ratio):
+    """compare_results - add each result's ratio to its baseline median
+
+    :results: list of result entries
+    :baseline_file: JSON results of an earlier run
+    :max_ratio: slow down (median / baseline median) counted as a regression
+    :returns: list of the names of the regressed benchmarks
+
+    """
+    with open(baseline_file, "r", encoding="utf-8") as f:
+        baseline = {r["name"]: r for r in json.load(f)["results"]}
+
+    regressions = []
+    for result in results:
+        base = baseline.get(result["name"])
+        if base is None or "median" not in base or "median" not in result:
+            continue
+        result["ratio"] = result["median"] / base["median"]
+        if result["ratio"] > max_ratio:
+            regressions.append(result["name"])
+
+    return regressions
+
+
+def print_results(results):
+    """print_results - a line per benchmark"""
+    print(f"{'benchmark':<28} {'median':>10} {'min':>10} {'stdev':>9} {'items':>7}")
+    for r in results:
+        if "skipped" in r:
+            print(f"{r['name']:<28} skipped: {r['skipped']}")
+            continue
+        line = (
+            f"{r['name']:<28} {r['median']:>9.3f}s {r['min']:>9.3f}s "
+            f"{r['stdev']:>8.3f}s {r['items']:>7}"
+        )
+        if "ratio" in r:
+            line += f"  x{r['ratio']:.2f}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--filter",
+        help="only run the benchmarks whose name matches this regex",
+        dest="name_filter",
+        action="store",
+        required=False,
+    )
+    parser.add_argument(
+        "--repeat",
+        help="timed runs per benchmark",
+        dest="repeat",
+        action="store",
+        type=int,
+        default=3,
+        required=False,
+    )
+    parser.add_argument(
+        "--scales",
+        help="comma separated sizes of the synthetic merge datasets, as "
+        "multiples of the archive",
+        dest="scales",
+        action="store",
+        default="10,100",
+        required=False,
+    )
+    parser.add_argument(
+        "--quick",
+        help="smoke test: one file per era / layout, 1x merge data, one run",
+        dest="quick",
+        action="store_true",
+        required=False,
+    )
+    parser.add_argument(
+        "--parser",
+        help="HTML parser backend (default: fastest installed)",
+        dest="html_parser",
+        action="store",
+        choices=nanog_html.PARSERS,
+        default=nanog_html.DEFAULT_PARSER,
+        required=False,
+    )
+    parser.add_argument(
+        "--json",
+        help="write the results to this JSON file",
+        dest="json_file",
+        action="store",
+        required=False,
+    )
+    parser.add_argument(
+        "--compare",
+        help="JSON results of an earlier run to compare against",
+        dest="baseline_file",
+        action="store",
+        required=False,
+    )
+    parser.add_argument(
+        "--max-ratio",
+        help="with --compare, the slow down counted as a regression (default 1.2)",
+        dest="max_ratio",
+        action="store",
+        type=float,
+        default=1.2,
+        required=False,
+    )
+    args = parser.parse_args()
+
+    repeat = args.repeat
+    scales = [int(s) for s in args.scales.split(",")]
+    if args.quick:
+        repeat = 1
+        scales = [1]
+
+    agenda = load_script("nanog-agenda.py")
+    attendees = load_script("nanog-attendees.py")
+
+    results = []
+    with tempfile.TemporaryDirectory() as data_dir:
+        benchmarks = itertools.chain(
+            agenda_benchmarks(agenda, args.html_parser, args.quick),
+            attendee_benchmarks(attendees, args.html_parser, args.quick),
+            talk_benchmarks(agenda, args.html_parser),
+            merge_benchmarks(agenda, args.html_parser, scales, data_dir),
+        )
+        for (name, setup) in benchmarks:
+            if args.name_filter and not re.search(args.name_filter, name):
+                continue
+
+            print(f"running {name}", file=sys.stderr)
+            try:
+                (run, items) = setup()
+            except Exception as e:  # e.g. no tabula-java for the pdfs
+                results.append({"name": name, "skipped": f"{type(e).__name__}: {e}"})
+                continue
+            results.append(summarize(name, time_runs(run, repeat), items))
+
+    regressions = []
+    if args.baseline_file:
+        regressions = compare_results(results, args.baseline_file, args.max_ratio)
+
+    print_results(results)
+
+    if args.json_file:
+        output = {
+            "version": RESULTS_VERSION,
+            "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "parser": nanog_html.parser_stamp(args.html_parser),
+            "repeat": repeat,
+            "results": results,
+        }
+        with open(args.json_file, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+
+    if regressions:
+        print(f"regressions (> x{args.max_ratio}): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
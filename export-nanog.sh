@@ -8,6 +8,9 @@ usage() {
 usage: ${0##*/} [-h]
     -h          display help and exit
 
+set NANOG_PROFILE=cprofile (or sampling) to profile the exports, the profile
+is written next to the CSV.
+
 EOF
 }
 
@@ -15,46 +18,35 @@ EOF
 # for the agendas in the range noted export the associated CSVs
 ## export-agendas: output the agenda formats we know of
 export-agendas() {
-  local AGENDA_HEADER="NANOG,SPEAKER,AFFILIATION,TITLE,YOUTUBE,PRESO_FILES,ORIGIN"
   local AGENDA_START=13
   local AGENDA_END=76
-  for (( i = AGENDA_START; i <= AGENDA_END; i++ ))
-  do
-    echo "scraping agenda: NANOG $i"
-    nanog-agenda.py --nanog "$i" --url archive.nanog.org \
-      --csv "csv/nanog-$i-agenda.csv" "agendas/nanog$i-agenda.html"
-  done
-
-  echo "consolidating NANOG agendas"
-  echo "${AGENDA_HEADER}" >  agendas-$AGENDA_START-$AGENDA_END.csv
-  cat csv/*-agenda.csv >> agendas-$AGENDA_START-$AGENDA_END.csv
-  echo "removing scratch agenda CSVs"
-  rm -f csv/*-agenda.csv
+  echo "scraping NANOG agendas: $AGENDA_START-$AGENDA_END"
+  nanog-agenda.py --range "$AGENDA_START-$AGENDA_END" --glob agendas/ \
+    --jobs "$(getconf _NPROCESSORS_ONLN)" --url archive.nanog.org \
+    --csv "agendas-$AGENDA_START-$AGENDA_END.csv" --incremental \
+    ${NANOG_PROFILE:+--profile="$NANOG_PROFILE"}
 }
 
 ## export-attendees: output the attendee lists
 export-attendees() {
   local ATT_START=12
   local ATT_END=63
-  local ATT_HTML_END=60
-  for (( i = ATT_START; i <= ATT_HTML_END; i++ ))
-  do
-    echo "scraping attendees: NANOG $i"
-    nanog-attendees.py --nanog "$i" \
-      --csv "csv/nanog-$i-attendees.csv" "attendees/nanog$i-attendees.html"
-  done
-
-  for i in 61 62 63
-  do
-    echo "scraping attendees: NANOG $i (pdf)"
-    nanog-attendees.py --nanog "$i" \
-      --csv "csv/nanog-$i-attendees.csv" "attendees/nanog$i-attendees.pdf"
-  done
+  # html lists through NANOG 60, pdfs after that.  the pdfs share a single
+  # tabula-java run.  --incremental only re-parses the lists which are new or
+  # have changed since the last export.
+  echo "scraping NANOG attendees: $ATT_START-$ATT_END"
+  nanog-attendees.py --range "$ATT_START-$ATT_END" --glob attendees/ \
+    --csv "attendees-$ATT_START-$ATT_END.csv" --incremental \
+    ${NANOG_PROFILE:+--profile="$NANOG_PROFILE"}
+}
 
-  echo "consolidating NANOG attendees"
-  cat csv/*-attendees.csv > "attendees-$ATT_START-$ATT_END.csv"
-  echo "removing scratch attendee CSVs"
-  rm -f csv/*-attendees.csv
+## export-attendee-ids: add person ids to the attendee lists
+export-attendee-ids() {
+  local ATT_START=12
+  local ATT_END=63
+  echo "resolving NANOG attendees: $ATT_START-$ATT_END"
+  nanog-attendee-ids.py --attendees "attendees-$ATT_START-$ATT_END.csv" \
+    --out "attendees-ids-$ATT_START-$ATT_END.csv"
 }
 
 # anything that has ## at the front of the line will be used as input.
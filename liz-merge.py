@@ -1,9 +1,18 @@
 #!/usr/bin/env python3
 
 import argparse
-import csv
+import contextlib
 import operator
+import os.path
 import re
+import sys
+
+import nanog_columnar
+import nanog_profile
+import nanog_records
+import nanog_stream
+import nanog_trace
+import nanog_youtube
 
 # liz-merge.py
 #
@@ -23,53 +32,37 @@ import re
 # if these are identical across records grab the tags and the keywords from
 # liz's copy and merge into an output that is indexed uniquely based on the
 # record number
+#
+# liz's copy is loaded into a dict keyed on the composite key, so each of the
+# golden records is a single lookup.  the golden records are streamed through
+# a NANOG at a time.  golden records without a match in liz's
+# copy, and composite keys which appear more than once in liz's copy, are
+# reported in a side file.
+#
+# records are nanog_records.SpeakerRecords, exported as
+# nanog_records.TAGGED_FIELDS.
 
 
-# this assumes that the gsd and the ssd structures have some common fields
-BLANK_ENTRY = {  # template blank speaker entry
-    "INDEX": 0,
-    "NANOG": "",
-    "DATE": "",
-    "LOCATION": "",
-    "TALK_ORDER": "",
-    "SPEAKER": "",
-    "AFFILIATION": "",
-    "TITLE": "",
-    "TALK_TYPE": "",
-    "YOUTUBE": "",
-    "PRESO_FILES": "",
-    "DURATION_MIN": "",
-    "TAGS": "",
-    "TOPICS": "",
-    "ACADEMIC": "",
-    "ORIGIN": "",
-}
-
 # dict to store per-NANOG breakdown of speakers
 PER_NANOG_SPEAKERS = {}
 
 # dict to store dict of NANOG dates and locations, keyed by NANOG
 NANOG_INFO = {}
 
-CSV_FIELDS = [  # csv export fields in order
-    "INDEX",
+ISSUE_FIELDS = [  # join issue report fields in order
+    "ISSUE",
     "NANOG",
-    "DATE",
-    "LOCATION",
-    "TALK_ORDER",
     "SPEAKER",
-    "AFFILIATION",
     "TITLE",
-    "TALK_TYPE",
-    "YOUTUBE",
-    "PRESO_FILES",
-    "DURATION_MIN",
-    "TAGS",
-    "TOPICS",
-    "ACADEMIC",
-    "ORIGIN",
+    "COUNT",
 ]
 
+# functions timed with --timings, see nanog_trace
+TRACE_STAGES = {
+    "index_rows": "index build",
+    "merge_speaker": "row generation",
+}
+
 
 def strip_html(data):
     """quick and dirty HTML tag stripping for titles."""
@@ -77,45 +70,67 @@ def strip_html(data):
     return re.sub(tag_re, "", data)
 
 
-def load_csv(csv_in: str) -> list:
-    """load_csv"""
-    csv_list = list()
-    with open(csv_in, "rt", newline="") as csvfile:
-        csv_reader = csv.DictReader(csvfile)
-        for row in csv_reader:
-            row["NANOG"] = int(row["NANOG"])  # make this a real int
-            csv_list.append(row)
-
-    return csv_list
+def composite_key(row):
+    """composite_key - the (NANOG, SPEAKER, TITLE) key records are joined on"""
+    return (row.nanog, row.speaker, row.title)
 
 
-def write_csv(csvfile_out, fields, dataset):
-    """write_csv - pretty self-evident
+def index_rows(rows):
+    """index_rows - build the lookup table for the join
 
-    :csvfile_out: path to the csv file to export
-    :fields: list of the fieldnames to export
-    :data: LoD with the rows to be written
-    :returns: nothing
+    :rows: SpeakerRecords to index
+    :returns: dict of record lists keyed on composite_key(), rows in their original
+              order
 
     """
-    with open(csvfile_out, "w", newline="") as csvout:
-        writer = csv.DictWriter(csvout, fieldnames=fields)
-        writer.writeheader()
-        export_index = 0
-        for row in dataset:
-            export_index += 1
-            row["INDEX"] = export_index
-            writer.writerow(row)
+    index = {}
+    for row in rows:
+        index.setdefault(composite_key(row), []).append(row)
+
+    return index
 
-    return
 
+def merge_speaker(gsd_spkr, lsd_index, issues_writer):
+    """merge_speaker - merge the tags from liz's copy into a golden record
 
-def normalize_youtube(url):
-    url_re = re.compile(r"(?:v=|be/)(.*?)(?:\&|\?|$)")
-    m = url_re.search(url)
+    :gsd_spkr: golden speaker record (SpeakerRecord)
+    :lsd_index: index_rows() over liz's copy
+    :issues_writer: DictWriter to report a miss to
+    :returns: merged SpeakerRecord
 
-    if m:
-        return "http://youtube.com/watch?v=" + m.group(1)
+    """
+    tmp_spkr = nanog_records.overlay(gsd_spkr)
+    tmp_spkr.title = strip_html(gsd_spkr.title)
+
+    # the first of liz's records wins where a key is duplicated
+    tag_speakers = lsd_index.get(composite_key(gsd_spkr))
+    if tag_speakers is None:
+        print(
+            f'no tagged entry: {gsd_spkr.nanog}: '
+            f'{gsd_spkr.speaker} - {gsd_spkr.title}'
+        )
+        nanog_trace.count("no tagged entry")
+        issues_writer.writerow(
+            {
+                "ISSUE": "miss",
+                "NANOG": gsd_spkr.nanog,
+                "SPEAKER": gsd_spkr.speaker,
+                "TITLE": gsd_spkr.title,
+                "COUNT": 0,
+            }
+        )
+    else:
+        tag_speaker = tag_speakers[0]
+        tmp_spkr.tags = tag_speaker.tags
+        tmp_spkr.topics = tag_speaker.topics
+        tmp_spkr.academic = tag_speaker.academic
+        tmp_spkr.affiliation = tag_speaker.affiliation
+        tmp_spkr.talk_type = tag_speaker.talk_type
+
+    if tmp_spkr.youtube != "":
+        tmp_spkr.youtube = nanog_youtube.normalize_youtube(tmp_spkr.youtube)
+
+    return tmp_spkr
 
 
 def main():
@@ -123,60 +138,81 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--gsd",
-        help="golden speaker data csv",
+        help="golden speaker data csv (or .parquet / .arrow)",
         dest="gsd_csv",
         action="store",
         required=True,
     )
     parser.add_argument(
         "--liz",
-        help="liz speaker data csv",
+        help="liz speaker data csv (or .parquet / .arrow)",
         dest="liz_csv",
         action="store",
         required=True,
     )
     parser.add_argument(
         "--out",
-        help="merged export csv",
+        help="merged export csv (or .parquet / .arrow)",
         dest="merged_csv",
         action="store",
         required=True,
     )
+    parser.add_argument(
+        "--issues",
+        help="csv to report join misses / duplicate keys (default: OUT-issues.csv)",
+        dest="issues_csv",
+        action="store",
+        required=False,
+    )
+    nanog_trace.add_arguments(parser)
+    nanog_profile.add_arguments(parser)
     args = parser.parse_args()
 
-    gsd = load_csv(args.gsd_csv)
-    lsd = load_csv(args.liz_csv)
-
-    merged_speakers = []  # merged entries
-
-    for gsd_spkr in gsd:
-        tmp_spkr = BLANK_ENTRY.copy()
-        tmp_spkr.update(gsd_spkr)
-        tmp_spkr.pop("KEYWORDS")
-
-        # inefficient, but effective in our case
-        tag_speaker = [
-            liz_spkr
-            for liz_spkr in lsd
-            if liz_spkr["NANOG"] == gsd_spkr["NANOG"]
-            and liz_spkr["SPEAKER"] == gsd_spkr["SPEAKER"]
-            and liz_spkr["TITLE"] == gsd_spkr["TITLE"]
-        ][0]
-        tmp_spkr["TITLE"] = strip_html(gsd_spkr["TITLE"])
-        tmp_spkr["TAGS"] = tag_speaker["TAGS"]
-        tmp_spkr["TOPICS"] = tag_speaker["TOPICS"]
-        tmp_spkr["ACADEMIC"] = tag_speaker["ACADEMIC"]
-        tmp_spkr["AFFILIATION"] = tag_speaker["AFFILIATION"]
-        tmp_spkr["TALK_TYPE"] = tag_speaker["TALK_TYPE"]
-        if tmp_spkr["YOUTUBE"] != "":
-            tmp_spkr["YOUTUBE"] = normalize_youtube(tmp_spkr["YOUTUBE"])
-
-        merged_speakers.append(tmp_spkr)
-
-    # sort based on NANOG, then speaker for export
-    merged_speakers.sort(key=operator.itemgetter("NANOG", "TALK_ORDER", "SPEAKER"))
-
-    write_csv(args.merged_csv, CSV_FIELDS, merged_speakers)
+    nanog_trace.start(args, sys.modules[__name__], nanog_columnar)
+    nanog_profile.start(args, args.merged_csv, __file__)
+
+    lsd_index = index_rows(nanog_stream.iter_csv(args.liz_csv))
+
+    issues_csv = args.issues_csv
+    if not issues_csv:
+        issues_csv = os.path.splitext(args.merged_csv)[0] + "-issues.csv"
+
+    with contextlib.ExitStack() as stack:
+        write_merged = nanog_stream.record_writer(
+            stack, args.merged_csv, nanog_records.TAGGED_FIELDS
+        )
+        issues_writer = nanog_stream.dict_writer(stack, issues_csv, ISSUE_FIELDS)
+
+        for (key, rows) in lsd_index.items():
+            if len(rows) > 1:
+                issues_writer.writerow(
+                    {
+                        "ISSUE": "duplicate",
+                        "NANOG": key[0],
+                        "SPEAKER": key[1],
+                        "TITLE": key[2],
+                        "COUNT": len(rows),
+                    }
+                )
+
+        # the golden data is streamed through a NANOG at a time, and each
+        # NANOG's merged records written out as soon as it's done
+        export_index = 0
+        for (_, gsd) in nanog_stream.nanog_groups(args.gsd_csv):
+            merged_speakers = []  # merged entries
+            for gsd_spkr in gsd:
+                merged_speakers.append(
+                    merge_speaker(gsd_spkr, lsd_index, issues_writer)
+                )
+
+            # sort based on NANOG, then speaker for export
+            merged_speakers.sort(
+                key=operator.attrgetter("nanog", "talk_order", "speaker")
+            )
+            for tmp_spkr in merged_speakers:
+                export_index += 1
+                tmp_spkr.index = export_index
+            write_merged(merged_speakers)
 
 
 if __name__ == "__main__":
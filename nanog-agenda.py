@@ -1,19 +1,76 @@
 #!/usr/bin/env python3
 
 import argparse
-import csv
+import collections
+import contextlib
+import multiprocessing
 import pprint
 import re
+import sys
 
-from bs4 import BeautifulSoup
 from thefuzz import process
 
-NANOG_NUM = 0
-URL_BASE = ""
+import nanog_batch
+import nanog_cache
+import nanog_columnar
+import nanog_filter
+import nanog_html
+import nanog_layouts
+import nanog_manifest
+import nanog_profile
+import nanog_trace
+
+# default source of the agendas, overridden with --origin
 ORIGIN = "archive.nanog.org"
 
-
-def extract_speaker(speaker_cell, nanog):
+# parse cache entries are invalidated whenever the scraping code (or the skip
+# rules) changes
+CODE_STAMP = nanog_cache.code_stamp(
+    __file__,
+    nanog_html.__file__,
+    nanog_layouts.__file__,
+    nanog_filter.__file__,
+    nanog_filter.DEFAULT_RULES,
+)
+
+# header for the consolidated agenda CSV
+AGENDA_HEADER = [
+    "NANOG",
+    "SPEAKER",
+    "AFFILIATION",
+    "TITLE",
+    "YOUTUBE",
+    "PRESO_FILES",
+    "ORIGIN",
+]
+
+# agenda files are named nanog##-agenda.html, with some historic variations in
+# case (NANOG20-agenda.html, etc.)
+AGENDA_FILE_RE = re.compile(r"^nanog(\d+)-agenda\.html$", re.IGNORECASE)
+
+# title clean up
+WHITESPACE_RE = re.compile(r"[\n\r\t]")
+ESCAPE_SLASH_RE = re.compile(r"\\")  # these seem to have escaped
+
+# presentation cell links
+VIDEO_URL_RE = re.compile(r"https://.*youtu|\.ram")
+PRESO_URL_RE = re.compile(r"\.(ppt|pdf)")
+
+# the breaks, lunches, etc. which aren't talks, see nanog_filter
+SKIP_RULES = nanog_filter.compile_rules(nanog_filter.load_rules())
+
+# per rule count of the agenda entries skipped by this process
+SKIP_HITS = collections.Counter()
+
+# functions timed with --timings, see nanog_trace
+TRACE_STAGES = {
+    "process_agenda_table": "table walk",
+    "gen_talk_rows": "row generation",
+    "fuzzy_preso_url": "fuzzy scoring",
+}
+
+
+def extract_speaker(speaker_cell, speaker_tag):
     """
     sample speaker cell: NANOG <= 70
     ------------------
@@ -39,15 +96,11 @@ def extract_speaker(speaker_cell, nanog):
     </dl>
     </td>
 
+    the speakers are the cell's speaker_tag elements, li or dd per the layout.
     """
 
     speakers = []
-    if nanog <= 70:
-        speaker_list = speaker_cell.find_all("li")
-    else:
-        speaker_list = speaker_cell.find_all("dd")
-
-    for s in speaker_list:
+    for s in speaker_cell.find_all(speaker_tag):
         # remove trailing punctuation
 
         strip_elements = ". "
@@ -68,34 +121,39 @@ def extract_speaker(speaker_cell, nanog):
     return speakers
 
 
-def extract_title(abstract_cell, nanog):
+def extract_legacy_title(abstract_cell):
     """
-    returns the extracted title from the legacy agendas
+    returns the extracted title from the legacy agendas (NANOG <= 70)
     """
-    title = ""
-
-    if nanog <= 70:
-        # seems to cover all the bases
-        toggled_title = abstract_cell.find("h3", attrs={"class": "txttoggle_action"})
-        if toggled_title:
-            title = toggled_title.text.strip()
-        else:
-            title = abstract_cell.text.strip()
+    # seems to cover all the bases
+    toggled_title = abstract_cell.find("h3", attrs={"class": "txttoggle_action"})
+    if toggled_title:
+        title = toggled_title.text.strip()
     else:
-        # the text up to the anchor holding the abstract is the title
-        first_anchor = abstract_cell.find("a")
-        title = first_anchor.previousSibling.strip()
+        title = abstract_cell.text.strip()
+
+    return clean_title(title)
 
-    whitespace_re = re.compile(r"[\n\r\t]")
-    title = whitespace_re.sub(" ", title)
 
-    escape_slash_re = re.compile(r"\\")  # these seem to have escaped
-    title = escape_slash_re.sub("", title)
+def extract_title(abstract_cell):
+    """
+    returns the extracted title from the current agendas (NANOG >= 71), the
+    text up to the anchor holding the abstract
+    """
+    first_anchor = abstract_cell.find("a")
+
+    return clean_title(first_anchor.previousSibling.strip())
+
+
+def clean_title(title):
+    """clean_title - flattens the whitespace and drops stray escapes"""
+    title = WHITESPACE_RE.sub(" ", title)
+    title = ESCAPE_SLASH_RE.sub("", title)
 
     return title
 
 
-def extract_presentation(preso, nanog):
+def extract_presentation(preso, nanog, url_base):
     """
     sample presentation cell
     <td><img alt="youtube" height="12" src="/images/doc_icons/youtube_icon.gif"/><a
@@ -107,7 +165,7 @@ def extract_presentation(preso, nanog):
 
     pull the video links from the cell as well as the URL for the presentation.
     if the presentation url does not start with "http" create the URL from the
-    URL_BASE.
+    url_base.
 
     """
 
@@ -119,13 +177,13 @@ def extract_presentation(preso, nanog):
         url = link.get("href")
         # these seem to have some form of shortened url, but this substring
         # matches
-        if re.search("https://.*youtu|\.ram", url):
+        if VIDEO_URL_RE.search(url):
             video_urls.append(url)
-        if re.search("\.(ppt|pdf)", url):
-            if re.search("^http", url):
+        if PRESO_URL_RE.search(url):
+            if url.startswith("http"):
                 preso_urls.append(url)
             else:
-                preso_urls.append("https://" + URL_BASE + url)
+                preso_urls.append("https://" + url_base + url)
 
     return (video_urls, preso_urls)
 
@@ -208,28 +266,24 @@ def gen_talk_rows(talk):
     # do something reasonable here and aren't suppressing hackathon readouts,
     # etc.
     #
-    # so. many. lunch variations
-    if re.search(
-        "(break|breakfast|beer|social event|hackathon|espresso bar"
-        "|refreshments|vendor collaboration room|pgp key"
-        "|(newcomers|monday|tuesday|welcome|open) lunch|^lunch$|^social|cocktail)",
-        talk["title"],
-        re.IGNORECASE,
-    ) and (video == "" and presos == ""):
-        talk_info = None
-        return
-
-    # there are some sneaky speaker variations for some agenda items.
-    for _s in talk["speakers"]:
-        if re.search("(on your own|^sponsor)", _s[0],
-                     re.IGNORECASE,) and (video == "" and presos == ""):
-            talk_info = None
+    # so. many. lunch variations, see data/agenda-skip-rules.csv.  there are
+    # some sneaky speaker variations for some agenda items too, each speaker
+    # is checked in turn.
+    if video == "" and presos == "":
+        rule = nanog_filter.match_rule(SKIP_RULES, "title", talk["title"])
+        if rule is None:
+            for _s in talk["speakers"]:
+                rule = nanog_filter.match_rule(SKIP_RULES, "speaker", _s[0])
+                if rule is not None:
+                    break
+        if rule is not None:
+            SKIP_HITS[rule] += 1
             return
 
     if len(talk["speakers"]) > 1 and unroll_presentations:
         for s in talk["speakers"]:
             row = [
-                NANOG_NUM,
+                talk["nanog"],
                 s[0],
                 s[1],
                 talk["title"],
@@ -241,7 +295,7 @@ def gen_talk_rows(talk):
     elif len(talk["speakers"]) > 1 and not unroll_presentations:
         for s in talk["speakers"]:
             row = [
-                NANOG_NUM,
+                talk["nanog"],
                 s[0],
                 s[1],
                 talk["title"],
@@ -252,7 +306,7 @@ def gen_talk_rows(talk):
             talk_info.append(row)
     elif len(talk["speakers"]) == 1:
         row = [
-            NANOG_NUM,
+            talk["nanog"],
             talk["speakers"][0][0],
             talk["speakers"][0][1],
             talk["title"],
@@ -267,7 +321,53 @@ def gen_talk_rows(talk):
     return talk_info
 
 
-def process_agenda_table(agenda_table, nanog):
+def legacy_presentations(td, nanog, url_base):
+    """legacy_presentations - (videos, presentations) for a NANOG <= 70 agenda
+    row, both are in the one cell.
+    """
+    return extract_presentation(td[4], nanog, url_base)
+
+
+def current_presentations(td, nanog, url_base):
+    """current_presentations - (videos, presentations) for a NANOG >= 71 agenda
+    row, each has a cell of its own.
+    """
+    (videos, _) = extract_presentation(td[3], nanog, url_base)
+    (_, presos) = extract_presentation(td[4], nanog, url_base)
+
+    return (videos, presos)
+
+
+# agenda layouts by era, see nanog_layouts
+AGENDA_LAYOUTS = nanog_layouts.registry(
+    (
+        1,
+        70,
+        {
+            "table_attrs": {"class": "table_agenda sticky-enabled"},
+            "speaker_cell": 3,
+            "speaker_tag": "li",
+            "title_cell": 2,
+            "title": extract_legacy_title,
+            "presentations": legacy_presentations,
+        },
+    ),
+    (
+        71,
+        None,
+        {
+            "table_attrs": {},
+            "speaker_cell": 2,
+            "speaker_tag": "dd",
+            "title_cell": 2,
+            "title": extract_title,
+            "presentations": current_presentations,
+        },
+    ),
+)
+
+
+def process_agenda_table(agenda_table, nanog, url_base, origin, layout):
     # heading = []
     # for th in agenda_table.find_all("th"):
     #     heading.append(th.text.strip())
@@ -280,11 +380,15 @@ def process_agenda_table(agenda_table, nanog):
     #
     # agenda fields: nango 71+
     # ['Time', 'Location', 'Topic', 'Video Files', 'Presentation Files']
+    #
+    # rows are yielded as each talk is processed, the cells are picked out per
+    # the era's layout
 
-    # importing this here for consistency
-    global ORIGIN
-
-    nanog_talks = []
+    speaker_cell = layout["speaker_cell"]
+    speaker_tag = layout["speaker_tag"]
+    title_cell = layout["title_cell"]
+    extract_title_cell = layout["title"]
+    extract_presentations = layout["presentations"]
 
     rows = agenda_table.find_all("tr")
     for tr in rows:
@@ -292,66 +396,215 @@ def process_agenda_table(agenda_table, nanog):
         if len(td) < 2:
             continue
 
-        if nanog <= 70:
-            # the following works up to NANOG 70
-            (videos, presos) = extract_presentation(td[4], nanog)
-            talk = {
-                "speakers": extract_speaker(td[3], nanog),
-                "title": extract_title(td[2], nanog),
-                "timeslot": td[0].text.strip(),
-                "presentation": presos,
-                "video": videos,
-                "origin": ORIGIN,
-            }
-        else:
-            (videos, _) = extract_presentation(td[3], nanog)
-            (_, presos) = extract_presentation(td[4], nanog)
-            talk = {
-                "speakers": extract_speaker(td[2], nanog),
-                "title": extract_title(td[2], nanog),
-                "timeslot": td[0].text.strip(),
-                "presentation": presos,
-                "video": videos,
-                "origin": ORIGIN,
-            }
+        (videos, presos) = extract_presentations(td, nanog, url_base)
+        talk = {
+            "nanog": nanog,
+            "speakers": extract_speaker(td[speaker_cell], speaker_tag),
+            "title": extract_title_cell(td[title_cell]),
+            "timeslot": td[0].text.strip(),
+            "presentation": presos,
+            "video": videos,
+            "origin": origin,
+        }
 
         talk_row = gen_talk_rows(talk)
         if talk_row is not None:
-            for r in talk_row:
-                nanog_talks.append(r)
-
-    return nanog_talks
+            yield from talk_row
 
 
-def get_agenda_tables(agenda_file, nanog):
-    with open(agenda_file) as a_file:
-        soup = BeautifulSoup(a_file, "html.parser")
-
+def get_agenda_tables(
+    agenda_file, nanog, url_base, origin=ORIGIN, parser=nanog_html.DEFAULT_PARSER
+):
     # NANOG specific overrides
-    table_attr = {}
-    if nanog <= 70:
-        table_attr = {"class": "table_agenda sticky-enabled"}
+    layout = nanog_layouts.resolve(AGENDA_LAYOUTS, nanog)
+    table_attr = layout["table_attrs"]
 
+    # only the agenda tables are of interest, skip building the rest of the page
+    soup = nanog_html.load_soup(agenda_file, parser, table_attr)
     agenda_tables = soup.find_all("table", attrs=table_attr)
 
-    export_talks = []
     for agenda in agenda_tables:
-        talks = process_agenda_table(agenda, nanog)
-        export_talks.extend(talks)
+        yield from process_agenda_table(agenda, nanog, url_base, origin, layout)
+
+
+def init_worker(trace_settings, profile_settings):
+    """init_worker - pool initializer, carries --timings and --profile over to
+    workers which don't inherit them (the spawn and forkserver start methods).
+    these workers run the script as __mp_main__ from a copy of its globals, so
+    it's the globals the functions see which are instrumented, not the module.
+    """
+    nanog_trace.init_worker(trace_settings, globals(), nanog_cache, nanog_columnar)
+    nanog_profile.init_worker(profile_settings)
+
+
+def parse_agenda_task(task):
+    """parse_agenda_task - worker entry point for parsing a single agenda.
+    rows are served from the parse cache when the agenda is unchanged.
+
+    :task: tuple of (agenda_file, nanog, url_base, origin, parser, cache_dir).
+           everything the parse needs travels with the task, nothing is taken
+           from process state.
+    :returns: tuple of (nanog, list of agenda rows, skip rule hit counts, stage
+              timings (see nanog_trace.take()), profile (see
+              nanog_profile.take()))
+
+    """
+    SKIP_HITS.clear()  # this worker's counts for this agenda alone
+    rows = nanog_profile.call(lambda: list(agenda_rows(task)))
+
+    return (task[1], rows, dict(SKIP_HITS), nanog_trace.take(), nanog_profile.take())
+
+
+def agenda_rows(task):
+    """agenda_rows - yields the rows for a single agenda as they're parsed (or
+    read back from the parse cache).
+
+    :task: see parse_agenda_task()
+    :returns: generator of agenda rows
+
+    """
+    (agenda_file, nanog, url_base, origin, parser, cache_dir) = task
+
+    return nanog_cache.stream_rows(
+        cache_dir,
+        agenda_file,
+        CODE_STAMP,
+        agenda_params(nanog, url_base, origin, parser),
+        lambda: get_agenda_tables(agenda_file, nanog, url_base, origin, parser),
+    )
+
+
+def agenda_params(nanog, url_base, origin, parser):
+    """agenda_params - the parameters, beyond the agenda itself, which the
+    rows for an agenda depend on.
+    """
+    return ["agenda", nanog, url_base, origin, nanog_html.parser_stamp(parser)]
+
+
+def parse_agendas(tasks, jobs=1):
+    """parse_agendas - yields (nanog, agenda rows) for each of the
+    parse_agenda_task() tasks, in task order.  worker processes hand back a
+    list per agenda, a serial run streams the rows as they're parsed.
+    """
+    if jobs > 1:
+        # imap hands results back in task order, so the output matches a
+        # serial run regardless of which worker finishes first
+        settings = (nanog_trace.worker_settings(), nanog_profile.worker_settings())
+        with multiprocessing.Pool(
+            jobs, initializer=init_worker, initargs=settings
+        ) as pool:
+            for (nanog, agenda, hits, timings, profile) in pool.imap(
+                parse_agenda_task, tasks
+            ):
+                print(f"scraping agenda: NANOG {nanog}")
+                SKIP_HITS.update(hits)
+                nanog_trace.merge(timings)
+                nanog_profile.merge(profile)
+                yield (nanog, agenda)
+    else:
+        for task in tasks:
+            print(f"scraping agenda: NANOG {task[1]}")
+            yield (task[1], agenda_rows(task))
+
 
-    return export_talks
+def print_skip_hits():
+    """print_skip_hits - the number of agenda entries each skip rule filtered
+    out.  only the agendas parsed by this run count, not those read back from
+    the parse cache.
+    """
+    print("skip rule hits:")
+    for (rule, hits) in SKIP_HITS.most_common():
+        print(f"  {rule}: {hits}")
+
+
+def export_agendas(
+    agenda_files,
+    nanogs,
+    csv_file,
+    url_base,
+    origin,
+    jobs=1,
+    parser=None,
+    cache_dir=None,
+    manifest_file=None,
+):
+    """export_agendas - parse every agenda in a single pass and write the rows
+    into one consolidated CSV, header included.  with a manifest only the new
+    or changed agendas are parsed, and their rows spliced into the CSV.
+
+    :agenda_files: dict of agenda file paths keyed by NANOG number
+    :nanogs: list of NANOG numbers to export, in output order
+    :csv_file: path to the consolidated csv file
+    :url_base: URL base location for relative presentation links
+    :origin: source of the agendas
+    :jobs: number of worker processes to parse with
+    :parser: bs4 tree builder to parse with
+    :cache_dir: parse cache directory, None disables the cache
+    :manifest_file: manifest for incremental exports, None for a full export
+    :returns: nothing
+
+    """
+    if parser is None:
+        parser = nanog_html.DEFAULT_PARSER
+
+    for nanog in nanogs:
+        if nanog not in agenda_files:
+            print(f"no agenda found: NANOG {nanog}")
+
+    def tasks(task_nanogs):
+        return [
+            (agenda_files[nanog], nanog, url_base, origin, parser, cache_dir)
+            for nanog in task_nanogs
+            if nanog in agenda_files
+        ]
+
+    if manifest_file is not None:
+        parsed = nanog_manifest.update(
+            manifest_file,
+            csv_file,
+            AGENDA_HEADER,
+            agenda_files,
+            nanogs,
+            CODE_STAMP,
+            lambda nanog: agenda_params(nanog, url_base, origin, parser),
+            lambda stale: parse_agendas(tasks(stale), jobs),
+        )
+        print(f"agendas updated: {len(parsed)} parsed, manifest {manifest_file}")
+        return
+
+    with contextlib.ExitStack() as stack:
+        write_rows = nanog_columnar.table_writer(stack, csv_file, AGENDA_HEADER)
+        for (_, agenda) in parse_agendas(tasks(nanogs), jobs):
+            write_rows(agenda)
+
+    return
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("agenda", help="html agenda file")
+    parser.add_argument("agenda", help="html agenda file", nargs="?")
     parser.add_argument(
         "--nanog",
         help="nanog number",
         dest="NANOG_NUM",
         action="store",
         type=int,
-        required=True,
+        required=False,
+    )
+    parser.add_argument(
+        "--range",
+        help="batch mode: range of NANOGs to export (e.g. 13-76)",
+        dest="nanog_range",
+        action="store",
+        required=False,
+    )
+    parser.add_argument(
+        "--glob",
+        help="batch mode: directory (or glob pattern) holding the agendas",
+        dest="agenda_glob",
+        action="store",
+        default="agendas/",
+        required=False,
     )
     parser.add_argument(
         "--url",
@@ -370,32 +623,141 @@ def main():
     )
     parser.add_argument(
         "--csv",
-        help="csv file to output to",
+        help="csv file to output to (.parquet / .arrow for columnar output)",
         dest="csv_file",
         action="store",
         required=False,
     )
+    parser.add_argument(
+        "--jobs",
+        help="batch mode: number of worker processes for parsing",
+        dest="jobs",
+        action="store",
+        type=int,
+        default=1,
+        required=False,
+    )
+    parser.add_argument(
+        "--parser",
+        help="HTML parser backend (default: fastest installed)",
+        dest="html_parser",
+        action="store",
+        choices=nanog_html.PARSERS,
+        default=nanog_html.DEFAULT_PARSER,
+        required=False,
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="parse cache directory",
+        dest="cache_dir",
+        action="store",
+        default=nanog_cache.DEFAULT_CACHE_DIR,
+        required=False,
+    )
+    parser.add_argument(
+        "--no-cache",
+        help="always re-parse, bypassing the parse cache",
+        dest="no_cache",
+        action="store_true",
+        required=False,
+    )
+    parser.add_argument(
+        "--skip-stats",
+        help="report the entries filtered out by each skip rule (agendas read "
+        "from the parse cache aren't counted, see --no-cache)",
+        dest="skip_stats",
+        action="store_true",
+        required=False,
+    )
+    parser.add_argument(
+        "--incremental",
+        help="batch mode: only re-parse new or changed agendas, tracked in a "
+        "manifest next to the csv",
+        dest="incremental",
+        action="store_true",
+        required=False,
+    )
+    parser.add_argument(
+        "--manifest",
+        help="batch mode: manifest for --incremental (default: CSV.manifest.json)",
+        dest="manifest_file",
+        action="store",
+        required=False,
+    )
+    nanog_trace.add_arguments(parser)
+    nanog_profile.add_arguments(parser)
     args = parser.parse_args()
 
-    global ORIGIN
-    if args.origin:
-        ORIGIN = args.origin
+    # batch mode names the CSV after the range, the profile goes alongside it
+    nanogs = None
+    csv_file = args.csv_file
+    if args.nanog_range:
+        nanogs = nanog_batch.parse_nanog_range(args.nanog_range)
+        if not csv_file:
+            csv_file = f"agendas-{nanogs[0]}-{nanogs[-1]}.csv"
 
-    global NANOG_NUM
-    NANOG_NUM = args.NANOG_NUM
+    nanog_trace.start(args, sys.modules[__name__], nanog_cache, nanog_columnar)
+    nanog_profile.start(args, csv_file, __file__)
 
-    global URL_BASE
-    URL_BASE = args.url_base
+    origin = ORIGIN
+    if args.origin:
+        origin = args.origin
+
+    cache_dir = args.cache_dir
+    if args.no_cache:
+        cache_dir = None
+
+    if args.nanog_range:
+        manifest_file = None
+        if args.incremental or args.manifest_file:
+            manifest_file = args.manifest_file
+            if not manifest_file:
+                manifest_file = nanog_manifest.manifest_path(csv_file)
+
+        agenda_files = nanog_batch.find_nanog_files(
+            args.agenda_glob, AGENDA_FILE_RE, nanogs
+        )
+        export_agendas(
+            agenda_files,
+            nanogs,
+            csv_file,
+            args.url_base,
+            origin,
+            args.jobs,
+            args.html_parser,
+            cache_dir,
+            manifest_file,
+        )
+        if args.skip_stats:
+            print_skip_hits()
+        return
 
-    agenda = get_agenda_tables(args.agenda, NANOG_NUM)
+    if args.agenda is None or args.NANOG_NUM is None:
+        parser.error("an agenda file and --nanog are required without --range")
+
+    agenda = agenda_rows(
+        (
+            args.agenda,
+            args.NANOG_NUM,
+            args.url_base,
+            origin,
+            args.html_parser,
+            cache_dir,
+        )
+    )
 
     if args.csv_file:
-        with open(args.csv_file, "w", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerows(agenda)
+        with contextlib.ExitStack() as stack:
+            write_rows = nanog_columnar.table_writer(
+                stack, args.csv_file, AGENDA_HEADER, header=False
+            )
+            write_rows(agenda)
 
     else:
-        pprint.pprint(agenda, width=100)
+        pprint.pprint(list(agenda), width=100)
+
+    if args.skip_stats:
+        print_skip_hits()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import argparse
+import contextlib
+
+import nanog_columnar
+import nanog_identity
+
+# nanog-attendee-ids.py
+#
+# adds a PERSON_ID column to the nanog-attendees.py export, linking the same
+# person's entries across meetings.  see nanog_identity for how the entries
+# are matched up.
+#
+
+ATTENDEES_HEADER = ["NANOG", "LAST_NAME", "FIRST_NAME", "AFFILIATION"]
+PERSON_HEADER = ATTENDEES_HEADER + ["PERSON_ID"]
+
+
+def load_attendees(attendees_file):
+    """load_attendees - the rows of the attendee export (headerless CSV, or
+    parquet / arrow)
+    """
+    rows = []
+    for row in nanog_columnar.iter_rows(attendees_file):
+        if row and row[0] == "NANOG":  # columnar files have a header
+            continue
+        rows.append(list(row))
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--attendees",
+        help="attendee export (csv, or .parquet / .arrow)",
+        dest="attendees",
+        action="store",
+        required=True,
+    )
+    parser.add_argument(
+        "--out",
+        help="attendee export with person ids (csv, or .parquet / .arrow)",
+        dest="out",
+        action="store",
+        required=True,
+    )
+    args = parser.parse_args()
+
+    rows = load_attendees(args.attendees)
+    (person_ids, counts) = nanog_identity.resolve(rows)
+
+    with contextlib.ExitStack() as stack:
+        write_rows = nanog_columnar.table_writer(
+            stack, args.out, PERSON_HEADER, header=False
+        )
+        write_rows(
+            (row + [None] * len(ATTENDEES_HEADER))[: len(ATTENDEES_HEADER)] + [pid]
+            for (row, pid) in zip(rows, person_ids)
+        )
+
+    print(
+        f"{counts['rows']} attendee entries, {counts['names']} distinct names "
+        f"in {counts['blocks']} blocks"
+    )
+    print(
+        f"compared {counts['compared']} of {counts['all_pairs']} name pairs, "
+        f"{counts['matched']} matched, {counts['merged']} merged"
+    )
+    print(f"{counts['persons']} persons")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,100 @@
 #!/usr/bin/env python3
 
-from bs4 import BeautifulSoup
 import argparse
+import contextlib
+import json
+import os.path
 import re
-import csv
+import shutil
+import sys
 import tabula
+import tempfile
 import pprint
 
+import nanog_batch
+import nanog_cache
+import nanog_columnar
+import nanog_html
+import nanog_layouts
+import nanog_manifest
+import nanog_profile
+import nanog_trace
 
-def process_attendee_table(attendee_table, parse_names):
+# parse cache entries are invalidated whenever the scraping code changes
+CODE_STAMP = nanog_cache.code_stamp(
+    __file__, nanog_html.__file__, nanog_layouts.__file__
+)
+
+# the raw tabula-java output only depends on the pdf and the tabula version, so
+# tuning the name handling doesn't mean paying for the java extraction again.
+TABULA_STAMP = f"tabula-{tabula.__version__}"
+TABULA_OPTIONS = {"pages": "all"}
+
+# attendee lists are named nanog##-attendees.{html,pdf}
+ATTENDEES_FILE_RE = re.compile(r"^nanog(\d+)-attendees\.(html|pdf)$", re.IGNORECASE)
+
+# column names for the attendee rows.  the CSV is written without a header,
+# columnar output needs the names.
+ATTENDEES_HEADER = ["NANOG", "LAST_NAME", "FIRST_NAME", "AFFILIATION"]
+
+# functions timed with --timings, see nanog_trace.  the row parsers are picked
+# out of ATTENDEE_LAYOUTS, process_attendee_table() times them.
+TRACE_STAGES = {
+    "process_attendee_table": "table walk",
+    "parse_attendees_pdf": "table walk",
+    "extract_pdf_tables": "pdf extract",
+}
+
+
+def split_name_row(nanog, td):
+    """split_name_row - attendee row from a list with the name in one "last,
+    first" cell and the organization in the next.  returns None for rows
+    without a name.
+    """
+    lname = ""
+    fname = ""
+    try:
+        name = re.split(",", td[0].text.strip())
+        if len(name) == 2:
+            lname = name[0]
+            fname = name[1]
+        elif len(name) > 2:
+            lname = name[0] + name[1]
+            fname = " ".join(name[2:])
+
+        if lname.strip() == "" and fname.strip() == "":
+            return None
+
+        return [nanog, lname.strip(), fname.strip(), td[1].text.strip()]
+    except ValueError:
+        return [
+            nanog,
+            "malformed attendee:" + td[0].text.strip(),
+            "",
+            td[1].text.strip(),
+        ]
+
+
+def name_columns_row(nanog, td):
+    """name_columns_row - attendee row from a list with last name, first name
+    and organization cells
+    """
+    try:
+        return [
+            nanog,
+            td[0].text.strip(),  # last name
+            td[1].text.strip(),  # first name
+            td[2].text.strip(),  # organization
+        ]
+    except IndexError:
+        attendee = [nanog]
+        cells = [x.text.strip() for x in td]
+        attendee.extend(cells)
+        return attendee
+
+
+def process_attendee_table(attendee_table, nanog, parse_row):
+    parse_row = nanog_trace.wrap("row generation", parse_row)
     attendees = []
     for tr in attendee_table.find_all("tr"):
         # for tr in attendee_table.tbody.find_all("tr"):
@@ -16,91 +102,80 @@ def process_attendee_table(attendee_table, parse_names):
         if len(td) < 2:
             continue
 
-        if parse_names:
-            lname = ""
-            fname = ""
-            try:
-                name = re.split(",", td[0].text.strip())
-                if len(name) == 2:
-                    lname = name[0]
-                    fname = name[1]
-                elif len(name) > 2:
-                    lname = name[0] + name[1]
-                    fname = " ".join(name[2:])
-
-                if lname.strip() == "" and fname.strip() == "":
-                    continue
-
-                attendee = [
-                    NANOG_NUM,
-                    lname.strip(),
-                    fname.strip(),
-                    td[1].text.strip(),
-                ]
-                attendees.append(attendee)
-            except ValueError:
-                attendee = [
-                    NANOG_NUM,
-                    "malformed attendee:" + td[0].text.strip(),
-                    "",
-                    td[1].text.strip(),
-                ]
-                attendees.append(attendee)
-
-        else:
-            try:
-                attendee = [
-                    NANOG_NUM,
-                    td[0].text.strip(),  # last name
-                    td[1].text.strip(),  # first name
-                    td[2].text.strip(),  # organization
-                ]
-                attendees.append(attendee)
-            except IndexError:
-                attendee = [NANOG_NUM]
-                cells = [x.text.strip() for x in td]
-                attendee.extend(cells)
-                attendees.append(attendee)
+        attendee = parse_row(nanog, td)
+        if attendee is not None:
+            attendees.append(attendee)
 
     return attendees
 
 
-def get_attendees_table(attendees_file):
+def get_attendees_table(
+    attendees_file, nanog, layout, parser=nanog_html.DEFAULT_PARSER
+):
     """
     there should really only be 1 attendee table in the page.
-    different iterations of the NANOG site over the years have moved this.
+    different iterations of the NANOG site over the years have moved this, see
+    ATTENDEE_LAYOUTS.
     """
-    with open(attendees_file) as a_file:
-        soup = BeautifulSoup(a_file, "html.parser")
-
-    if NANOG_NUM in [12]:
-        attendees_table = soup.find_all("table", {"cellpadding": "3"})
-        parse_names = True
-    elif NANOG_NUM in [13]:
-        attendees_table = soup.find_all(
-            "table", {"class": "MsoNormalTable", "border": "0"}
-        )
-        parse_names = True
-    elif NANOG_NUM in [14, 15, 16, 17, 18]:
-        attendees_table = soup.find_all("table", {"border": "1"})
-        parse_names = True
-    elif NANOG_NUM in range(46, 53):
-        attendees_table = soup.find_all("table", {"border": "0", "cellpadding": "4"})
-        parse_names = False
-    elif NANOG_NUM in range(53, 61):
-        attendees_table = soup.find_all("table", {"class": "GJ"})
-        parse_names = True
-    else:
-        attendees_table = soup.find_all("table", {"border": "1"})
-        parse_names = False
+    table_attrs = layout["table_attrs"]
+
+    # only the attendee table is of interest, skip building the rest of the page
+    soup = nanog_html.load_soup(attendees_file, parser, table_attrs)
+    attendees_table = soup.find_all("table", table_attrs)
 
     attendees = []
     for table in attendees_table:
-        attendees = process_attendee_table(table, parse_names)
+        attendees = process_attendee_table(table, nanog, layout["row"])
 
     return attendees
 
 
+# attendee list layouts by era, see nanog_layouts.  html lists give the
+# attendee table's attributes and the row parser, pdf lists (run through
+# tabula-java) the positions of the name and organization cells.
+ATTENDEE_LAYOUTS = nanog_layouts.registry(
+    (
+        12,
+        12,
+        {"format": "html", "table_attrs": {"cellpadding": "3"}, "row": split_name_row},
+    ),
+    (
+        13,
+        13,
+        {
+            "format": "html",
+            "table_attrs": {"class": "MsoNormalTable", "border": "0"},
+            "row": split_name_row,
+        },
+    ),
+    (
+        14,
+        18,
+        {"format": "html", "table_attrs": {"border": "1"}, "row": split_name_row},
+    ),
+    (
+        19,
+        45,
+        {"format": "html", "table_attrs": {"border": "1"}, "row": name_columns_row},
+    ),
+    (
+        46,
+        52,
+        {
+            "format": "html",
+            "table_attrs": {"border": "0", "cellpadding": "4"},
+            "row": name_columns_row,
+        },
+    ),
+    (
+        53,
+        60,
+        {"format": "html", "table_attrs": {"class": "GJ"}, "row": split_name_row},
+    ),
+    (61, None, {"format": "pdf", "name_cell": 0, "org_cell": 1}),
+)
+
+
 def pdf_text_clean(cell_text):
     text = cell_text.strip()
 
@@ -120,54 +195,322 @@ def fix_pdf_names(name):
     return (fname, lname)
 
 
-def parse_attendees_pdf(attendee_pdf):
-    attendee_table = tabula.read_pdf(attendee_pdf, output_format="json", pages="all")
-    # we might need to adjust this for each pdf table
+def extract_pdf_tables(attendee_pdfs, cache_dir=None):
+    """extract_pdf_tables - run tabula-java over the pdfs which aren't already in
+    the cache.  all of them are handled by a single tabula-java batch run, so
+    we only pay for one JVM startup.
+
+    :attendee_pdfs: list of paths to the attendee pdfs
+    :cache_dir: cache directory for the raw tabula output, None disables it
+    :returns: dict of the newly extracted tabula JSON tables, keyed by pdf path
+
+    """
+    pdfs = []
+    for pdf in attendee_pdfs:
+        if cache_dir is not None and nanog_cache.contains(
+            cache_dir, nanog_cache.cache_key(pdf, TABULA_STAMP, TABULA_OPTIONS)
+        ):
+            continue
+        pdfs.append(pdf)
+
+    pdf_tables = {}
+    if len(pdfs) == 0:
+        return pdf_tables
+
+    # batch mode converts every pdf in a directory, writing the JSON alongside
+    # each pdf.  stage copies under unique names so we don't litter attendees/
+    with tempfile.TemporaryDirectory() as batch_dir:
+        for (i, pdf) in enumerate(pdfs):
+            shutil.copyfile(pdf, os.path.join(batch_dir, f"{i}.pdf"))
+
+        tabula.convert_into_by_batch(
+            batch_dir,
+            output_format="json",
+            java_options=["-Dfile.encoding=UTF8"],
+            **TABULA_OPTIONS,
+        )
+
+        for (i, pdf) in enumerate(pdfs):
+            with open(os.path.join(batch_dir, f"{i}.json"), encoding="utf-8") as f:
+                pdf_tables[pdf] = json.load(f)
+
+    if cache_dir is not None:
+        for (pdf, tables) in pdf_tables.items():
+            key = nanog_cache.cache_key(pdf, TABULA_STAMP, TABULA_OPTIONS)
+            nanog_cache.store(cache_dir, key, tables)
+
+    return pdf_tables
+
+
+def load_pdf_tables(attendee_pdf, cache_dir=None, pdf_tables=None):
+    """load_pdf_tables - raw tabula JSON tables for the pdf, taken from a
+    previous extract_pdf_tables() run or the cache before falling back to
+    running tabula-java.
+    """
+    if pdf_tables is not None and attendee_pdf in pdf_tables:
+        return pdf_tables[attendee_pdf]
+
+    if cache_dir is not None:
+        key = nanog_cache.cache_key(attendee_pdf, TABULA_STAMP, TABULA_OPTIONS)
+        tables = nanog_cache.load(cache_dir, key)
+        if tables is not None:
+            return tables
+
+    return extract_pdf_tables([attendee_pdf], cache_dir)[attendee_pdf]
+
+
+def parse_attendees_pdf(attendee_pdf, nanog, layout, cache_dir=None, pdf_tables=None):
+    attendee_table = load_pdf_tables(attendee_pdf, cache_dir, pdf_tables)
+    # we might need to adjust this for each pdf table, see ATTENDEE_LAYOUTS
+    name_cell = layout["name_cell"]
+    org_cell = layout["org_cell"]
     attendees = []
     for data_table in attendee_table:
         # data_table = attendee_table[1]["data"]
         for row in data_table["data"]:
-            (fname, lname) = fix_pdf_names(pdf_text_clean(row[0]["text"]))
-            org = pdf_text_clean(row[1]["text"])
+            (fname, lname) = fix_pdf_names(pdf_text_clean(row[name_cell]["text"]))
+            org = pdf_text_clean(row[org_cell]["text"])
 
-            attendee = [NANOG_NUM, lname, fname, org]
+            attendee = [nanog, lname, fname, org]
             attendees.append(attendee)
 
     return attendees
 
 
+def parse_attendees_file(attendees_file, nanog, parser, cache_dir, pdf_tables=None):
+    """parse_attendees_file - rows for a single attendee list, html or pdf,
+    served from the parse cache when the file is unchanged.
+    """
+    layout = nanog_layouts.resolve(ATTENDEE_LAYOUTS, nanog)
+
+    params = attendees_params(attendees_file, nanog, parser)
+    if layout["format"] == "pdf":
+        attendees = nanog_cache.cached_rows(
+            cache_dir,
+            attendees_file,
+            CODE_STAMP,
+            params,
+            lambda: parse_attendees_pdf(
+                attendees_file, nanog, layout, cache_dir, pdf_tables
+            ),
+        )
+    else:
+        attendees = nanog_cache.cached_rows(
+            cache_dir,
+            attendees_file,
+            CODE_STAMP,
+            params,
+            lambda: get_attendees_table(attendees_file, nanog, layout, parser),
+        )
+
+    return attendees
+
+
+def attendees_params(attendees_file, nanog, parser):
+    """attendees_params - the parameters, beyond the attendee list itself,
+    which the rows for a list depend on.
+    """
+    if nanog_layouts.resolve(ATTENDEE_LAYOUTS, nanog)["format"] == "pdf":
+        return ["attendees-pdf", nanog, TABULA_STAMP]
+
+    return ["attendees", nanog, nanog_html.parser_stamp(parser)]
+
+
+def parse_attendee_files(attendee_files, nanogs, parser, cache_dir):
+    """parse_attendee_files - yields (nanog, list of attendee rows) for each of
+    the NANOGs with an attendee list, in order.
+    """
+    nanogs = [nanog for nanog in nanogs if nanog in attendee_files]
+
+    # all of the pdfs that need it go through tabula-java in one go up front
+    pdfs = [
+        attendee_files[nanog]
+        for nanog in nanogs
+        if nanog_layouts.resolve(ATTENDEE_LAYOUTS, nanog)["format"] == "pdf"
+    ]
+    pdf_tables = extract_pdf_tables(pdfs, cache_dir)
+
+    for nanog in nanogs:
+        print(f"scraping attendees: NANOG {nanog}")
+        attendees = parse_attendees_file(
+            attendee_files[nanog], nanog, parser, cache_dir, pdf_tables
+        )
+        yield (nanog, attendees)
+
+
+def export_attendees(
+    attendee_files, nanogs, csv_file, parser, cache_dir, manifest_file=None
+):
+    """export_attendees - parse every attendee list in a single pass and write
+    the rows into one consolidated CSV.  with a manifest only the new or
+    changed lists are parsed, and their rows spliced into the CSV.
+
+    :attendee_files: dict of attendee file paths keyed by NANOG number
+    :nanogs: list of NANOG numbers to export, in output order
+    :csv_file: path to the consolidated csv file
+    :parser: bs4 tree builder to parse the html lists with
+    :cache_dir: parse cache directory, None disables the cache
+    :manifest_file: manifest for incremental exports, None for a full export
+    :returns: nothing
+
+    """
+    for nanog in nanogs:
+        if nanog not in attendee_files:
+            print(f"no attendees found: NANOG {nanog}")
+
+    if manifest_file is not None:
+        parsed = nanog_manifest.update(
+            manifest_file,
+            csv_file,
+            ATTENDEES_HEADER,
+            attendee_files,
+            nanogs,
+            CODE_STAMP,
+            lambda nanog: attendees_params(attendee_files[nanog], nanog, parser),
+            lambda stale: parse_attendee_files(
+                attendee_files, stale, parser, cache_dir
+            ),
+            header=False,
+        )
+        print(f"attendees updated: {len(parsed)} parsed, manifest {manifest_file}")
+        return
+
+    with contextlib.ExitStack() as stack:
+        write_rows = nanog_columnar.table_writer(
+            stack, csv_file, ATTENDEES_HEADER, header=False
+        )
+        for (_, attendees) in parse_attendee_files(
+            attendee_files, nanogs, parser, cache_dir
+        ):
+            write_rows(attendees)
+
+    return
+
+
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("attendees", help="html attendees file")
+    parser.add_argument("attendees", help="html attendees file", nargs="?")
     parser.add_argument(
         "--nanog",
         help="nanog number",
         dest="NANOG_NUM",
         type=int,
         action="store",
-        required=True,
+        required=False,
+    )
+    parser.add_argument(
+        "--range",
+        help="batch mode: range of NANOGs to export (e.g. 12-63)",
+        dest="nanog_range",
+        action="store",
+        required=False,
+    )
+    parser.add_argument(
+        "--glob",
+        help="batch mode: directory (or glob pattern) holding the attendee lists",
+        dest="attendees_glob",
+        action="store",
+        default="attendees/",
+        required=False,
     )
     parser.add_argument(
         "--csv",
-        help="csv file for output",
+        help="csv file for output (.parquet / .arrow for columnar output)",
         dest="csv_file",
         action="store",
         required=False,
     )
+    parser.add_argument(
+        "--parser",
+        help="HTML parser backend (default: fastest installed)",
+        dest="html_parser",
+        action="store",
+        choices=nanog_html.PARSERS,
+        default=nanog_html.DEFAULT_PARSER,
+        required=False,
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="parse cache directory",
+        dest="cache_dir",
+        action="store",
+        default=nanog_cache.DEFAULT_CACHE_DIR,
+        required=False,
+    )
+    parser.add_argument(
+        "--no-cache",
+        help="always re-parse, bypassing the parse cache",
+        dest="no_cache",
+        action="store_true",
+        required=False,
+    )
+    parser.add_argument(
+        "--incremental",
+        help="batch mode: only re-parse new or changed attendee lists, tracked "
+        "in a manifest next to the csv",
+        dest="incremental",
+        action="store_true",
+        required=False,
+    )
+    parser.add_argument(
+        "--manifest",
+        help="batch mode: manifest for --incremental (default: CSV.manifest.json)",
+        dest="manifest_file",
+        action="store",
+        required=False,
+    )
+    nanog_trace.add_arguments(parser)
+    nanog_profile.add_arguments(parser)
     args = parser.parse_args()
 
-    global NANOG_NUM
-    NANOG_NUM = args.NANOG_NUM
+    # batch mode names the CSV after the range, the profile goes alongside it
+    nanogs = None
+    csv_file = args.csv_file
+    if args.nanog_range:
+        nanogs = nanog_batch.parse_nanog_range(args.nanog_range)
+        if not csv_file:
+            csv_file = f"attendees-{nanogs[0]}-{nanogs[-1]}.csv"
 
-    if "pdf" in args.attendees:
-        attendees = parse_attendees_pdf(args.attendees)
-    else:
-        attendees = get_attendees_table(args.attendees)
+    nanog_trace.start(args, sys.modules[__name__], nanog_cache, nanog_columnar)
+    nanog_profile.start(args, csv_file, __file__)
+
+    cache_dir = args.cache_dir
+    if args.no_cache:
+        cache_dir = None
+
+    if args.nanog_range:
+        manifest_file = None
+        if args.incremental or args.manifest_file:
+            manifest_file = args.manifest_file
+            if not manifest_file:
+                manifest_file = nanog_manifest.manifest_path(csv_file)
+
+        attendee_files = nanog_batch.find_nanog_files(
+            args.attendees_glob, ATTENDEES_FILE_RE, nanogs
+        )
+        export_attendees(
+            attendee_files,
+            nanogs,
+            csv_file,
+            args.html_parser,
+            cache_dir,
+            manifest_file,
+        )
+        return
+
+    if args.attendees is None or args.NANOG_NUM is None:
+        parser.error("an attendees file and --nanog are required without --range")
+
+    attendees = parse_attendees_file(
+        args.attendees, args.NANOG_NUM, args.html_parser, cache_dir
+    )
 
     if args.csv_file:
-        with open(args.csv_file, "w", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerows(attendees)
+        with contextlib.ExitStack() as stack:
+            write_rows = nanog_columnar.table_writer(
+                stack, args.csv_file, ATTENDEES_HEADER, header=False
+            )
+            write_rows(attendees)
 
     else:
         pprint.pprint(attendees, width=100)
@@ -2,76 +2,317 @@
 
 
 import argparse
+import concurrent.futures
 import csv
+import json
 import logging
+import os
 import os.path
+import random
+import sys
+import tempfile
+import threading
+import time
 import traceback
-from urllib.parse import parse_qs, urlparse
 
+import requests
 from youtube_transcript_api import YouTubeTranscriptApi, _errors
 from youtube_transcript_api.formatters import TextFormatter
 
+import nanog_profile
+import nanog_trace
+import nanog_transcripts
+import nanog_youtube
 
-def getYoutubeTranscript(outdir, nanog_num, url):
+# failures that are worth another attempt.  anything else (no captions, video
+# gone, etc.) is final.
+TRANSIENT_ERRORS = (
+    _errors.TooManyRequests,
+    _errors.YouTubeRequestFailed,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+)
+
+RETRIES = 3  # retries for transient errors
+BACKOFF = 1.0  # seconds, doubled on each retry
+
+# functions timed with --timings, see nanog_trace.  the waits for the rate
+# limiter are timed separately, within the fetch.
+TRACE_STAGES = {
+    "fetch_transcript": "network fetch",
+    "write_atomic": "file write",
+}
+
+
+class TokenBucket:
+    """
+    rate limiter shared by all of the fetch workers.  tokens are added at
+    `rate` per second up to `burst`, and each request takes one.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """block until a token is available"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+def youtube_provider(video_id):
+    """
+    fetch the english transcript for video_id from youtube.  returns a tuple of
+    the timed segments and the transcript's language code.
+    """
+    transcript = YouTubeTranscriptApi.list_transcripts(video_id).find_transcript(
+        ["en"]
+    )
+    return (transcript.fetch(), transcript.language_code)
+
+
+def stub_provider(stub_dir):
+    """
+    returns a transcript provider that serves $stub_dir/youtube-id.json (a list
+    of {"text", "start", "duration"} segments) in place of youtube.  videos
+    without a file behave as if they have transcripts disabled.  handy for
+    testing without hitting youtube.
+    """
+
+    def get_transcript(video_id):
+        stub_path = os.path.join(stub_dir, video_id + ".json")
+        if not os.path.exists(stub_path):
+            raise _errors.TranscriptsDisabled(video_id)
+        with open(stub_path, "r", encoding="utf-8") as stub_file:
+            return (json.load(stub_file), "en")
+
+    return get_transcript
+
+
+def fetch_transcript(video_id, provider, limiter=None, retries=RETRIES):
     """
-    given a video url download the transcript and save the raw content to a text
-    file in the output_dir.  filename format will be
-    $output_dir/nanog-#-youtube-id.txt.
+    fetch the transcript for video_id, honoring the rate limit and retrying
+    transient errors with exponential backoff.  returns the provider's tuple
+    of (segments, language code).
+    """
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            with nanog_trace.stage("rate limit"):
+                limiter.acquire()
+        try:
+            return provider(video_id)
+        except TRANSIENT_ERRORS:
+            if attempt == retries:
+                raise
+            nanog_trace.count("fetch retries")
+            time.sleep(BACKOFF * 2**attempt + random.uniform(0, BACKOFF))
+
+
+def write_atomic(path, text):
+    """
+    write text to path via a temp file, so an interrupted run never leaves a
+    partial file behind to be mistaken for a finished one.
+    """
+    (fd, tmp_path) = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as tmp_file:
+        tmp_file.write(text)
+    os.replace(tmp_path, path)
+
 
-    if the file already exists, don't bother downloading the transcript.
+def getYoutubeTranscript(
+    outdir,
+    nanog_nums,
+    video_id,
+    url,
+    provider=youtube_provider,
+    limiter=None,
+    retries=RETRIES,
+):
     """
+    given a video id download the transcript and save the raw content to a text
+    file in the output_dir for each of the NANOGs referencing the video.
+    filename format will be $output_dir/nanog-#-youtube-id.txt.
 
-    # create the filename
-    if "?" in url:
-        u = urlparse(url)
-        if "watch" in u.path:
-            qs = parse_qs(u.query)  # returns a dict of lists
-            video_id = qs["v"][0]
-        # sometimes URLs are of the form: https://youtu.be/NZbrpdyJlfg?list=PLO8
-        # when this is the case use the path as the video_id
+    if the files already exist, don't bother downloading the transcript.  the
+    transcript is fetched at most once, however many NANOGs reference it.
+
+    returns a list of the log messages for the video.
+    """
+    messages = []
+    pending = []  # NANOGs for which we still need the transcript
+    for nanog_num in nanog_nums:
+        transcript_file = "nanog-" + str(nanog_num) + "-" + video_id + ".txt"
+        transcript_path = os.path.join(outdir, transcript_file)
+        error_file = "errors-" + str(nanog_num) + "-" + video_id + ".txt"
+        error_path = os.path.join(outdir, error_file)
+
+        # check to see if the transcript has been downloaded
+        if os.path.exists(transcript_path):
+            messages.append(
+                f"transcript previously captured: {video_id} {transcript_path} - {url}"
+            )
+        elif os.path.exists(error_path):
+            messages.append(
+                "error transcript previously unavailable: "
+                f"{video_id} {error_path} - {url}"
+            )
         else:
-            video_id = u.path.replace("/", "")
-
-    else:
-        url_elems = url.split("/")
-        video_id = url_elems[-1]
-
-    transcript_file = "nanog-" + str(nanog_num) + "-" + video_id + ".txt"
-    transcript_path = os.path.join(outdir, transcript_file)
-    error_file = "errors-" + str(nanog_num) + "-" + video_id + ".txt"
-    error_path = os.path.join(outdir, error_file)
-
-    # check to see if the transcript has been downloaded
-    if os.path.exists(transcript_path):
-        error = f"transcript previously captured: {video_id} {transcript_path} - {url}"
-        return error
-    if os.path.exists(error_path):
-        error = (
-            f"error transcript previously unavailable: {video_id} {error_path} - {url}"
-        )
-        return error
+            pending.append((transcript_path, error_path))
+
+    if len(pending) == 0:
+        return messages
 
     try:
-        transcript = YouTubeTranscriptApi.get_transcript(video_id)
+        (transcript, _) = fetch_transcript(video_id, provider, limiter, retries)
 
         # turns the transcript into a text string.
         formatter = TextFormatter()
         formatted = formatter.format_transcript(transcript)
 
-        # write it out to a file.
-        with open(transcript_path, "w", encoding="utf-8") as text_file:
-            text_file.write(formatted)
-
-        return "captured transcript: " + transcript_path
+        # write it out to a file per NANOG.
+        for (transcript_path, _) in pending:
+            write_atomic(transcript_path, formatted)
+            messages.append("captured transcript: " + transcript_path)
+        nanog_trace.count("captured")
     # there are videos for which there are no captions generated. log these
     except (_errors.TranscriptsDisabled, _errors.NoTranscriptFound):
-        with open(error_path, "w", encoding="utf-8") as error_log:
-            traceback.print_exc(file=error_log)
+        for (_, error_path) in pending:
+            write_atomic(error_path, traceback.format_exc())
+            messages.append(
+                f"unable to capture transcript: {video_id} "
+                f"exception: {error_path} - {url}"
+            )
+        nanog_trace.count("unavailable")
+    # out of retries.  no error file, so that the next run tries again.
+    except TRANSIENT_ERRORS as e:
+        messages.append(
+            f"transient error capturing transcript: {video_id} "
+            f"{type(e).__name__} - {url}"
+        )
+        nanog_trace.count("transient error")
+
+    return messages
+
+
+def captureYoutubeTranscript(
+    video_id, url, provider=youtube_provider, limiter=None, retries=RETRIES
+):
+    """
+    given a video id download the transcript for the transcript store.  returns
+    a dict with the status, segments, language and error for the video, along
+    with a log message.  status is None when we ran out of retries, these
+    aren't recorded so that the next run tries again.
+    """
+    capture = {
+        "status": None,
+        "segments": None,
+        "language": None,
+        "error": None,
+    }
+
+    try:
+        (segments, language) = fetch_transcript(video_id, provider, limiter, retries)
+        capture["status"] = nanog_transcripts.CAPTURED
+        capture["segments"] = segments
+        capture["language"] = language
+        capture["message"] = f"captured transcript: {video_id} - {url}"
+        nanog_trace.count("captured")
+    except (_errors.TranscriptsDisabled, _errors.NoTranscriptFound):
+        capture["status"] = nanog_transcripts.UNAVAILABLE
+        capture["error"] = traceback.format_exc()
+        capture["message"] = f"unable to capture transcript: {video_id} - {url}"
+        nanog_trace.count("unavailable")
+    except TRANSIENT_ERRORS as e:
+        capture["message"] = (
+            f"transient error capturing transcript: {video_id} "
+            f"{type(e).__name__} - {url}"
+        )
+        nanog_trace.count("transient error")
 
-        error = (
-            f"unable to capture transcript: {video_id} exception: {error_path} - {url}"
+    return capture
+
+
+def plan_fetches(talks):
+    """
+    reduce the talk rows to the distinct videos to fetch.  panels repeat the
+    video for each speaker, and the same video shows up under a number of URL
+    forms.
+
+    returns a dict keyed by video id of {"url": first URL seen, "nanogs": list
+    of the NANOGs referencing it, "talks": list of (NANOG, speaker, title)},
+    and a list of the rows without a usable video id.
+    """
+    plan = {}
+    skipped = []
+    for row in talks:
+        vid = nanog_youtube.video_id(row[4])
+        if vid is None:
+            skipped.append(row)
+            continue
+
+        video = plan.setdefault(vid, {"url": row[4], "nanogs": [], "talks": []})
+        if row[0] not in video["nanogs"]:
+            video["nanogs"].append(row[0])
+        talk = (row[0], row[1], row[3])
+        if talk not in video["talks"]:
+            video["talks"].append(talk)
+
+    return (plan, skipped)
+
+
+def store_transcripts(db_path, plan, workers, provider, limiter, retries):
+    """
+    fetch the planned videos which aren't already in the transcript store.  the
+    workers only fetch, everything is recorded from this thread.
+    """
+    conn = nanog_transcripts.open_store(db_path)
+
+    fetches = []
+    for (vid, details) in plan.items():
+        nanog_transcripts.link_talks(conn, vid, details["talks"])
+        if nanog_transcripts.has_transcript(conn, vid):
+            nanog_transcripts.link_nanogs(conn, vid, details["nanogs"])
+            logging.info(f"transcript previously captured: {vid} - {details['url']}")
+        else:
+            fetches.append((vid, details))
+    conn.commit()
+
+    def capture(video):
+        (vid, details) = video
+        return nanog_profile.call(
+            captureYoutubeTranscript, vid, details["url"], provider, limiter, retries
         )
-        return error
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        for ((vid, details), captured) in zip(fetches, pool.map(capture, fetches)):
+            logging.info(captured["message"])
+            if captured["status"] is None:
+                continue
+            nanog_transcripts.record_transcript(
+                conn,
+                vid,
+                details["nanogs"],
+                captured["status"],
+                segments=captured["segments"],
+                language=captured["language"],
+                error=captured["error"],
+            )
+
+    conn.close()
 
 
 def main():
@@ -84,8 +325,55 @@ def main():
         action="store",
         required=False,
     )
+    parser.add_argument(
+        "--workers",
+        help="number of concurrent transcript fetches",
+        dest="workers",
+        action="store",
+        type=int,
+        default=1,
+        required=False,
+    )
+    parser.add_argument(
+        "--rate",
+        help="max transcript requests per second, across all workers "
+        "(default: unlimited)",
+        dest="rate",
+        action="store",
+        type=float,
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--retries",
+        help="retries for transient errors",
+        dest="retries",
+        action="store",
+        type=int,
+        default=RETRIES,
+        required=False,
+    )
+    parser.add_argument(
+        "--store",
+        help="transcript store (sqlite database) to use in place of --outdir",
+        dest="store",
+        action="store",
+        required=False,
+    )
+    parser.add_argument(
+        "--stub-dir",
+        help="testing: serve transcripts from STUB_DIR/youtube-id.json",
+        dest="stub_dir",
+        action="store",
+        required=False,
+    )
+    nanog_trace.add_arguments(parser)
+    nanog_profile.add_arguments(parser)
     args = parser.parse_args()
 
+    nanog_trace.start(args, sys.modules[__name__])
+    nanog_profile.start(args, args.store or args.output_dir, __file__)
+
     logging.basicConfig(
         filename="transcript-capture.log",
         format="%(asctime)s: %(message)s",
@@ -93,13 +381,46 @@ def main():
         level=logging.INFO,
     )
 
-    with open(args.csv_file, "r", newline="") as f:
+    provider = youtube_provider
+    if args.stub_dir:
+        provider = stub_provider(args.stub_dir)
+
+    limiter = None
+    if args.rate:
+        limiter = TokenBucket(args.rate, burst=max(1, args.workers))
+
+    def get_transcript(video):
+        (vid, details) = video
+        return nanog_profile.call(
+            getYoutubeTranscript,
+            args.output_dir,
+            details["nanogs"],
+            vid,
+            details["url"],
+            provider,
+            limiter,
+            args.retries,
+        )
+
+    with nanog_trace.stage("file read"), open(args.csv_file, "r", newline="") as f:
         talk_reader = csv.reader(f)
+        talks = [row for row in talk_reader if row[4] != ""]
+
+    (plan, skipped) = plan_fetches(talks)
+    logging.info(f"fetch plan: {len(talks)} talks, {len(plan)} distinct videos")
+    for row in skipped:
+        logging.info(f"no youtube video id: {row[4]}")
+
+    if args.store:
+        store_transcripts(
+            args.store, plan, args.workers, provider, limiter, args.retries
+        )
+        return
 
-        for row in talk_reader:
-            transcript = ""
-            if row[4] != "":
-                transcript = getYoutubeTranscript(args.output_dir, row[0], row[4])
+    # map() hands back the results in CSV order, whichever worker finishes first
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for messages in pool.map(get_transcript, plan.items()):
+            for transcript in messages:
                 logging.info(transcript)
 
 
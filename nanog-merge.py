@@ -1,11 +1,18 @@
 #!/usr/bin/env python3
 
 import argparse
-import csv
+import contextlib
 import operator
-import re
+import sys
 
-from thefuzz import process
+import numpy
+from rapidfuzz import fuzz, process, utils
+
+import nanog_columnar
+import nanog_profile
+import nanog_records
+import nanog_stream
+import nanog_trace
 
 # nanog-merge.python3
 #
@@ -27,68 +34,53 @@ from thefuzz import process
 # if there's a match in both, then merge the data from the non-duplicative
 # fields and export this to the merged_speaker_data structure.
 #
+# the raw speaker data is held in memory, indexed by NANOG.  the scraped
+# speaker data is streamed through a NANOG at a time and the merged entries
+# written out as each NANOG is done.
 #
 
-# this assumes that the gsd and the ssd structures have some common fields
-BLANK_ENTRY = {  # template blank speaker entry
-    "NANOG": "",
-    "DATE": "",
-    "LOCATION": "",
-    "TALK_ORDER": "",
-    "SPEAKER": "",
-    "AFFILIATION": "",
-    "TITLE": "",
-    "TALK_TYPE": "",
-    "YOUTUBE": "",
-    "PRESO_FILES": "",
-    "DURATION_MIN": "",
-    "TAGS": "",
-    "KEYWORDS": "",
-    "ORIGIN": "",
-}
-
 # dict to store per-NANOG breakdown of speakers
 PER_NANOG_SPEAKERS = {}
 
-# dict to store dict of NANOG dates and locations, keyed by NANOG
-NANOG_INFO = {}
+# dict to store the per-NANOG lookup index over PER_NANOG_SPEAKERS
+PER_NANOG_INDEX = {}
+
+# length of the n-grams used to index the speakers and titles
+NGRAM_LEN = 3
+
+# minimum combined title/speaker score for a pairing in the matrix engine
+MATRIX_CUTOFF = 70
 
-CSV_FIELDS = [  # csv export fields in order
+COMPARE_FIELDS = [  # engine comparison export fields in order
     "NANOG",
-    "DATE",
-    "LOCATION",
-    "TALK_ORDER",
     "SPEAKER",
-    "AFFILIATION",
     "TITLE",
-    "TALK_TYPE",
-    "YOUTUBE",
-    "PRESO_FILES",
-    "DURATION_MIN",
-    "TAGS",
-    "KEYWORDS",
-    "ORIGIN",
+    "SEARCH_SPEAKER",
+    "SEARCH_TITLE",
+    "MATRIX_SPEAKER",
+    "MATRIX_TITLE",
+    "MATRIX_SCORE",
+    "AGREE",
 ]
 
+# dict to store dict of NANOG dates and locations, keyed by NANOG
+NANOG_INFO = {}
 
-def load_csv(csv_in: str) -> list:
-    """load_csv"""
-    csv_list = list()
-    with open(csv_in, "r", newline="") as csvfile:
-        csv_reader = csv.DictReader(csvfile)
-        for row in csv_reader:
-            row["NANOG"] = int(row["NANOG"])  # make this a real int
-            csv_list.append(row)
-
-    return csv_list
+# functions timed with --timings, see nanog_trace
+TRACE_STAGES = {
+    "build_index": "index build",
+    "fuzzy_choice": "fuzzy scoring",
+    "match_matrix": "fuzzy scoring",
+    "create_merged_entry": "row generation",
+}
 
 
-def create_merged_entry(search_entry, target_entry):
-    """create_merged_entry(search_entry: dict, target_entry: dict)
+def create_merged_entry(search_entry, target_entry=None):
+    """create_merged_entry(search_entry: SpeakerRecord, target_entry: SpeakerRecord)
 
-    :target_entry: entry that we found in the searched data set
+    :target_entry: entry that we found in the searched data set, or None
     :search_entry: entry that was used to search in the target data set
-    :returns: dict with the merged speaker entry across fields
+    :returns: SpeakerRecord with the merged speaker entry across fields
 
     since we're here, we can likely assume that the following fields are
     identical across the entries
@@ -98,143 +90,465 @@ def create_merged_entry(search_entry, target_entry):
     - TITLE
     """
 
-    merged_entry = BLANK_ENTRY.copy()
-    merged_entry.update(target_entry)
-    merged_entry.update(search_entry)
+    if target_entry is None:
+        merged_entry = nanog_records.overlay(search_entry)
+    else:
+        merged_entry = nanog_records.overlay(target_entry, search_entry)
 
     # override data/location with blessed info
-    merged_entry["DATE"] = NANOG_INFO[search_entry["NANOG"]]["DATE"]
-    merged_entry["LOCATION"] = NANOG_INFO[search_entry["NANOG"]]["LOCATION"]
+    merged_entry.date = NANOG_INFO[search_entry.nanog]["DATE"]
+    merged_entry.location = NANOG_INFO[search_entry.nanog]["LOCATION"]
 
     return merged_entry
 
 
-def search_entry(entry: dict, target_sd: list):
+def ngrams(text: str) -> set:
+    """ngrams - the set of NGRAM_LEN character substrings of text"""
+    return set(text[i : i + NGRAM_LEN] for i in range(len(text) - NGRAM_LEN + 1))
+
+
+def build_index(target_sd: list) -> dict:
+    """build_index(target_sd: list)
+
+    :target_sd: list of SpeakerRecords with the speaker data for a NANOG
+    :returns: dict with the lookup index for the speaker data
+
+    the index holds the case-folded SPEAKER and TITLE of each entry, and an
+    n-gram -> entry position map for each field.  any text which contains a
+    search string must contain all of the search string's n-grams, so
+    intersecting the n-gram postings narrows things down to a handful of
+    candidates which are then checked directly.
+
+    it also holds the distinct SPEAKER and TITLE values as choices for the
+    fuzzy matching, along with their preprocessed forms, so these aren't
+    rebuilt for every unmatched entry.
+    """
+    index = {
+        "entries": target_sd,
+        "speakers": [],
+        "titles": [],
+        "speaker_grams": {},
+        "title_grams": {},
+    }
+
+    # dict.fromkeys() de-dupes while keeping the order of the speaker data
+    speaker_choices = list(dict.fromkeys(e.speaker for e in target_sd))
+    title_choices = list(dict.fromkeys(e.title for e in target_sd))
+    index["speaker_choices"] = speaker_choices
+    index["speaker_keys"] = [utils.default_process(c) for c in speaker_choices]
+    index["title_choices"] = title_choices
+    index["title_keys"] = [utils.default_process(c) for c in title_choices]
+
+    # position of each entry's SPEAKER / TITLE within the choices, used to
+    # expand the matrix engine's scores back out to the entries
+    speaker_pos = {c: pos for (pos, c) in enumerate(speaker_choices)}
+    title_pos = {c: pos for (pos, c) in enumerate(title_choices)}
+    index["speaker_key_pos"] = numpy.array(
+        [speaker_pos[e.speaker] for e in target_sd], dtype=numpy.intp
+    )
+    index["title_key_pos"] = numpy.array(
+        [title_pos[e.title] for e in target_sd], dtype=numpy.intp
+    )
+
+    for (pos, e) in enumerate(target_sd):
+        speaker = e.speaker.lower()
+        title = e.title.lower()
+        index["speakers"].append(speaker)
+        index["titles"].append(title)
+        for gram in ngrams(speaker):
+            index["speaker_grams"].setdefault(gram, set()).add(pos)
+        for gram in ngrams(title):
+            index["title_grams"].setdefault(gram, set()).add(pos)
+
+    return index
+
+
+def index_candidates(grams: dict, text: str):
+    """index_candidates - positions of the entries which contain all of the
+    n-grams of text, or None if text is too short to be narrowed down.
+    """
+    if len(text) < NGRAM_LEN:
+        return None
+
+    candidates = None
+    for gram in ngrams(text):
+        postings = grams.get(gram)
+        if postings is None:
+            return set()
+        if candidates is None:
+            candidates = set(postings)
+        else:
+            candidates &= postings
+        if not candidates:
+            break
+
+    return candidates
+
+
+def lookup_entries(index: dict, speaker: str, title: str) -> list:
+    """lookup_entries - entries whose SPEAKER and TITLE contain the given
+    speaker and title, ignoring case.  results are in the original order of
+    the speaker data.
+
+    :index: lookup index from build_index()
+    :speaker: speaker (sub)string to look for
+    :title: title (sub)string to look for
+    :returns: list of the matching speaker data entries
+
+    """
+    speaker = speaker.lower()
+    title = title.lower()
+
+    speaker_pos = index_candidates(index["speaker_grams"], speaker)
+    title_pos = index_candidates(index["title_grams"], title)
+
+    if speaker_pos is None and title_pos is None:
+        candidates = range(len(index["entries"]))
+    elif speaker_pos is None:
+        candidates = sorted(title_pos)
+    elif title_pos is None:
+        candidates = sorted(speaker_pos)
+    else:
+        candidates = sorted(speaker_pos & title_pos)
+
+    return [
+        index["entries"][pos]
+        for pos in candidates
+        if speaker in index["speakers"][pos] and title in index["titles"][pos]
+    ]
+
+
+def fuzzy_choice(query: str, choices: list, keys: list):
+    """fuzzy_choice - best scoring of the choices for query
+
+    :query: string to look for
+    :choices: candidate strings, from build_index()
+    :keys: the preprocessed form of each of the choices
+    :returns: tuple of (best choice, score)
+
+    """
+    (_, score, pos) = process.extractOne(
+        utils.default_process(query), keys, scorer=fuzz.WRatio, processor=None
+    )
+    return (choices[pos], score)
+
+
+def search_entry(entry, target_sd: list, target_index: dict = None):
     """search_entry - performs a logic-addled fuzzy search for a given entry in
     the target speaker data list
 
-    :speaker_entry: dict containing the scraped entry
-    :target_sd: list of dicts containing the speaker data to sort through
-    :returns:
-        - matched_speaker_entry - a dict with the relevant merged fields or None
-        - unmatched_speaker_entry - a dict with the relevant unmerged speaker
-          data fields or None
+    :speaker_entry: SpeakerRecord for the scraped entry
+    :target_sd: list of SpeakerRecords with the speaker data to sort through
+    :target_index: lookup index over target_sd, see build_index()
+    :returns: the matching entry from target_sd, or None
 
     """
     speaker = []
-    matched_speaker_entry = {}  # dict with the matched speaker entry
-    unmatched_speaker_entry = {}  # dict with the matched speaker entry
-
-    speaker_exact = list(
-        filter(
-            lambda target_entry: (
-                re.search(
-                    re.escape(entry["SPEAKER"]), target_entry["SPEAKER"], re.IGNORECASE
-                )
-                and re.search(
-                    re.escape(entry["TITLE"]), target_entry["TITLE"], re.IGNORECASE
-                )
-            ),
-            target_sd,
-        )
-    )
+
+    if target_index is None:
+        target_index = build_index(target_sd)
+
+    speaker_exact = lookup_entries(target_index, entry.speaker, entry.title)
 
     if len(speaker_exact) == 1:
-        print(f'exact match: {entry["NANOG"]}: {entry["SPEAKER"]} - {entry["TITLE"]}')
+        print(f'exact match: {entry.nanog}: {entry.speaker} - {entry.title}')
+        nanog_trace.count("search exact match")
         speaker = speaker_exact
 
     else:
         print(
-            f'attempting fuzzy match: {entry["NANOG"]}: '
-            f'{entry["SPEAKER"]} - {entry["TITLE"]}'
+            f'attempting fuzzy match: {entry.nanog}: '
+            f'{entry.speaker} - {entry.title}'
         )
 
-        # this is expensive, but should yield something to search on
-        titles = set(e["TITLE"] for e in target_sd)
-        speakers = set(e["SPEAKER"] for e in target_sd)
-        fuzzy_title = process.extractOne(entry["TITLE"], titles)
-        fuzzy_speaker = process.extractOne(entry["SPEAKER"], speakers)
-
-        speaker_fuzzy = list(
-            filter(
-                lambda target_entry: (
-                    re.search(
-                        re.escape(fuzzy_title[0]), target_entry["TITLE"], re.IGNORECASE
-                    )
-                    and re.search(
-                        re.escape(fuzzy_speaker[0]),
-                        target_entry["SPEAKER"],
-                        re.IGNORECASE,
-                    )
-                ),
-                target_sd,
-            )
+        fuzzy_title = fuzzy_choice(
+            entry.title, target_index["title_choices"], target_index["title_keys"]
+        )
+        fuzzy_speaker = fuzzy_choice(
+            entry.speaker,
+            target_index["speaker_choices"],
+            target_index["speaker_keys"],
+        )
+
+        speaker_fuzzy = lookup_entries(
+            target_index, fuzzy_speaker[0], fuzzy_title[0]
         )
         if len(speaker_fuzzy) > 0:
             print(
-                f'fuzzy match: {speaker_fuzzy[0]["NANOG"]}: '
-                f'{speaker_fuzzy[0]["SPEAKER"]} - {speaker_fuzzy[0]["TITLE"]}'
+                f'fuzzy match: {speaker_fuzzy[0].nanog}: '
+                f'{speaker_fuzzy[0].speaker} - {speaker_fuzzy[0].title}'
             )
+            nanog_trace.count("search fuzzy match")
             speaker = speaker_fuzzy
         else:
             print(
-                f'fuzzy fail: {entry["NANOG"]}: {entry["SPEAKER"]} - {entry["TITLE"]}'
+                f'fuzzy fail: {entry.nanog}: {entry.speaker} - {entry.title}'
             )
+            nanog_trace.count("search fuzzy fail")
 
     if len(speaker) == 1:
         # we have a match! fuzzy or exact.
-        matched_speaker_entry = create_merged_entry(entry, speaker[0])
-        unmatched_speaker_entry = None
-    else:
-        print(
-            f'unmatched entry: {entry["NANOG"]}: {entry["SPEAKER"]} - {entry["TITLE"]}'
-        )
-        matched_speaker_entry = None
-        unmatched_speaker_entry = create_merged_entry(entry, BLANK_ENTRY.copy())
+        return speaker[0]
+
+    print(f'unmatched entry: {entry.nanog}: {entry.speaker} - {entry.title}')
+    nanog_trace.count("search unmatched")
+    return None
 
-    return matched_speaker_entry, unmatched_speaker_entry
 
+def match_matrix(entries: list, target_sd: list, target_index: dict) -> list:
+    """match_matrix - pairs up all of the scraped entries for a NANOG with the
+    target speaker data in one go.
 
-def filter_nanogs(nog_set, dataset):
-    """filter_nanogs - given a set, return a LoD that has the relevant entries.
+    every entry is scored against every target entry in a single cdist call
+    per field, the combined score being the mean of the title and speaker
+    scores.  pairs are then assigned greedily, best score first, with each
+    target entry claimed at most once.
 
-    :nog_set: set - NANOG meetings to filter for speakers
-    :dataset: dataset to filter
-    :returns: list of NANOG speakers for associated NANOG meetings
+    :entries: list of SpeakerRecords for the scraped entries for the NANOG
+    :target_sd: list of SpeakerRecords with the speaker data for the NANOG
+    :target_index: lookup index over target_sd, see build_index()
+    :returns: list of (matching target entry or None, score) tuples, one per
+              entry
 
     """
+    title_scores = process.cdist(
+        [utils.default_process(e.title) for e in entries],
+        target_index["title_keys"],
+        scorer=fuzz.WRatio,
+        processor=None,
+        workers=-1,
+    )[:, target_index["title_key_pos"]]
+    speaker_scores = process.cdist(
+        [utils.default_process(e.speaker) for e in entries],
+        target_index["speaker_keys"],
+        scorer=fuzz.WRatio,
+        processor=None,
+        workers=-1,
+    )[:, target_index["speaker_key_pos"]]
+    scores = (title_scores + speaker_scores) / 2
+
+    matches = [(None, 0.0)] * len(entries)
+    claimed = set()
+    for flat_pos in numpy.argsort(-scores, axis=None, kind="stable"):
+        (i, j) = divmod(int(flat_pos), len(target_sd))
+        score = float(scores[i, j])
+        if score < MATRIX_CUTOFF:
+            break
+        if matches[i][0] is not None or j in claimed:
+            continue
+
+        matches[i] = (target_sd[j], score)
+        claimed.add(j)
+
+    for (entry, (target, score)) in zip(entries, matches):
+        if target is not None:
+            print(
+                f'matrix match: {entry.nanog}: {entry.speaker} - '
+                f'{entry.title} ({score:.0f}): '
+                f'{target.speaker} - {target.title}'
+            )
+            nanog_trace.count("matrix match")
+        else:
+            print(
+                f'unmatched entry: {entry.nanog}: '
+                f'{entry.speaker} - {entry.title}'
+            )
+            nanog_trace.count("matrix unmatched")
 
-    nanogs = list(filter(lambda entry: entry["NANOG"] in nog_set, dataset))
-    return nanogs
+    return matches
 
 
-def get_nanogs(speaker_data):
-    """get_nanogs(speaker_data: list)
+def match_all_matrix(entries: list) -> list:
+    """match_all_matrix - runs match_matrix() for each NANOG in the entries
 
-    :speaker_data: list of dicts that have the associated speaker data
-    :returns: a set of NANOGs found within the speaker_data
+    :entries: list of SpeakerRecords for the scraped entries
+    :returns: list of (matching target entry or None, score) tuples, one per
+              entry, in the order of entries
 
     """
-    nanogs = set(int(entry["NANOG"]) for entry in speaker_data)
-    return set(sorted(nanogs))
+    per_nanog = {}  # entry positions keyed by NANOG
+    for (pos, entry) in enumerate(entries):
+        per_nanog.setdefault(entry.nanog, []).append(pos)
+
+    matches = [(None, 0.0)] * len(entries)
+    for (nanog, positions) in per_nanog.items():
+        nanog_matches = match_matrix(
+            [entries[pos] for pos in positions],
+            PER_NANOG_SPEAKERS[nanog],
+            PER_NANOG_INDEX[nanog],
+        )
+        for (pos, match) in zip(positions, nanog_matches):
+            matches[pos] = match
 
+    return matches
 
-def write_csv(csvfile_out, fields, dataset):
-    """write_csv - pretty self-evident
 
-    :csvfile_out: path to the csv file to export
-    :fields: list of the fieldnames to export
-    :data: LoD with the rows to be written
-    :returns: nothing
+def compare_engines(
+    entries: list, search_matches: list, matrix_matches: list, tally: dict
+):
+    """compare_engines - lines up the search and matrix engine results
+
+    :entries: list of SpeakerRecords for the scraped entries
+    :search_matches: search_entry() result for each entry
+    :matrix_matches: match_all_matrix() result for each entry
+    :tally: running totals across calls, see print_comparison()
+    :returns: LoD with a row per entry, see COMPARE_FIELDS
 
     """
-    with open(csvfile_out, "w", newline="") as csvout:
-        writer = csv.DictWriter(csvout, fieldnames=fields)
-        writer.writeheader()
-        for row in dataset:
-            writer.writerow(row)
+    comparison = []
+    for (entry, s_match, (m_match, m_score)) in zip(
+        entries, search_matches, matrix_matches
+    ):
+        row = {
+            "NANOG": entry.nanog,
+            "SPEAKER": entry.speaker,
+            "TITLE": entry.title,
+            "SEARCH_SPEAKER": "",
+            "SEARCH_TITLE": "",
+            "MATRIX_SPEAKER": "",
+            "MATRIX_TITLE": "",
+            "MATRIX_SCORE": "",
+            "AGREE": s_match is m_match,
+        }
+        if s_match is not None:
+            row["SEARCH_SPEAKER"] = s_match.speaker
+            row["SEARCH_TITLE"] = s_match.title
+        if m_match is not None:
+            row["MATRIX_SPEAKER"] = m_match.speaker
+            row["MATRIX_TITLE"] = m_match.title
+            row["MATRIX_SCORE"] = f"{m_score:.1f}"
+        comparison.append(row)
+
+    # the search engine matches each entry independently, so a target entry
+    # can be claimed more than once.
+    claims = {}
+    for s_match in search_matches:
+        if s_match is not None:
+            claims[id(s_match)] = claims.get(id(s_match), 0) + 1
+
+    counts = {
+        "search": sum(m is not None for m in search_matches),
+        "matrix": sum(m is not None for (m, _) in matrix_matches),
+        "agree": sum(row["AGREE"] for row in comparison),
+        "disagree": sum(not row["AGREE"] for row in comparison),
+        "claimed": sum(c > 1 for c in claims.values()),
+        "entries": len(entries),
+    }
+    for (k, v) in counts.items():
+        tally[k] = tally.get(k, 0) + v
+
+    return comparison
+
+
+def print_comparison(tally):
+    """print_comparison - summary of the compare_engines() totals"""
+    print(
+        "engine comparison: "
+        f"search matched {tally.get('search', 0)}, "
+        f"matrix matched {tally.get('matrix', 0)}, "
+        f"agree {tally.get('agree', 0)}, "
+        f"disagree {tally.get('disagree', 0)}, "
+        f"target entries claimed more than once by search "
+        f"{tally.get('claimed', 0)} of {tally.get('entries', 0)} entries"
+    )
+
+
+def walk_nanogs(raw_nanogs, scraped_groups):
+    """walk_nanogs - walks the NANOGs of both datasets in ascending order.
+
+    :raw_nanogs: list of the NANOGs in the raw speaker data
+    :scraped_groups: iterable of (nanog, list of scraped entries), in ascending
+                     NANOG order (see nanog_stream.nanog_groups())
+    :returns: generator of (nanog, list of scraped entries) tuples, the list is
+              empty for NANOGs only found in the raw speaker data
+
+    """
+    pending = sorted(raw_nanogs)
+    pos = 0
+    for (nanog, scraped) in scraped_groups:
+        while pos < len(pending) and pending[pos] < nanog:
+            yield (pending[pos], [])
+            pos += 1
+        if pos < len(pending) and pending[pos] == nanog:
+            pos += 1
+        yield (nanog, scraped)
+
+    for nanog in pending[pos:]:
+        yield (nanog, [])
+
+
+def merge_nanog(nanog, scraped, engine, fullmerge, tally=None):
+    """merge_nanog - merge a single NANOG's entries.  the NANOG's raw speaker
+    data (and its index) are dropped once it's done.
+
+    :nanog: NANOG number
+    :scraped: list of the NANOG's scraped entries
+    :engine: matching engine, "search" or "matrix"
+    :fullmerge: add unmatched scraped entries to the merged entries
+    :tally: engine comparison totals, None unless both engines are to be run
+            and their matches compared (see compare_engines())
+    :returns: tuple of (merged entries, unmatched scraped entries, engine
+              comparison), each sorted for export
+
+    """
+    raw = PER_NANOG_SPEAKERS.pop(nanog, [])
+
+    merged_speakers = []  # merged entries
+    unmatched_scraped_entries = []  # scraped entries which don't match in the rsd
+    comparison = []
+
+    if not scraped or not raw:
+        # the data sets are not entirely aligned.  some NANOGs are tracked only
+        # in one of the datasets, these go straight into the mix.
+        for speaker in raw or scraped:
+            tmp_spkr = nanog_records.overlay(speaker)
+            # override data/location with blessed info
+            tmp_spkr.date = NANOG_INFO[speaker.nanog]["DATE"]
+            tmp_spkr.location = NANOG_INFO[speaker.nanog]["LOCATION"]
+            merged_speakers.append(tmp_spkr)
+        merged_speakers.sort(key=operator.attrgetter("nanog", "talk_order", "speaker"))
+        return (merged_speakers, unmatched_scraped_entries, comparison)
+
+    # see what we have with the intersection of the ssd content with the rsd
+    # content.
+    PER_NANOG_SPEAKERS[nanog] = raw
+    PER_NANOG_INDEX[nanog] = build_index(raw)
+    compare = tally is not None
+
+    search_matches = []
+    if engine == "search" or compare:
+        for entry in scraped:
+            search_matches.append(search_entry(entry, raw, PER_NANOG_INDEX[nanog]))
+
+    matrix_matches = []
+    if engine == "matrix" or compare:
+        matrix_matches = match_all_matrix(scraped)
+
+    if compare:
+        comparison = compare_engines(scraped, search_matches, matrix_matches, tally)
+
+    del PER_NANOG_SPEAKERS[nanog]
+    del PER_NANOG_INDEX[nanog]
+
+    matches = search_matches
+    if engine == "matrix":
+        matches = [m for (m, _) in matrix_matches]
+
+    for (entry, match) in zip(scraped, matches):
+        if match is not None:
+            merged_speakers.append(create_merged_entry(entry, match))
+        elif fullmerge:
+            merged_speakers.append(create_merged_entry(entry))
+        else:
+            unmatched_scraped_entries.append(
+                create_merged_entry(entry)
+            )
 
-    return
+    # sort based on NANOG, then speaker for export
+    merged_speakers.sort(key=operator.attrgetter("nanog", "talk_order", "speaker"))
+    unmatched_scraped_entries.sort(key=operator.attrgetter("nanog", "speaker"))
+
+    return (merged_speakers, unmatched_scraped_entries, comparison)
 
 
 def load_nanog_info(nanog_info_csv):
@@ -245,11 +559,10 @@ def load_nanog_info(nanog_info_csv):
 
     """
     _nanog_info = {}
-    ninfo = load_csv(nanog_info_csv)
-    for n in ninfo:
-        _nanog_info[n["NANOG"]] = {
-            "DATE": n["DATE"],
-            "LOCATION": n["LOCATION"],
+    for n in nanog_records.read_records(nanog_info_csv):
+        _nanog_info[n.nanog] = {
+            "DATE": n.date,
+            "LOCATION": n.location,
         }
 
     return _nanog_info
@@ -259,14 +572,14 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--raw-speaker-data",
-        help="raw speaker data",
+        help="raw speaker data (csv, or .parquet / .arrow)",
         dest="raw_speaker_data",
         action="store",
         required=True,
     )
     parser.add_argument(
         "--scraped-speaker-data",
-        help="scraped speaker data",
+        help="scraped speaker data (csv, or .parquet / .arrow)",
         dest="scraped_speaker_data",
         action="store",
         required=True,
@@ -280,14 +593,14 @@ def main():
     )
     parser.add_argument(
         "--merged-csv-out",
-        help="csv file to output merged entries",
+        help="csv file to output merged entries (or .parquet / .arrow)",
         dest="merged_csv_out",
         action="store",
         required=False,
     )
     parser.add_argument(
         "--unmatched-csv-out",
-        help="csv file to output unmatched",
+        help="csv file to output unmatched (or .parquet / .arrow)",
         dest="unmatched_csv_out",
         action="store",
         required=False,
@@ -299,82 +612,72 @@ def main():
         action="store_true",
         required=False,
     )
+    parser.add_argument(
+        "--engine",
+        help="matching engine: per-entry search or all-pairs matrix",
+        dest="engine",
+        action="store",
+        choices=["search", "matrix"],
+        default="search",
+        required=False,
+    )
+    parser.add_argument(
+        "--compare-csv-out",
+        help="run both engines and output a csv comparing their matches",
+        dest="compare_csv_out",
+        action="store",
+        required=False,
+    )
+    nanog_trace.add_arguments(parser)
+    nanog_profile.add_arguments(parser)
     args = parser.parse_args()
 
-    rsd = load_csv(args.raw_speaker_data)
-    ssd = load_csv(args.scraped_speaker_data)
+    nanog_trace.start(args, sys.modules[__name__], nanog_columnar)
+    nanog_profile.start(
+        args,
+        args.merged_csv_out or args.unmatched_csv_out or args.compare_csv_out,
+        __file__,
+    )
 
     global NANOG_INFO
     NANOG_INFO = load_nanog_info(args.nanog_dates_locs)
 
-    # the data sets are not entirely aligned.  some NANOGs are tracked only in
-    # one of the datasets.  get a list of the respective raw and scraped NANOGs
-    rsd_nanogs = get_nanogs(rsd)
-    ssd_nanogs = get_nanogs(ssd)
-
-    # extract the respective sets
-    rsd_only = rsd_nanogs.difference(ssd_nanogs)
-    ssd_only = ssd_nanogs.difference(rsd_nanogs)
-    intersecting_sd = rsd_nanogs.intersection(ssd_nanogs)
-
-    # filter the datasets to relevant NANOGs
-    rsd_nanog_speakers = filter_nanogs(rsd_only, rsd)
-    ssd_nanog_speakers = filter_nanogs(ssd_only, ssd)
-    # grabs all of the entries from the scraped speaker data to be used to
-    # search against the raw speaker data
-    shared_nanog_speakers = filter_nanogs(intersecting_sd, ssd)
-
-    # generate a dict of LoDs containing the raw speaker data keyed by nanog
-    # this speeds up the fuzzy searching
-    for n in intersecting_sd:
-        m = list(filter(lambda e: e["NANOG"] == n, rsd))
-        PER_NANOG_SPEAKERS[n] = m
-
-    merged_speakers = []  # merged entries
-    unmatched_scraped_entries = []  # scraped entries which don't match in the rsd
+    # the raw speaker data is indexed by NANOG up front, the scraped speaker
+    # data is then streamed against it a NANOG at a time.  merged entries are
+    # written out as each NANOG is finished.
+    for raw_speaker in nanog_stream.iter_csv(args.raw_speaker_data):
+        PER_NANOG_SPEAKERS.setdefault(raw_speaker.nanog, []).append(raw_speaker)
 
-    # first pass - add the NANOGs that are rsd_only into the mix
-    for raw_speaker in rsd_nanog_speakers:
-        tmp_spkr = BLANK_ENTRY.copy()
-        tmp_spkr.update(raw_speaker)
-        # override data/location with blessed info
-        tmp_spkr["DATE"] = NANOG_INFO[raw_speaker["NANOG"]]["DATE"]
-        tmp_spkr["LOCATION"] = NANOG_INFO[raw_speaker["NANOG"]]["LOCATION"]
-        merged_speakers.append(tmp_spkr)
-
-    # second pass - add the NANOGs that are ssd_only into the mix
-    for scraped_speaker in ssd_nanog_speakers:
-        tmp_spkr = BLANK_ENTRY.copy()
-        tmp_spkr.update(scraped_speaker)
-        # override data/location with blessed info
-        tmp_spkr["DATE"] = NANOG_INFO[scraped_speaker["NANOG"]]["DATE"]
-        tmp_spkr["LOCATION"] = NANOG_INFO[scraped_speaker["NANOG"]]["LOCATION"]
-        merged_speakers.append(tmp_spkr)
+    scraped_groups = nanog_stream.nanog_groups(args.scraped_speaker_data)
 
-    # see what we have with the intersection of the ssd content with the rsd
-    # content.
-    for entry in shared_nanog_speakers:
-        merged_speaker, unmatched_entry = search_entry(
-            entry, PER_NANOG_SPEAKERS[entry["NANOG"]]
+    with contextlib.ExitStack() as stack:
+        write_merged = nanog_stream.record_writer(
+            stack, args.merged_csv_out, nanog_records.MERGED_FIELDS
+        )
+        write_unmatched = nanog_stream.record_writer(
+            stack, args.unmatched_csv_out, nanog_records.MERGED_FIELDS
+        )
+        compare_writer = nanog_stream.dict_writer(
+            stack, args.compare_csv_out, COMPARE_FIELDS
         )
-        if merged_speaker is not None:
-            merged_speakers.append(merged_speaker)
-
-        if unmatched_entry is not None:
-            if args.fullmerge:
-                merged_speakers.append(unmatched_entry)
-            else:
-                unmatched_scraped_entries.append(unmatched_entry)
-
-    # sort based on NANOG, then speaker for export
-    merged_speakers.sort(key=operator.itemgetter("NANOG", "TALK_ORDER", "SPEAKER"))
-    unmatched_scraped_entries.sort(key=operator.itemgetter("NANOG", "SPEAKER"))
 
-    if args.merged_csv_out:
-        write_csv(args.merged_csv_out, CSV_FIELDS, merged_speakers)
+        tally = None
+        if compare_writer is not None:
+            tally = {}
 
-    if args.unmatched_csv_out:
-        write_csv(args.unmatched_csv_out, CSV_FIELDS, unmatched_scraped_entries)
+        for (nanog, scraped) in walk_nanogs(list(PER_NANOG_SPEAKERS), scraped_groups):
+            (merged, unmatched, comparison) = merge_nanog(
+                nanog, scraped, args.engine, args.fullmerge, tally
+            )
+            if write_merged is not None:
+                write_merged(merged)
+            if write_unmatched is not None:
+                write_unmatched(unmatched)
+            if compare_writer is not None:
+                compare_writer.writerows(comparison)
+
+        if tally is not None:
+            print_comparison(tally)
 
 
 if __name__ == "__main__":
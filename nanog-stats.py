@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import os.path
+import sqlite3
+import sys
+
+import nanog_cache
+import nanog_stats
+
+# nanog-stats.py
+#
+# speaker statistics over the scraped corpus: talks per speaker, affiliation
+# and meeting, a speaker's first and last appearance and attendee to speaker
+# conversion.  the exports are loaded into a SQLite stats store (see
+# nanog_stats) which is reused until one of them changes, and `query` runs
+# ad-hoc SQL against it.
+#
+
+DEFAULT_DB = os.path.join(nanog_cache.DEFAULT_CACHE_DIR, "stats.db")
+
+
+def print_table(rows):
+    """print_table - print query result rows (sqlite3.Row) as aligned columns"""
+    if not rows:
+        print("no results")
+        return
+
+    columns = rows[0].keys()
+    cells = [["" if v is None else str(v) for v in row] for row in rows]
+    widths = [
+        max(len(c), *(len(r[i]) for r in cells)) for (i, c) in enumerate(columns)
+    ]
+    for line in [columns, ["-" * w for w in widths]] + cells:
+        print("  ".join(v.ljust(w) for (v, w) in zip(line, widths)).rstrip())
+
+
+def print_speaker(name, stats, talks):
+    """print_speaker - a speaker's summary followed by their talks"""
+    if stats is None:
+        print(f"no talks found for {name}")
+        return
+
+    print(
+        f"{stats['speaker']}: {stats['talks']} talks at {stats['meetings']} "
+        f"meetings, NANOG {stats['first_nanog']} - NANOG {stats['last_nanog']}"
+    )
+    if stats["first_attended"] is not None:
+        print(
+            f"attended {stats['meetings_attended']} meetings, "
+            f"first NANOG {stats['first_attended']}"
+        )
+    print()
+    print_table(talks)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--db",
+        help=f"stats store (sqlite database, default: {DEFAULT_DB})",
+        dest="db",
+        action="store",
+        default=DEFAULT_DB,
+        required=False,
+    )
+    parser.add_argument(
+        "--talks",
+        help="agenda or merged speaker export (csv, or .parquet / .arrow)",
+        dest="talks",
+        action="store",
+        required=False,
+    )
+    parser.add_argument(
+        "--attendees",
+        help="attendee export (csv, or .parquet / .arrow)",
+        dest="attendees",
+        action="store",
+        required=False,
+    )
+    parser.add_argument(
+        "--nanog-dates-locs",
+        help="NANOG dates and locations (csv)",
+        dest="meetings",
+        action="store",
+        required=False,
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    for (command, help_text) in [
+        ("speakers", "speakers with the most talks"),
+        ("affiliations", "affiliations with the most talks"),
+    ]:
+        top_parser = subparsers.add_parser(command, help=help_text)
+        top_parser.add_argument(
+            "--top",
+            help="number of entries to list",
+            dest="top",
+            action="store",
+            type=int,
+            default=20,
+            required=False,
+        )
+
+    subparsers.add_parser("meetings", help="talks, speakers and attendees per NANOG")
+
+    speaker_parser = subparsers.add_parser(
+        "speaker", help="a speaker's first / last appearance and talks"
+    )
+    speaker_parser.add_argument("name", help="speaker name")
+
+    subparsers.add_parser("conversion", help="attendee to speaker conversion")
+
+    query_parser = subparsers.add_parser(
+        "query", help="run an ad-hoc SQL query against the stats store"
+    )
+    query_parser.add_argument(
+        "sql", help="e.g. 'SELECT * FROM speaker_stats WHERE first_nanog > 70'"
+    )
+    args = parser.parse_args()
+
+    sources = {}
+    for (kind, path) in [
+        ("talks", args.talks),
+        ("attendees", args.attendees),
+        ("meetings", args.meetings),
+    ]:
+        if path:
+            sources[kind] = os.path.abspath(path)
+
+    if args.db == DEFAULT_DB:
+        os.makedirs(os.path.dirname(DEFAULT_DB), exist_ok=True)
+    conn = nanog_stats.open_stats(args.db)
+
+    counts = nanog_stats.refresh(conn, sources)
+    if counts is not None:
+        loaded = ", ".join(f"{count} {kind}" for (kind, count) in counts.items())
+        print(f"loaded {loaded}", file=sys.stderr)
+
+    if args.command == "speakers":
+        print_table(nanog_stats.top_speakers(conn, args.top))
+    elif args.command == "affiliations":
+        print_table(nanog_stats.top_affiliations(conn, args.top))
+    elif args.command == "meetings":
+        print_table(nanog_stats.meeting_summary(conn))
+    elif args.command == "speaker":
+        (stats, talks) = nanog_stats.speaker_history(conn, args.name)
+        print_speaker(args.name, stats, talks)
+    elif args.command == "conversion":
+        print_table([nanog_stats.conversion(conn)])
+    else:
+        try:
+            print_table(conn.execute(args.sql).fetchall())
+        except sqlite3.Error as e:
+            parser.error(f"bad query: {e}")
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import datetime
+import os
+import os.path
+import re
+import sqlite3
+
+import nanog_transcripts
+import nanog_youtube
+
+# nanog-transcript-store.py
+#
+# moves transcripts between the directory layout written by
+# nanog-get-youtube-transcript.py --outdir (nanog-#-youtube-id.txt and
+# errors-#-youtube-id.txt) and the transcript store, and searches the
+# store's transcripts.
+#
+
+# NANOG numbers don't contain a "-", youtube ids can
+TRANSCRIPT_FILE_RE = re.compile(r"^(nanog|errors)-([^-]+)-(.+)\.txt$")
+
+
+def import_dir(conn, transcript_dir):
+    """import_dir - load a transcript directory into the store.  videos which
+    are already in the store only pick up the additional NANOG references.
+
+    :conn: transcript store
+    :transcript_dir: directory of transcript / error files
+    :returns: tuple of (imported, skipped) file counts
+
+    """
+    imported = 0
+    skipped = 0
+    for name in sorted(os.listdir(transcript_dir)):
+        m = TRANSCRIPT_FILE_RE.match(name)
+        if not m:
+            continue
+
+        (kind, nanog, video_id) = m.groups()
+        if nanog_transcripts.has_transcript(conn, video_id):
+            nanog_transcripts.link_nanogs(conn, video_id, [nanog])
+            conn.commit()
+            skipped += 1
+            continue
+
+        path = os.path.join(transcript_dir, name)
+        fetched = datetime.datetime.fromtimestamp(
+            os.path.getmtime(path), datetime.timezone.utc
+        ).isoformat()
+        with open(path, "r", encoding="utf-8") as f:
+            content = f.read()
+
+        if kind == "nanog":
+            nanog_transcripts.record_transcript(
+                conn,
+                video_id,
+                [nanog],
+                nanog_transcripts.CAPTURED,
+                text=content,
+                fetched=fetched,
+            )
+        else:
+            nanog_transcripts.record_transcript(
+                conn,
+                video_id,
+                [nanog],
+                nanog_transcripts.UNAVAILABLE,
+                error=content,
+                fetched=fetched,
+            )
+        imported += 1
+
+    return (imported, skipped)
+
+
+def import_talks(conn, csv_file):
+    """import_talks - attach the talk details (NANOG, speaker, title) from an
+    agenda CSV to the videos they reference.
+
+    :conn: transcript store
+    :csv_file: CSV file of all talks
+    :returns: count of talk rows with a youtube video
+
+    """
+    talks = 0
+    with open(csv_file, "r", newline="") as f:
+        for row in csv.reader(f):
+            vid = nanog_youtube.video_id(row[4])
+            if vid is None:
+                continue
+            nanog_transcripts.link_talks(conn, vid, [(row[0], row[1], row[3])])
+            talks += 1
+    conn.commit()
+
+    return talks
+
+
+def format_offset(start):
+    """format_offset - hh:mm:ss for an offset in seconds"""
+    if start is None:
+        return "--:--:--"
+
+    (minutes, seconds) = divmod(int(start), 60)
+    (hours, minutes) = divmod(minutes, 60)
+
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+def print_hits(hits):
+    """print_hits - a block per hit: offset, link, the talks and the matching
+    transcript segment.  panels are listed once, with all of their speakers.
+    """
+    for hit in hits:
+        print(f"{format_offset(hit['start'])}  {hit['link']}")
+        talks = {}
+        for (nanog, speaker, title) in hit["talks"]:
+            speakers = talks.setdefault((nanog, title), [])
+            if speaker:
+                speakers.append(speaker)
+        for ((nanog, title), speakers) in talks.items():
+            details = " - ".join(d for d in [", ".join(speakers), title] if d)
+            print(f"  NANOG {nanog}: {details}".rstrip(": "))
+        print(f"    {hit['text']}")
+        print()
+
+
+def export_dir(conn, transcript_dir):
+    """export_dir - write the store back out in the directory layout, a file
+    per NANOG referencing each video.
+
+    :conn: transcript store
+    :transcript_dir: directory for the transcript / error files
+    :returns: count of files written
+
+    """
+    os.makedirs(transcript_dir, exist_ok=True)
+
+    written = 0
+    for (entry, nanogs) in nanog_transcripts.iter_transcripts(conn):
+        if entry["status"] == nanog_transcripts.CAPTURED:
+            prefix = "nanog-"
+            content = nanog_transcripts.transcript_text(conn, entry)
+        else:
+            prefix = "errors-"
+            content = entry["error"] or ""
+
+        for nanog in nanogs:
+            path = os.path.join(
+                transcript_dir, prefix + str(nanog) + "-" + entry["video_id"] + ".txt"
+            )
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content)
+            written += 1
+
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("db", help="transcript store (sqlite database)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser(
+        "import", help="import a transcript directory into the store"
+    )
+    import_parser.add_argument("transcript_dir", help="transcript directory")
+    import_parser.add_argument(
+        "--talks",
+        help="agenda CSV file to take the talk details (speaker, title) from",
+        dest="talks_csv",
+        action="store",
+        required=False,
+    )
+
+    export_parser = subparsers.add_parser(
+        "export", help="export the store to a transcript directory"
+    )
+    export_parser.add_argument("transcript_dir", help="transcript directory")
+
+    search_parser = subparsers.add_parser(
+        "search", help="full-text search of the transcripts"
+    )
+    search_parser.add_argument(
+        "query", help='FTS5 query, e.g. flowspec or "segment routing"'
+    )
+    search_parser.add_argument(
+        "--limit",
+        help="max number of hits to show",
+        dest="limit",
+        action="store",
+        type=int,
+        default=20,
+        required=False,
+    )
+
+    subparsers.add_parser(
+        "reindex", help="rebuild the search index from the stored transcripts"
+    )
+    args = parser.parse_args()
+
+    conn = nanog_transcripts.open_store(args.db)
+
+    if args.command == "import":
+        (imported, skipped) = import_dir(conn, args.transcript_dir)
+        print(f"imported {imported} files, {skipped} already in the store")
+        if args.talks_csv:
+            talks = import_talks(conn, args.talks_csv)
+            print(f"linked {talks} talks")
+    elif args.command == "export":
+        written = export_dir(conn, args.transcript_dir)
+        print(f"exported {written} files")
+    elif args.command == "search":
+        try:
+            hits = nanog_transcripts.search(conn, args.query, args.limit)
+        except sqlite3.OperationalError as e:
+            parser.error(f"bad search query: {e}")
+        print_hits(hits)
+    else:
+        indexed = nanog_transcripts.reindex(conn)
+        print(f"indexed {indexed} transcripts")
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import glob
+import os.path
+
+# nanog_batch.py
+#
+# helpers for the scrapers' batch modes, which handle a whole range of NANOG
+# meetings in a single run.
+#
+
+
+def parse_nanog_range(nanog_range):
+    """parse_nanog_range - turn "13-76" (or a single "42") into a list of NANOG
+    numbers, inclusive of both ends.
+    """
+    (start, _, end) = nanog_range.partition("-")
+    if end == "":
+        end = start
+
+    return list(range(int(start), int(end) + 1))
+
+
+def find_nanog_files(file_glob, file_re, nanogs):
+    """find_nanog_files - locate the source file for each of the requested
+    NANOGs.
+
+    :file_glob: directory holding the files, or a glob pattern
+    :file_re: compiled regex matching the file names, with the NANOG number as
+              the first group
+    :nanogs: list of NANOG numbers we're interested in
+    :returns: dict of file paths keyed by NANOG number
+
+    """
+    if os.path.isdir(file_glob):
+        file_glob = os.path.join(file_glob, "*")
+
+    nanog_files = {}
+    for path in sorted(glob.glob(file_glob)):
+        m = file_re.match(os.path.basename(path))
+        if not m or int(m.group(1)) not in nanogs:
+            continue
+
+        nanog = int(m.group(1))
+        # prefer the lower case name where a file is present in both forms
+        name = os.path.basename(path)
+        if nanog not in nanog_files or name == name.lower():
+            nanog_files[nanog] = path
+
+    return nanog_files
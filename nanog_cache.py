@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import os.path
+import tempfile
+
+# nanog_cache.py
+#
+# on-disk cache of the rows extracted from the agenda and attendee files.
+#
+# entries are keyed on the sha256 of the source file's content plus a stamp of
+# the code that produced them (the scraper sources and the parser in use) and
+# any per-file parameters (NANOG number, URL base, etc.).  a re-export only has
+# to parse files which have changed, or whose parsing code has.
+#
+# each entry is a small JSON file in the cache directory.  hits touch the
+# entry's mtime, and when the directory grows past MAX_CACHE_BYTES the least
+# recently used entries are evicted.
+#
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "nanog-scrape")
+
+# size cap for the cache directory
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+# functions timed with --timings, see nanog_trace
+TRACE_STAGES = {"load": "cache read", "store": "cache write"}
+
+
+def file_digest(path):
+    """file_digest - sha256 hex digest of the file's content"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def code_stamp(*paths):
+    """code_stamp - version stamp for the code that generates the cached rows.
+
+    :paths: source files whose changes should invalidate the cache
+    :returns: hex digest over the content of the source files
+
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(file_digest(path).encode())
+
+    return digest.hexdigest()
+
+
+def cache_key(source_file, stamp, params):
+    """cache_key - composite cache key for a source file
+
+    :source_file: path to the file being parsed
+    :stamp: code version stamp, see code_stamp()
+    :params: list of the parameters which influence the parse
+    :returns: hex digest used as the entry name
+
+    """
+    digest = hashlib.sha256()
+    digest.update(file_digest(source_file).encode())
+    digest.update(stamp.encode())
+    digest.update(json.dumps(params).encode())
+
+    return digest.hexdigest()
+
+
+def load(cache_dir, key):
+    """load - returns the cached rows for key, or None on a miss"""
+    entry = os.path.join(cache_dir, key + ".json")
+    try:
+        with open(entry, "r", encoding="utf-8") as f:
+            rows = json.load(f)
+        os.utime(entry)  # mark as recently used
+    except (OSError, ValueError):
+        return None
+
+    return rows
+
+
+def contains(cache_dir, key):
+    """contains - is there a cache entry for key"""
+    return os.path.exists(os.path.join(cache_dir, key + ".json"))
+
+
+def store(cache_dir, key, rows):
+    """store - write the rows for key into the cache and evict if we're now
+    over the size cap.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # write to a temp file and move into place, workers may be storing entries
+    # in parallel.
+    (fd, tmp_path) = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(rows, f)
+    os.replace(tmp_path, os.path.join(cache_dir, key + ".json"))
+
+    evict(cache_dir, MAX_CACHE_BYTES)
+
+    return
+
+
+def evict(cache_dir, max_bytes):
+    """evict - remove the least recently used entries until the cache
+    directory fits within max_bytes.
+    """
+    entries = []
+    total = 0
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".json"):
+            continue
+        try:
+            st = os.stat(os.path.join(cache_dir, name))
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, name))
+        total += st.st_size
+
+    entries.sort()
+    for (_, size, name) in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except FileNotFoundError:
+            pass
+        total -= size
+
+    return
+
+
+def cached_rows(cache_dir, source_file, stamp, params, parse):
+    """cached_rows - return the rows for source_file from the cache, calling
+    parse() and caching its result on a miss.
+
+    :cache_dir: cache directory, None disables the cache
+    :source_file: path to the file being parsed
+    :stamp: code version stamp, see code_stamp()
+    :params: list of the parameters which influence the parse
+    :parse: callable returning an iterable of the rows for source_file
+    :returns: list of rows
+
+    """
+    return list(stream_rows(cache_dir, source_file, stamp, params, parse))
+
+
+def stream_rows(cache_dir, source_file, stamp, params, parse):
+    """stream_rows - generator form of cached_rows().  on a miss the rows are
+    yielded as parse() produces them, and cached once it's exhausted.
+
+    :cache_dir: cache directory, None disables the cache
+    :source_file: path to the file being parsed
+    :stamp: code version stamp, see code_stamp()
+    :params: list of the parameters which influence the parse
+    :parse: callable returning an iterable of the rows for source_file
+    :returns: generator of rows
+
+    """
+    if cache_dir is None:
+        yield from parse()
+        return
+
+    key = cache_key(source_file, stamp, params)
+    rows = load(cache_dir, key)
+    if rows is not None:
+        yield from rows
+        return
+
+    rows = []
+    for row in parse():
+        rows.append(row)
+        yield row
+    store(cache_dir, key, rows)
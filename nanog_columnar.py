@@ -0,0 +1,210 @@
+import csv
+import importlib
+import os.path
+
+import nanog_trace
+
+# imported on first use, CSV works without it (and without its start up cost)
+pyarrow = None
+
+# nanog_columnar.py
+#
+# columnar (parquet / arrow IPC) versions of the CSVs handed between the
+# scrapers and the merge tools.  the format follows the file extension:
+# .parquet and .arrow (or .feather) files are columnar, anything else is CSV.
+#
+# every column has a fixed type whichever tool writes it: NANOG is an int16,
+# INDEX an int32, everything else a string.  the columns whose values repeat
+# across a meeting, or the whole archive, are dictionary encoded.
+#
+# pyarrow is only needed for the columnar formats (pip install pyarrow).
+#
+
+FORMATS = {
+    ".parquet": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+}
+
+# dictionary encoded columns
+DICT_COLUMNS = {"NANOG", "DATE", "LOCATION", "AFFILIATION", "TALK_TYPE", "ORIGIN"}
+
+# integer columns
+INT_COLUMNS = {"NANOG", "INDEX"}
+
+# rows buffered per record batch (parquet row group)
+BATCH_ROWS = 65536
+
+# functions timed with --timings, see nanog_trace
+TRACE_STAGES = {"iter_rows": "file read"}
+
+
+def to_int(value):
+    """to_int - int from a CSV or record value, None where it's empty"""
+    if value is None or value == "":
+        return None
+
+    return int(value)
+
+
+def file_format(path):
+    """file_format - "csv", "parquet" or "arrow", going by the extension"""
+    return FORMATS.get(os.path.splitext(path)[1].lower(), "csv")
+
+
+def require_pyarrow(path):
+    """require_pyarrow - import pyarrow, complaining if it's needed for path
+    and missing
+    """
+    global pyarrow
+    if pyarrow is not None:
+        return
+
+    try:
+        for module in ["pyarrow.ipc", "pyarrow.parquet"]:
+            importlib.import_module(module)
+    except ImportError as e:
+        raise ImportError(
+            f"{path}: parquet / arrow files need pyarrow installed"
+        ) from e
+    pyarrow = importlib.import_module("pyarrow")
+
+
+def arrow_type(column):
+    """arrow_type - the fixed arrow type for a column"""
+    if column == "NANOG":
+        value_type = pyarrow.int16()
+    elif column == "INDEX":
+        value_type = pyarrow.int32()
+    else:
+        value_type = pyarrow.string()
+
+    if column in DICT_COLUMNS:
+        return pyarrow.dictionary(pyarrow.int32(), value_type)
+
+    return value_type
+
+
+def arrow_schema(columns):
+    """arrow_schema - arrow schema for a list of column names"""
+    return pyarrow.schema([pyarrow.field(c, arrow_type(c)) for c in columns])
+
+
+def record_batch(schema, rows):
+    """record_batch - arrow record batch from a list of rows, each a sequence
+    of values in schema order.  the int columns are converted from their CSV
+    strings where need be, and short rows (the scrapers' fallback for
+    malformed entries) are padded out with nulls.
+    """
+    width = len(schema)
+    padded = []
+    for row in rows:
+        if len(row) > width:
+            raise ValueError(f"row has {len(row)} values, expected {width}: {row}")
+        if len(row) < width:
+            row = list(row) + [None] * (width - len(row))
+        padded.append(row)
+
+    arrays = []
+    for (field, values) in zip(schema, zip(*padded)):
+        if field.name in INT_COLUMNS:  # CSV values come through as strings
+            values = [to_int(v) for v in values]
+        if pyarrow.types.is_dictionary(field.type):
+            array = pyarrow.array(values, type=field.type.value_type)
+            array = array.dictionary_encode()
+        else:
+            array = pyarrow.array(values, type=field.type)
+        arrays.append(array)
+
+    return pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def table_writer(stack, path, columns, header=True, fmt=None):
+    """table_writer - opens path for writing rows, as CSV or columnar
+
+    :stack: contextlib.ExitStack, the file is finished off and closed with it
+    :path: file to write
+    :columns: list of the column names, rows are written in this order
+    :header: write the header row (CSV only, columnar files always have one)
+    :fmt: "csv", "parquet" or "arrow", defaults to file_format(path)
+    :returns: callable taking an iterable of rows to write
+
+    """
+    if fmt is None:
+        fmt = file_format(path)
+
+    if fmt == "csv":
+        csvfile = stack.enter_context(open(path, "w", newline=""))
+        writer = csv.writer(csvfile)
+        if header:
+            writer.writerow(columns)
+        return traced_writer(writer.writerows)
+
+    require_pyarrow(path)
+    schema = arrow_schema(columns)
+    if fmt == "parquet":
+        writer = pyarrow.parquet.ParquetWriter(path, schema)
+    else:
+        writer = pyarrow.ipc.new_file(path, schema)
+
+    pending = []
+
+    def flush():
+        if pending:
+            writer.write_batch(record_batch(schema, pending))
+            pending.clear()
+
+    def write_rows(rows):
+        for row in rows:
+            pending.append(row)
+            if len(pending) >= BATCH_ROWS:
+                flush()
+
+    def close():
+        flush()
+        writer.close()
+
+    stack.callback(close)
+
+    return traced_writer(write_rows)
+
+
+def traced_writer(write_rows):
+    """traced_writer - write_rows timed as the "csv write" stage (columnar
+    files included), counting the rows written.  write_rows is handed back as
+    it is while tracing is off, see nanog_trace.
+    """
+    if not nanog_trace.ENABLED:
+        return write_rows
+
+    timed_write = nanog_trace.wrap("csv write", write_rows)
+
+    def write_counted(rows):
+        timed_write(nanog_trace.counted("rows written", rows))
+
+    return write_counted
+
+
+def iter_rows(path):
+    """iter_rows - yields the header (list of column names) followed by each of
+    the rows of a CSV or columnar file, as csv.reader would.  columnar files
+    give real ints for the int columns and None for nulls.
+    """
+    fmt = file_format(path)
+    if fmt == "csv":
+        with open(path, "r", newline="") as csvfile:
+            yield from csv.reader(csvfile)
+        return
+
+    require_pyarrow(path)
+    if fmt == "parquet":
+        parquet_file = pyarrow.parquet.ParquetFile(path)
+        yield parquet_file.schema_arrow.names
+        batches = parquet_file.iter_batches(batch_size=BATCH_ROWS)
+    else:
+        reader = pyarrow.ipc.open_file(path)
+        yield reader.schema.names
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+
+    for batch in batches:
+        yield from zip(*[column.to_pylist() for column in batch.columns])
@@ -0,0 +1,88 @@
+import csv
+import os.path
+import re
+
+# nanog_filter.py
+#
+# rule driven filter for the agenda entries which aren't talks (breaks,
+# lunches, socials, etc.).  the rules live in data/agenda-skip-rules.csv, a
+# row per pattern:
+#
+#   RULE,FIELD,PATTERN
+#   lunch,title,^lunch$
+#
+# FIELD is "title" or "speaker", PATTERN a case-insensitive regex.  a rule may
+# have several patterns.  the patterns for each field are compiled once into a
+# single alternation with a named group per pattern, so an entry is checked
+# with one search per field however long the list gets, and the group which
+# matched names the rule for the hit counts.
+#
+
+DEFAULT_RULES = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "agenda-skip-rules.csv"
+)
+
+FIELDS = ["title", "speaker"]
+
+
+def load_rules(rules_file=DEFAULT_RULES):
+    """load_rules - list of (rule, field, pattern) tuples, in file order"""
+    rules = []
+    with open(rules_file, "r", newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if row["FIELD"] not in FIELDS:
+                raise ValueError(
+                    f"{rules_file}: unknown field {row['FIELD']} for {row['RULE']}"
+                )
+            rules.append((row["RULE"], row["FIELD"], row["PATTERN"]))
+
+    return rules
+
+
+def compile_rules(rules):
+    """compile_rules - combined regex per field
+
+    :rules: list of (rule, field, pattern) tuples, see load_rules()
+    :returns: dict keyed by field of (compiled regex, dict of rule names keyed
+              by group name) tuples.  the patterns are tried in rule order, ^
+              and $ anchor to the start and end of the text searched.
+
+    """
+    matchers = {}
+    for field in FIELDS:
+        groups = {}
+        alternatives = []
+        for (pos, (rule, rule_field, pattern)) in enumerate(rules):
+            if rule_field != field:
+                continue
+            group = f"r{pos}"
+            groups[group] = rule
+            alternatives.append(f"(?P<{group}>{pattern})")
+
+        regex = None
+        if alternatives:
+            regex = re.compile("|".join(alternatives), re.IGNORECASE)
+        matchers[field] = (regex, groups)
+
+    return matchers
+
+
+def match_rule(matchers, field, text):
+    """match_rule - the rule matching text, or None
+
+    :matchers: compiled rules, see compile_rules()
+    :field: "title" or "speaker"
+    :text: text to check, a single value (one of a panel's speakers is
+           checked at a time)
+    :returns: rule name of the earliest match in text, None for no match
+
+    """
+    (regex, groups) = matchers[field]
+    if regex is None:
+        return None
+
+    m = regex.search(text)
+    if m is None:
+        return None
+
+    return groups[m.lastgroup]
@@ -0,0 +1,87 @@
+import html.entities
+import re
+
+import bs4
+from bs4 import BeautifulSoup, SoupStrainer
+
+import nanog_trace
+
+# nanog_html.py
+#
+# shared HTML loading for the agenda and attendee scrapers.  both scrapers walk
+# the resulting tree with the bs4 API, so the pluggable piece here is the bs4
+# tree builder that does the actual parsing.
+#
+
+# tree builders which produce identical rows across the checked-in agendas and
+# attendee lists, fastest first.
+PARSERS = ["lxml", "html.parser"]
+
+# entity references, with the trailing semicolon
+ENTITY_RE = re.compile(r"&([A-Za-z][A-Za-z0-9]*);")
+
+
+def default_parser():
+    """default_parser - returns the fastest tree builder that is installed"""
+    try:
+        import lxml  # noqa: F401
+    except ImportError:
+        return "html.parser"
+
+    return "lxml"
+
+
+DEFAULT_PARSER = default_parser()
+
+
+def parser_stamp(parser):
+    """parser_stamp - identifies the parser and library versions in use, for
+    the parse cache.
+    """
+    stamp = f"bs4-{bs4.__version__}/{parser}"
+    if parser == "lxml":
+        from lxml import etree
+
+        stamp += "-" + etree.__version__
+
+    return stamp
+
+
+def fix_unknown_entities(markup):
+    """fix_unknown_entities - some of the attendee lists have mangled entities
+    in them (e.g. "AT&T;").  html.parser drops the semicolon from references it
+    doesn't know ("AT&T") while lxml keeps them verbatim.  rewrite these the
+    html.parser way so that the backends agree.
+    """
+
+    def _fix(m):
+        if m.group(1) + ";" in html.entities.html5:
+            return m.group(0)
+        return "&" + m.group(1)
+
+    return ENTITY_RE.sub(_fix, markup)
+
+
+def load_soup(html_file, parser=DEFAULT_PARSER, table_attrs=None):
+    """load_soup - parse html_file with the requested tree builder
+
+    :html_file: path to the html file
+    :parser: bs4 tree builder, one of PARSERS
+    :table_attrs: if set, only the <table> elements matching these attributes
+                  (and their contents) are built into the tree.  the rest of
+                  the page is skipped.
+    :returns: BeautifulSoup object
+
+    """
+    with nanog_trace.stage("file read"), open(html_file) as h_file:
+        markup = h_file.read()
+
+    parse_only = None
+    if table_attrs is not None:
+        parse_only = SoupStrainer("table", attrs=table_attrs)
+
+    with nanog_trace.stage("html parse"):
+        if parser != "html.parser":
+            markup = fix_unknown_entities(markup)
+
+        return BeautifulSoup(markup, parser, parse_only=parse_only)
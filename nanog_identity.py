@@ -0,0 +1,309 @@
+import hashlib
+import itertools
+
+from rapidfuzz import fuzz
+
+import nanog_records
+
+# nanog_identity.py
+#
+# identity resolution for the attendee lists: clusters the same person's
+# entries across meetings and gives each cluster a stable person id.
+#
+# entries are reduced to their distinct (first, last) name keys, and only the
+# pairs of names which share a block are compared: the same phonetic (soundex)
+# key for the surname, or neighbours in surname order (sorted neighbourhood,
+# which catches typos in the first letter or two).  names which are the same
+# tokens in a different order (first / last swapped) are merged without a
+# comparison.
+#
+# clusters are only merged where they have no meeting in common, the same
+# person doesn't appear twice on one attendee list.
+#
+# the person id is a hash of the name the cluster first appears under
+# (earliest NANOG), so ids don't change as later meetings are added.
+#
+
+# marker the attendee scraper puts on names it couldn't split
+MALFORMED_MARKER = "malformed attendee:"
+
+# name tokens which aren't part of the surname proper
+NAME_SUFFIXES = {"jr", "sr", "ii", "iii", "iv", "phd", "md", "esq"}
+
+# number of neighbours, in surname order, each name is compared with
+NEIGHBOURHOOD = 4
+
+# rapidfuzz ratio cut offs for a fuzzy name match
+LAST_NAME_CUTOFF = 88
+FIRST_NAME_CUTOFF = 85
+
+SOUNDEX_CODES = {
+    c: code
+    for (letters, code) in [
+        ("bfpv", "1"),
+        ("cgjkqsxz", "2"),
+        ("dt", "3"),
+        ("l", "4"),
+        ("mn", "5"),
+        ("r", "6"),
+    ]
+    for c in letters
+}
+
+
+def soundex(word):
+    """soundex - american soundex code for word (e.g. "R163"), "" for words
+    without any (ascii) letters.
+    """
+    letters = [c for c in word.lower() if "a" <= c <= "z"]
+    if not letters:
+        return ""
+
+    code = letters[0].upper()
+    last = SOUNDEX_CODES.get(letters[0], "")
+    for c in letters[1:]:
+        digit = SOUNDEX_CODES.get(c, "")
+        if digit and digit != last:
+            code += digit
+        if c not in "hw":  # h and w don't separate letters with the same code
+            last = digit
+
+    return (code + "000")[:4]
+
+
+def attendee_name(row):
+    """attendee_name - (first, last) name from an attendee row, undoing the
+    scraper's fallbacks for names it couldn't split.
+
+    :row: attendee row, [NANOG, last name, first name, affiliation] (possibly
+          short)
+    :returns: tuple of (first name, last name)
+
+    """
+    (_, last, first) = (list(row) + [None] * 3)[:3]
+    last = (last or "").strip()
+    first = (first or "").strip()
+
+    if last.startswith(MALFORMED_MARKER):  # html lists, the whole name in last
+        (last, first) = (last[len(MALFORMED_MARKER) :].strip(), "")
+    elif first == MALFORMED_MARKER:  # pdf lists, the same
+        first = ""
+
+    if not first:
+        if "," in last:
+            (last, _, first) = last.partition(",")
+        elif " " in last:
+            (first, _, last) = last.rpartition(" ")
+
+    return (first.strip(), last.strip())
+
+
+def name_keys(first, last):
+    """name_keys - normalized (first, last) name keys, see
+    nanog_records.person_key().  suffixes (jr, phd, etc.) are dropped from the
+    surname.
+    """
+    last_tokens = nanog_records.person_key(last).split()
+    if len(last_tokens) > 1:
+        last_tokens = [t for t in last_tokens if t not in NAME_SUFFIXES]
+
+    return (nanog_records.person_key(first), " ".join(last_tokens))
+
+
+def collect_names(rows):
+    """collect_names - the distinct names among the attendee rows
+
+    :rows: list of attendee rows
+    :returns: tuple of (list of name dicts, list of each row's name position).
+              a name dict holds the first / last name keys, the NANOGs it
+              appears at and its affiliations.
+
+    """
+    names = []
+    positions = {}
+    row_names = []
+    for row in rows:
+        keys = name_keys(*attendee_name(row))
+        if not any(keys):
+            row_names.append(None)
+            continue
+
+        pos = positions.get(keys)
+        if pos is None:
+            pos = positions[keys] = len(names)
+            names.append(
+                {
+                    "first": keys[0],
+                    "last": keys[1],
+                    "nanogs": set(),
+                    "affiliations": set(),
+                }
+            )
+        names[pos]["nanogs"].add(int(row[0]))
+        if len(row) > 3 and row[3]:
+            names[pos]["affiliations"].add(nanog_records.person_key(row[3]))
+        row_names.append(pos)
+
+    return (names, row_names)
+
+
+def build_blocks(names):
+    """build_blocks - blocking index over the names
+
+    :names: list of name dicts, see collect_names()
+    :returns: dict of lists of name positions, keyed by the soundex of the
+              surname (spaces dropped, so "van der berg" blocks with
+              "vanderberg")
+
+    """
+    blocks = {}
+    for (pos, name) in enumerate(names):
+        key = soundex(name["last"].replace(" ", ""))
+        blocks.setdefault(key, []).append(pos)
+
+    return blocks
+
+
+def candidate_pairs(names, blocks):
+    """candidate_pairs - the set of (pos, pos) name pairs worth comparing: those
+    within a block plus each name's NEIGHBOURHOOD neighbours in surname order.
+    """
+    pairs = set()
+    for block in blocks.values():
+        pairs.update(itertools.combinations(block, 2))
+
+    order = sorted(
+        range(len(names)), key=lambda pos: (names[pos]["last"], names[pos]["first"])
+    )
+    for (i, pos) in enumerate(order):
+        for other in order[i + 1 : i + 1 + NEIGHBOURHOOD]:
+            pairs.add((min(pos, other), max(pos, other)))
+
+    return pairs
+
+
+def first_names_match(a, b, shared_affiliation):
+    """first_names_match - could first names a and b be the same person's.
+    initials, missing first names and near misses of short names only count
+    with a shared affiliation.
+    """
+    if a == b:
+        return True
+    if not a or not b or len(a) == 1 or len(b) == 1:
+        return shared_affiliation and (not a or not b or a[0] == b[0])
+    if len(a) >= 3 and len(b) >= 3 and (a.startswith(b) or b.startswith(a)):
+        return True  # chris / christopher
+    if min(len(a), len(b)) < 5 and not shared_affiliation:
+        return False  # a letter or two makes a different short name
+
+    return fuzz.ratio(a, b) >= FIRST_NAME_CUTOFF
+
+
+def match_score(a, b):
+    """match_score - similarity score for a pair of name dicts, None where
+    they don't look like the same person.
+    """
+    last_score = fuzz.ratio(a["last"], b["last"])
+    if last_score < LAST_NAME_CUTOFF:
+        return None
+
+    shared_affiliation = bool(a["affiliations"] & b["affiliations"])
+    if not first_names_match(a["first"], b["first"], shared_affiliation):
+        return None
+
+    return last_score + fuzz.ratio(a["first"], b["first"])
+
+
+def find(parent, pos):
+    """find - union-find root of pos, halving the path as it goes"""
+    while parent[pos] != pos:
+        parent[pos] = parent[parent[pos]]
+        pos = parent[pos]
+
+    return pos
+
+
+def union(parent, nanogs, a, b):
+    """union - merge the clusters of a and b, unless they share a NANOG.
+    returns whether they were merged.
+    """
+    (a, b) = (find(parent, a), find(parent, b))
+    if a == b:
+        return False
+    if not nanogs[a].isdisjoint(nanogs[b]):
+        return False
+
+    parent[b] = a
+    nanogs[a] |= nanogs.pop(b)
+
+    return True
+
+
+def person_id(name):
+    """person_id - stable id for a cluster, from the name it first appears as"""
+    digest = hashlib.sha256(f"{name['last']}|{name['first']}".encode("utf-8"))
+
+    return "P" + digest.hexdigest()[:12]
+
+
+def resolve(rows):
+    """resolve - cluster the attendee rows by person
+
+    :rows: list of attendee rows
+    :returns: tuple of (list of the person id for each row, None for rows
+              without a name, dict of resolution counts)
+
+    """
+    (names, row_names) = collect_names(rows)
+    parent = list(range(len(names)))
+    nanogs = {pos: set(name["nanogs"]) for (pos, name) in enumerate(names)}
+
+    # the same name tokens in a different order, first / last swapped
+    swapped = {}
+    for (pos, name) in enumerate(names):
+        tokens = " ".join(sorted(f"{name['first']} {name['last']}".split()))
+        if tokens in swapped:
+            union(parent, nanogs, swapped[tokens], pos)
+        else:
+            swapped[tokens] = pos
+
+    blocks = build_blocks(names)
+    pairs = candidate_pairs(names, blocks)
+
+    # best matches first, so they win out over weaker ones for the meetings
+    # where only one can be merged
+    matches = []
+    for (a, b) in pairs:
+        score = match_score(names[a], names[b])
+        if score is not None:
+            matches.append((-score, a, b))
+    matches.sort()
+
+    merged = 0
+    for (_, a, b) in matches:
+        if union(parent, nanogs, a, b):
+            merged += 1
+
+    # the name each cluster first appears under
+    anchors = {}
+    for (pos, name) in enumerate(names):
+        root = find(parent, pos)
+        key = (min(name["nanogs"]), name["last"], name["first"])
+        if root not in anchors or key < anchors[root][0]:
+            anchors[root] = (key, name)
+    ids = {root: person_id(name) for (root, (_, name)) in anchors.items()}
+
+    counts = {
+        "rows": len(rows),
+        "names": len(names),
+        "blocks": len(blocks),
+        "all_pairs": len(names) * (len(names) - 1) // 2,
+        "compared": len(pairs),
+        "matched": len(matches),
+        "merged": merged,
+        "persons": len(ids),
+    }
+
+    person_ids = [None if p is None else ids[find(parent, p)] for p in row_names]
+
+    return (person_ids, counts)
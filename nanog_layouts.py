@@ -0,0 +1,45 @@
+# nanog_layouts.py
+#
+# registry of the page layouts used across the NANOG eras.  the scrapers keep
+# a list of (first NANOG, last NANOG, layout) entries, a layout being a dict
+# of whatever that scraper needs to pull the rows out (cell positions,
+# selectors, extractor functions).  the layout for a file is looked up once,
+# before any of its rows are read, so supporting a new era is a matter of
+# adding an entry.
+#
+
+
+def registry(*entries):
+    """registry - layout registry from (first, last, layout) entries
+
+    :entries: tuples of the first and last NANOG (None for no upper bound) a
+              layout covers, and the layout
+    :returns: list of the entries, in NANOG order
+    :raises ValueError: for entries which overlap
+
+    """
+    entries = sorted(entries, key=lambda entry: entry[0])
+    for (previous, entry) in zip(entries, entries[1:]):
+        if previous[1] is None or previous[1] >= entry[0]:
+            raise ValueError(
+                f"layouts for NANOG {previous[0]}-{previous[1] or ''} and "
+                f"NANOG {entry[0]}-{entry[1] or ''} overlap"
+            )
+
+    return entries
+
+
+def resolve(layouts, nanog):
+    """resolve - the layout covering nanog
+
+    :layouts: registry, see registry()
+    :nanog: NANOG number
+    :returns: layout
+    :raises LookupError: where no layout covers nanog
+
+    """
+    for (first, last, layout) in layouts:
+        if first <= nanog and (last is None or nanog <= last):
+            return layout
+
+    raise LookupError(f"no layout registered for NANOG {nanog}")
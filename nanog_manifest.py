@@ -0,0 +1,186 @@
+import contextlib
+import json
+import os
+import os.path
+
+import nanog_cache
+import nanog_columnar
+
+# nanog_manifest.py
+#
+# manifest for incremental batch exports.  alongside a consolidated CSV the
+# manifest records, per NANOG, the source file (path, mtime, size and sha256),
+# the code stamp and parameters it was parsed with and the rows it produced.
+#
+# an incremental run only re-parses the files which are new, or whose content
+# or parsing code has changed, and splices their rows into the consolidated
+# CSV in NANOG order.  files with an unchanged mtime and size aren't even
+# re-hashed.
+#
+
+MANIFEST_VERSION = 1
+
+
+def manifest_path(csv_file):
+    """manifest_path - default manifest location for a consolidated CSV"""
+    return csv_file + ".manifest.json"
+
+
+def load(manifest_file):
+    """load - returns the manifest, or an empty one if it's missing or from an
+    older manifest version.
+    """
+    try:
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    if manifest.get("version") != MANIFEST_VERSION:
+        manifest = {"version": MANIFEST_VERSION, "files": {}}
+
+    return manifest
+
+
+def write_atomic(path, write):
+    """write_atomic - write path via a temp file in the same directory, so an
+    interrupted run never leaves a truncated file behind.
+
+    :path: file to write
+    :write: callable taking the open (text) file
+    :returns: nothing
+
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def save(manifest_file, manifest):
+    """save - write the manifest out"""
+    write_atomic(manifest_file, lambda f: json.dump(manifest, f))
+
+
+def make_entry(source_file, stamp, params, rows):
+    """make_entry - manifest entry for a freshly parsed source file"""
+    st = os.stat(source_file)
+
+    return {
+        "path": source_file,
+        "mtime": st.st_mtime,
+        "size": st.st_size,
+        "sha256": nanog_cache.file_digest(source_file),
+        "stamp": stamp,
+        "params": params,
+        "rows": rows,
+    }
+
+
+def is_current(entry, source_file, stamp, params):
+    """is_current - do the entry's rows still stand for source_file.  a file
+    which has been touched but not changed has the entry's mtime updated.
+
+    :entry: manifest entry
+    :source_file: path to the file being parsed
+    :stamp: code version stamp, see nanog_cache.code_stamp()
+    :params: list of the parameters which influence the parse
+    :returns: tuple of (current, entry updated)
+
+    """
+    if entry["path"] != source_file or entry["stamp"] != stamp:
+        return (False, False)
+    if entry["params"] != params:
+        return (False, False)
+
+    try:
+        st = os.stat(source_file)
+    except OSError:
+        return (False, False)
+
+    if st.st_mtime == entry["mtime"] and st.st_size == entry["size"]:
+        return (True, False)
+
+    if nanog_cache.file_digest(source_file) != entry["sha256"]:
+        return (False, False)
+
+    entry["mtime"] = st.st_mtime
+    entry["size"] = st.st_size
+
+    return (True, True)
+
+
+def update(
+    manifest_file,
+    csv_file,
+    columns,
+    source_files,
+    nanogs,
+    stamp,
+    params,
+    parse,
+    header=True,
+):
+    """update - bring a consolidated CSV up to date, re-parsing only the new or
+    changed source files.
+
+    :manifest_file: path to the manifest
+    :csv_file: path to the consolidated csv (or parquet / arrow) file
+    :columns: list of the column names
+    :source_files: dict of source file paths keyed by NANOG number
+    :nanogs: list of NANOG numbers to export, in output order
+    :stamp: code version stamp, see nanog_cache.code_stamp()
+    :params: callable returning the parse parameters for a NANOG
+    :parse: callable taking a list of NANOGs to (re-)parse, yielding (nanog,
+            iterable of rows) tuples
+    :header: write the header row to a CSV
+    :returns: list of the NANOGs which were (re-)parsed
+
+    """
+    manifest = load(manifest_file)
+
+    files = {}
+    stale = []
+    dirty = False
+    for nanog in nanogs:
+        if nanog not in source_files:
+            continue
+
+        entry = manifest["files"].get(str(nanog))
+        if entry is not None:
+            (current, updated) = is_current(
+                entry, source_files[nanog], stamp, params(nanog)
+            )
+            dirty = dirty or updated
+            if current:
+                files[str(nanog)] = entry
+                continue
+
+        stale.append(nanog)
+
+    for (nanog, rows) in parse(stale):
+        files[str(nanog)] = make_entry(
+            source_files[nanog], stamp, params(nanog), list(rows)
+        )
+
+    # NANOGs which have dropped out of the range (or lost their source file)
+    # go too
+    rows_changed = bool(stale) or files.keys() != manifest["files"].keys()
+
+    if rows_changed or not os.path.exists(csv_file):
+        # written via a temp file, as with write_atomic()
+        tmp_path = csv_file + ".tmp"
+        with contextlib.ExitStack() as stack:
+            write_rows = nanog_columnar.table_writer(
+                stack, tmp_path, columns, header, nanog_columnar.file_format(csv_file)
+            )
+            for nanog in nanogs:
+                if str(nanog) in files:
+                    write_rows(files[str(nanog)]["rows"])
+        os.replace(tmp_path, csv_file)
+
+    if rows_changed or dirty:
+        manifest["files"] = files
+        save(manifest_file, manifest)
+
+    return stale
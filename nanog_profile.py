@@ -0,0 +1,325 @@
+import atexit
+import collections
+import cProfile
+import os
+import os.path
+import pstats
+import sys
+import threading
+
+# nanog_profile.py
+#
+# --profile for the scrapers, merge tools and transcript fetcher.  the whole
+# run is profiled, so a batch export (--range) gives a single profile covering
+# every file it parsed.  the profile is written next to the output when the
+# run exits:
+#
+#   --profile / --profile=cprofile  OUTPUT.prof, deterministic cProfile stats
+#                                   (python -m pstats, snakeviz, etc.)
+#   --profile=sampling              OUTPUT.folded, stacks sampled every
+#                                   SAMPLE_INTERVAL seconds in the folded
+#                                   format flamegraph.pl and speedscope take
+#
+# neither profiler sees into worker processes, and before python 3.12
+# cProfile only sees the thread it was started in.  the work handed to worker
+# threads and processes goes through call(), which profiles it where the main
+# profiler can't, and the results are folded into the one profile: threads
+# directly, processes by handing take() back to the parent for merge().
+# workers which don't inherit the profiler settings (the spawn and forkserver
+# start methods) pick them up with init_worker().
+#
+
+PROFILERS = ["cprofile", "sampling"]
+
+# file extension of the profile for each profiler
+PROFILE_EXTENSIONS = {"cprofile": ".prof", "sampling": ".folded"}
+
+# seconds between stack samples
+SAMPLE_INTERVAL = 0.005
+
+# from 3.12 cProfile is built on sys.monitoring, which is process wide: the
+# main profiler sees every thread, and a second profiler can't be started
+# while it's running
+CPROFILE_SEES_THREADS = sys.version_info >= (3, 12)
+
+# the profiler in use, None while profiling is off
+MODE = None
+
+PROFILE_FILE = None
+
+# process the profile belongs to, anything else is a worker process
+PROFILE_PID = None
+
+# the cProfile.Profile for the main thread
+PROFILER = None
+
+# sampled stack counts, and the callable stopping the sampler
+SAMPLES = collections.Counter()
+STOP_SAMPLER = None
+
+# flamegraph labels, keyed by code object
+FRAME_LABELS = {}
+
+# profiles collected by call(), for the process in "pid"
+COLLECTED = {"pid": None, "stats": [], "samples": collections.Counter()}
+
+LOCK = threading.Lock()
+
+
+class CollectedStats:
+    """
+    cProfile stats collected by call(), in the form pstats.Stats loads them
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        """already created, pstats.Stats calls this before taking the stats"""
+        pass
+
+
+def add_arguments(parser):
+    """add_arguments - adds the --profile option to an
+    argparse.ArgumentParser
+    """
+    parser.add_argument(
+        "--profile",
+        help="profile the run, writing OUTPUT.prof (cprofile, the default) or "
+        "flamegraph stacks to OUTPUT.folded (sampling) next to the output",
+        dest="profile",
+        action="store",
+        nargs="?",
+        const="cprofile",
+        choices=PROFILERS,
+        required=False,
+    )
+
+
+def profile_path(output, mode, script):
+    """profile_path - where the profile goes
+
+    :output: the run's output file or directory, None if it has none
+    :mode: profiler, one of PROFILERS
+    :script: path of the script being run, names the profile where there's
+             no output file to name it after
+    :returns: path for the profile
+
+    """
+    if output is None:
+        base = os.path.splitext(os.path.basename(script))[0]
+    elif os.path.isdir(output):
+        base = os.path.join(output, os.path.splitext(os.path.basename(script))[0])
+    else:
+        base = os.path.splitext(output)[0]
+
+    return base + PROFILE_EXTENSIONS[mode]
+
+
+def start(args, output, script):
+    """start - starts profiling if the command line asked for it, see
+    add_arguments().  the profile is written when the process exits.
+
+    :args: parsed arguments
+    :output: the run's output file or directory (or None), see profile_path()
+    :script: path of the script being run
+    :returns: whether profiling is on
+
+    """
+    global MODE, PROFILE_FILE, PROFILE_PID, PROFILER, STOP_SAMPLER
+    if not args.profile:
+        return False
+
+    MODE = args.profile
+    PROFILE_FILE = profile_path(output, MODE, script)
+    PROFILE_PID = os.getpid()
+    atexit.register(finish)
+
+    if MODE == "cprofile":
+        PROFILER = cProfile.Profile()
+        PROFILER.enable()
+    else:
+        STOP_SAMPLER = start_sampler(SAMPLES)
+
+    return True
+
+
+def frame_label(code):
+    """frame_label - flamegraph label for a code object, "name (file:line)"."""
+    label = FRAME_LABELS.get(code)
+    if label is None:
+        label = FRAME_LABELS[code] = (
+            f"{code.co_name} "
+            f"({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        )
+
+    return label
+
+
+def folded_stack(thread_name, frame):
+    """folded_stack - the stack ending at frame as a folded flamegraph line
+    (outermost first, ";" separated), rooted at the thread name
+    """
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.append(thread_name)
+
+    return ";".join(reversed(labels))
+
+
+def start_sampler(samples):
+    """start_sampler - samples the stacks of every other thread into samples
+    (a Counter of folded stacks) every SAMPLE_INTERVAL seconds, from a
+    background thread.  returns a callable which stops the sampler, samples
+    is only to be read once it has.
+    """
+    stop = threading.Event()
+
+    def sample():
+        sampler = threading.get_ident()
+        while not stop.wait(SAMPLE_INTERVAL):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for (ident, frame) in sys._current_frames().items():
+                if ident == sampler:
+                    continue
+                samples[folded_stack(names.get(ident, str(ident)), frame)] += 1
+
+    thread = threading.Thread(target=sample, name="profile-sampler", daemon=True)
+    thread.start()
+
+    def stop_sampler():
+        stop.set()
+        thread.join()
+
+    return stop_sampler
+
+
+def collected():
+    """collected - this process's call() profiles.  a forked worker starts
+    over rather than carrying its parent's.
+    """
+    if COLLECTED["pid"] != os.getpid():
+        COLLECTED["pid"] = os.getpid()
+        COLLECTED["stats"] = []
+        COLLECTED["samples"] = collections.Counter()
+
+    return COLLECTED
+
+
+def worker_settings():
+    """worker_settings - what a worker process needs to profile its share of
+    the run, for init_worker().  None while profiling is off.
+    """
+    if MODE is None:
+        return None
+
+    return {"mode": MODE, "pid": PROFILE_PID}
+
+
+def init_worker(settings):
+    """init_worker - sets a worker process up to profile call()s, from the
+    parent's worker_settings().  workers started with fork inherit the
+    settings, those started with spawn or forkserver import this module
+    afresh with profiling off.
+    """
+    global MODE, PROFILE_PID
+    if settings is None or MODE is not None:
+        return
+
+    MODE = settings["mode"]
+    PROFILE_PID = settings["pid"]
+
+
+def call(func, *args):
+    """call - func(*args), profiled for a worker thread or process.  the
+    profile is kept for take() (worker processes) or folded straight into the
+    run's profile (threads).  func is simply called while profiling is off,
+    and where the main profiler already sees it (threads of the profiled
+    process, when sampling or with a cProfile that sees every thread).
+    """
+    global PROFILER
+    if MODE is None:
+        return func(*args)
+
+    worker_process = os.getpid() != PROFILE_PID
+    if not worker_process and (MODE == "sampling" or CPROFILE_SEES_THREADS):
+        return func(*args)
+
+    if MODE == "sampling":
+        samples = collections.Counter()
+        stop_sampler = start_sampler(samples)
+        try:
+            return func(*args)
+        finally:
+            stop_sampler()
+            with LOCK:
+                collected()["samples"].update(samples)
+
+    if worker_process and PROFILER is not None:
+        # a forked worker's copy of the parent's profiler, which would be
+        # counting this process's calls into a profile nobody writes out
+        PROFILER.disable()
+        PROFILER = None
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args)
+    finally:
+        profiler.create_stats()
+        with LOCK:
+            collected()["stats"].append(profiler.stats)
+
+
+def take():
+    """take - hands over (and resets) the profiles call() collected in this
+    worker process, for the parent's merge().  None while profiling is off.
+    """
+    if MODE is None:
+        return None
+
+    with LOCK:
+        worker = collected()
+        taken = {"stats": worker["stats"], "samples": dict(worker["samples"])}
+        worker["stats"] = []
+        worker["samples"] = collections.Counter()
+
+    return taken
+
+
+def merge(taken):
+    """merge - adds a worker process's take() to the run's profile"""
+    if taken is None:
+        return
+
+    with LOCK:
+        parent = collected()
+        parent["stats"].extend(taken["stats"])
+        parent["samples"].update(taken["samples"])
+
+
+def write_folded(profile_file, samples):
+    """write_folded - writes the sampled stacks, a "stack count" line apiece"""
+    with open(profile_file, "w", encoding="utf-8") as f:
+        for (stack, n) in sorted(samples.items()):
+            f.write(f"{stack} {n}\n")
+
+
+def finish():
+    """finish - stops profiling and writes the profile, registered with
+    atexit by start()
+    """
+    gathered = collected()
+    if MODE == "cprofile":
+        PROFILER.disable()
+        stats = pstats.Stats(PROFILER)
+        for worker_stats in gathered["stats"]:
+            if worker_stats:
+                stats.add(CollectedStats(worker_stats))
+        stats.dump_stats(PROFILE_FILE)
+    else:
+        STOP_SAMPLER()
+        write_folded(PROFILE_FILE, SAMPLES + gathered["samples"])
+
+    print(f"profile written: {PROFILE_FILE}", file=sys.stderr)
@@ -0,0 +1,184 @@
+import html
+import operator
+import re
+import sys
+import unicodedata
+
+import nanog_columnar
+
+# nanog_records.py
+#
+# the speaker record shared by nanog-merge.py and liz-merge.py, along with its
+# CSV I/O.
+#
+# SPEAKER_FIELDS is the one speaker data schema, each tool exports its own
+# view of it (MERGED_FIELDS, TAGGED_FIELDS).  records are __slots__ objects
+# rather than dicts, and the values repeated across a whole meeting (DATE,
+# LOCATION, etc.) are interned so the records share a single copy of each.
+#
+# person_key() is the normalized form of a name that speakers, attendees and
+# the attendee identities are matched on.
+#
+
+SPEAKER_FIELDS = [  # speaker data fields, CSV column names
+    "INDEX",
+    "NANOG",
+    "DATE",
+    "LOCATION",
+    "TALK_ORDER",
+    "SPEAKER",
+    "AFFILIATION",
+    "TITLE",
+    "TALK_TYPE",
+    "YOUTUBE",
+    "PRESO_FILES",
+    "DURATION_MIN",
+    "TAGS",
+    "KEYWORDS",
+    "TOPICS",
+    "ACADEMIC",
+    "ORIGIN",
+]
+
+MERGED_FIELDS = [  # nanog-merge.py export fields in order
+    "NANOG",
+    "DATE",
+    "LOCATION",
+    "TALK_ORDER",
+    "SPEAKER",
+    "AFFILIATION",
+    "TITLE",
+    "TALK_TYPE",
+    "YOUTUBE",
+    "PRESO_FILES",
+    "DURATION_MIN",
+    "TAGS",
+    "KEYWORDS",
+    "ORIGIN",
+]
+
+TAGGED_FIELDS = [  # liz-merge.py export fields in order
+    "INDEX",
+    "NANOG",
+    "DATE",
+    "LOCATION",
+    "TALK_ORDER",
+    "SPEAKER",
+    "AFFILIATION",
+    "TITLE",
+    "TALK_TYPE",
+    "YOUTUBE",
+    "PRESO_FILES",
+    "DURATION_MIN",
+    "TAGS",
+    "TOPICS",
+    "ACADEMIC",
+    "ORIGIN",
+]
+
+# record attribute for each CSV column
+FIELD_ATTRS = {field: field.lower() for field in SPEAKER_FIELDS}
+
+# attributes whose values are interned as they're read
+INTERNED_ATTRS = {"date", "location", "talk_type", "origin"}
+
+
+class SpeakerRecord:
+    """SpeakerRecord - a row of speaker data, an attribute per SPEAKER_FIELDS
+    column (lower case).  attributes which weren't in the source CSV are None,
+    and are written out as empty.
+    """
+
+    __slots__ = tuple(FIELD_ATTRS.values())
+
+    def __init__(self, **fields):
+        for attr in self.__slots__:
+            setattr(self, attr, fields.get(attr))
+
+    @classmethod
+    def blank(cls):
+        """blank - a record with every field empty"""
+        return cls(**{attr: "" for attr in cls.__slots__})
+
+    @classmethod
+    def from_row(cls, attrs, row):
+        """from_row - record from a CSV row
+
+        :attrs: record attribute for each column, None for columns to skip
+        :row: list of the CSV (or columnar file) values
+        :returns: SpeakerRecord with NANOG as an int
+
+        """
+        record = cls()
+        for (attr, value) in zip(attrs, row):
+            if attr is None:
+                continue
+            if attr in INTERNED_ATTRS and isinstance(value, str):
+                value = sys.intern(value)
+            setattr(record, attr, value)
+        if record.nanog is not None:
+            record.nanog = int(record.nanog)  # make this a real int
+
+        return record
+
+    def copy(self):
+        """copy - shallow copy of the record"""
+        record = SpeakerRecord()
+        for attr in self.__slots__:
+            setattr(record, attr, getattr(self, attr))
+
+        return record
+
+    def __repr__(self):
+        fields = ", ".join(
+            f"{attr}={getattr(self, attr)!r}"
+            for attr in self.__slots__
+            if getattr(self, attr) is not None
+        )
+        return f"SpeakerRecord({fields})"
+
+
+def overlay(*records):
+    """overlay - a blank record updated with the fields of each of the records
+    in turn, fields which are None (not in the source CSV) are skipped.
+
+    :records: SpeakerRecords, later records win
+    :returns: new SpeakerRecord
+
+    """
+    merged = SpeakerRecord.blank()
+    for record in records:
+        for attr in SpeakerRecord.__slots__:
+            value = getattr(record, attr)
+            if value is not None:
+                setattr(merged, attr, value)
+
+    return merged
+
+
+def read_records(csv_in):
+    """read_records - yields a SpeakerRecord for each row of csv_in (CSV, or a
+    parquet / arrow file), columns which aren't in SPEAKER_FIELDS are skipped.
+    """
+    reader = nanog_columnar.iter_rows(csv_in)
+    attrs = [FIELD_ATTRS.get(field) for field in next(reader, [])]
+    for row in reader:
+        yield SpeakerRecord.from_row(attrs, row)
+
+
+def row_getter(fields):
+    """row_getter - returns a callable which gives the values of fields (CSV
+    column names) for a record, in order, ready for csv.writer.
+    """
+    return operator.attrgetter(*[FIELD_ATTRS[field] for field in fields])
+
+
+def person_key(name):
+    """person_key - normalized form of a name for matching speakers with
+    attendees: entities decoded, accents dropped, case folded, punctuation
+    removed and whitespace collapsed.
+    """
+    name = unicodedata.normalize("NFKD", html.unescape(name))
+    name = "".join(c for c in name if not unicodedata.combining(c)).casefold()
+
+    return " ".join(re.sub(r"[^\w\s]", "", name).split())
@@ -0,0 +1,393 @@
+import json
+import sqlite3
+
+import nanog_cache
+import nanog_columnar
+import nanog_manifest
+import nanog_records
+
+# nanog_stats.py
+#
+# SQLite backed speaker statistics over the scraped corpus.  the agenda (or
+# merged speaker) export, the attendee export and the meeting dates are loaded
+# into indexed tables, and the per speaker / affiliation / meeting / person
+# aggregates are computed in one pass of GROUP BY queries and stored alongside
+# them.
+#
+# - sources: the manifest entry (see nanog_manifest) of each file loaded.  the
+#   store is only rebuilt when one of them, or this code, changes; otherwise
+#   the stored aggregates are the answer.
+# - talks, attendees, meetings: the loaded rows.  speakers and attendees are
+#   matched on nanog_records.person_key(), a normalized form of the name.
+# - speaker_stats, affiliation_stats, meeting_stats, person_stats: the
+#   aggregates.
+#
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    kind TEXT PRIMARY KEY,
+    entry TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meetings (
+    nanog INTEGER PRIMARY KEY,
+    date TEXT,
+    location TEXT
+);
+CREATE TABLE IF NOT EXISTS talks (
+    nanog INTEGER NOT NULL,
+    speaker TEXT NOT NULL,
+    person_key TEXT NOT NULL,
+    affiliation TEXT NOT NULL,
+    title TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS talks_person ON talks (person_key, nanog);
+CREATE INDEX IF NOT EXISTS talks_nanog ON talks (nanog);
+CREATE INDEX IF NOT EXISTS talks_affiliation ON talks (affiliation COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS attendees (
+    nanog INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    person_key TEXT NOT NULL,
+    affiliation TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS attendees_person ON attendees (person_key, nanog);
+CREATE INDEX IF NOT EXISTS attendees_nanog ON attendees (nanog);
+CREATE TABLE IF NOT EXISTS speaker_stats (
+    person_key TEXT PRIMARY KEY,
+    speaker TEXT NOT NULL,
+    talks INTEGER NOT NULL,
+    meetings INTEGER NOT NULL,
+    first_nanog INTEGER NOT NULL,
+    last_nanog INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS affiliation_stats (
+    affiliation TEXT PRIMARY KEY COLLATE NOCASE,
+    talks INTEGER NOT NULL,
+    speakers INTEGER NOT NULL,
+    first_nanog INTEGER NOT NULL,
+    last_nanog INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meeting_stats (
+    nanog INTEGER PRIMARY KEY,
+    talks INTEGER NOT NULL,
+    speakers INTEGER NOT NULL,
+    attendees INTEGER NOT NULL,
+    attending_speakers INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS person_stats (
+    person_key TEXT PRIMARY KEY,
+    first_attended INTEGER,
+    last_attended INTEGER,
+    meetings_attended INTEGER NOT NULL,
+    first_spoke INTEGER
+);
+"""
+
+TABLES = [
+    "sources",
+    "meetings",
+    "talks",
+    "attendees",
+    "speaker_stats",
+    "affiliation_stats",
+    "meeting_stats",
+    "person_stats",
+]
+
+# the aggregates, each rebuilt from the loaded rows
+AGGREGATES = [
+    """
+    INSERT INTO speaker_stats
+    SELECT person_key,
+        (SELECT speaker FROM talks latest WHERE latest.person_key = t.person_key
+         ORDER BY nanog DESC LIMIT 1),
+        COUNT(*), COUNT(DISTINCT nanog), MIN(nanog), MAX(nanog)
+    FROM talks t GROUP BY person_key
+    """,
+    """
+    INSERT INTO affiliation_stats
+    SELECT affiliation, COUNT(*), COUNT(DISTINCT person_key), MIN(nanog), MAX(nanog)
+    FROM talks WHERE affiliation != '' GROUP BY affiliation COLLATE NOCASE
+    """,
+    """
+    INSERT INTO meeting_stats
+    SELECT nanog, SUM(talks), SUM(speakers), SUM(attendees), SUM(attending_speakers)
+    FROM (
+        SELECT nanog, COUNT(*) AS talks, COUNT(DISTINCT person_key) AS speakers,
+            0 AS attendees, 0 AS attending_speakers
+        FROM talks GROUP BY nanog
+        UNION ALL
+        SELECT nanog, 0, 0, COUNT(DISTINCT person_key), 0
+        FROM attendees GROUP BY nanog
+        UNION ALL
+        SELECT a.nanog, 0, 0, 0, COUNT(DISTINCT a.person_key)
+        FROM attendees a JOIN talks t USING (nanog, person_key) GROUP BY a.nanog
+    )
+    GROUP BY nanog
+    """,
+    """
+    INSERT INTO person_stats
+    SELECT person_key, MIN(attended), MAX(attended), COUNT(DISTINCT attended),
+        MIN(spoke)
+    FROM (
+        SELECT person_key, nanog AS attended, NULL AS spoke FROM attendees
+        UNION ALL
+        SELECT person_key, NULL, nanog FROM talks
+    )
+    GROUP BY person_key
+    """,
+]
+
+# bumped along with anything that changes the stored rows
+STATS_STAMP_FILES = [
+    __file__,
+    nanog_columnar.__file__,
+    nanog_records.__file__,
+]
+
+
+def open_stats(db_path):
+    """open_stats - open (creating if need be) the stats store"""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+
+    return conn
+
+
+def stats_stamp():
+    """stats_stamp - code version stamp for the stored rows and aggregates"""
+    return nanog_cache.code_stamp(*STATS_STAMP_FILES)
+
+
+def is_current(conn, sources, stamp):
+    """is_current - are the store's contents those of the source files.  files
+    which have been touched but not changed have their entries updated.
+
+    :conn: stats store
+    :sources: dict of source file paths keyed by kind ("talks", "attendees",
+              "meetings")
+    :stamp: code version stamp, see stats_stamp()
+    :returns: boolean
+
+    """
+    entries = {
+        r["kind"]: json.loads(r["entry"])
+        for r in conn.execute("SELECT kind, entry FROM sources")
+    }
+    if entries.keys() != sources.keys():
+        return False
+
+    for (kind, source_file) in sources.items():
+        (current, updated) = nanog_manifest.is_current(
+            entries[kind], source_file, stamp, [kind]
+        )
+        if not current:
+            return False
+        if updated:
+            conn.execute(
+                "UPDATE sources SET entry = ? WHERE kind = ?",
+                (json.dumps(entries[kind]), kind),
+            )
+    conn.commit()
+
+    return True
+
+
+def load_talks(conn, talks_file):
+    """load_talks - load the talks from an agenda or merged speaker export (CSV
+    or parquet / arrow), returns the count of talks loaded.
+    """
+    rows = []
+    for record in nanog_records.read_records(talks_file):
+        speaker = (record.speaker or "").strip()
+        key = nanog_records.person_key(speaker)
+        if not key:
+            continue
+        rows.append(
+            (
+                record.nanog,
+                speaker,
+                key,
+                (record.affiliation or "").strip(),
+                (record.title or "").strip(),
+            )
+        )
+    conn.executemany(
+        "INSERT INTO talks (nanog, speaker, person_key, affiliation, title) "
+        "VALUES (?, ?, ?, ?, ?)",
+        rows,
+    )
+
+    return len(rows)
+
+
+def load_attendees(conn, attendees_file):
+    """load_attendees - load the nanog-attendees.py export (CSV, headerless, or
+    parquet / arrow), returns the count of attendee entries loaded.
+    """
+    rows = []
+    for row in nanog_columnar.iter_rows(attendees_file):
+        # short rows are the attendee scraper's fallback for malformed entries
+        (nanog, last_name, first_name, affiliation) = (list(row) + [None] * 4)[:4]
+        if nanog == "NANOG":  # columnar files have a header
+            continue
+        name = " ".join(n.strip() for n in [first_name, last_name] if n)
+        key = nanog_records.person_key(name)
+        if not key:
+            continue
+        rows.append((int(nanog), name, key, (affiliation or "").strip()))
+    conn.executemany(
+        "INSERT INTO attendees (nanog, name, person_key, affiliation) "
+        "VALUES (?, ?, ?, ?)",
+        rows,
+    )
+
+    return len(rows)
+
+
+def load_meetings(conn, meetings_file):
+    """load_meetings - load the NANOG dates and locations, returns the count of
+    meetings loaded.
+    """
+    rows = [
+        (r.nanog, r.date, r.location)
+        for r in nanog_records.read_records(meetings_file)
+    ]
+    conn.executemany(
+        "INSERT OR REPLACE INTO meetings (nanog, date, location) VALUES (?, ?, ?)",
+        rows,
+    )
+
+    return len(rows)
+
+
+LOADERS = {
+    "talks": load_talks,
+    "attendees": load_attendees,
+    "meetings": load_meetings,
+}
+
+
+def rebuild(conn, sources, stamp):
+    """rebuild - reload the store from the source files and recompute the
+    aggregates.
+
+    :conn: stats store
+    :sources: dict of source file paths keyed by kind, see LOADERS
+    :stamp: code version stamp, see stats_stamp()
+    :returns: dict of the counts of rows loaded, keyed by kind
+
+    """
+    # dropped rather than emptied, the schema may have changed with the stamp
+    conn.executescript("".join(f"DROP TABLE IF EXISTS {t};\n" for t in TABLES))
+    conn.executescript(SCHEMA)
+
+    counts = {}
+    for (kind, source_file) in sources.items():
+        entry = nanog_manifest.make_entry(source_file, stamp, [kind], None)
+        counts[kind] = LOADERS[kind](conn, source_file)
+        conn.execute(
+            "INSERT INTO sources (kind, entry) VALUES (?, ?)",
+            (kind, json.dumps(entry)),
+        )
+    for aggregate in AGGREGATES:
+        conn.execute(aggregate)
+    conn.commit()
+
+    return counts
+
+
+def refresh(conn, sources):
+    """refresh - bring the store up to date with the source files
+
+    :conn: stats store
+    :sources: dict of source file paths keyed by kind, see LOADERS.  an empty
+              dict uses the store as is.
+    :returns: dict of the counts of rows loaded, None if the store was current
+
+    """
+    if not sources:
+        return None
+
+    stamp = stats_stamp()
+    if is_current(conn, sources, stamp):
+        return None
+
+    return rebuild(conn, sources, stamp)
+
+
+def top_speakers(conn, limit=20):
+    """top_speakers - speakers by number of talks"""
+    return conn.execute(
+        "SELECT speaker, talks, meetings, first_nanog, last_nanog "
+        "FROM speaker_stats ORDER BY talks DESC, meetings DESC, speaker LIMIT ?",
+        (limit,),
+    ).fetchall()
+
+
+def top_affiliations(conn, limit=20):
+    """top_affiliations - affiliations by number of talks"""
+    return conn.execute(
+        "SELECT affiliation, talks, speakers, first_nanog, last_nanog "
+        "FROM affiliation_stats ORDER BY talks DESC, affiliation LIMIT ?",
+        (limit,),
+    ).fetchall()
+
+
+def meeting_summary(conn):
+    """meeting_summary - talks, speakers and attendees per meeting"""
+    return conn.execute(
+        "SELECT s.nanog, m.date, m.location, s.talks, s.speakers, s.attendees, "
+        "s.attending_speakers FROM meeting_stats s "
+        "LEFT JOIN meetings m USING (nanog) ORDER BY s.nanog"
+    ).fetchall()
+
+
+def speaker_history(conn, name):
+    """speaker_history - the talks given by a speaker
+
+    :conn: stats store
+    :name: speaker name, matched on nanog_records.person_key()
+    :returns: tuple of (speaker_stats row or None, list of talk rows)
+
+    """
+    key = nanog_records.person_key(name)
+    stats = conn.execute(
+        "SELECT s.*, p.first_attended, p.meetings_attended FROM speaker_stats s "
+        "LEFT JOIN person_stats p USING (person_key) WHERE s.person_key = ?",
+        (key,),
+    ).fetchone()
+    talks = conn.execute(
+        "SELECT t.nanog, m.date, t.affiliation, t.title FROM talks t "
+        "LEFT JOIN meetings m USING (nanog) WHERE t.person_key = ? "
+        "ORDER BY t.nanog, t.rowid",
+        (key,),
+    ).fetchall()
+
+    return (stats, talks)
+
+
+def conversion(conn):
+    """conversion - attendee to speaker conversion, over the attendees in the
+    meetings which also have talks loaded.
+
+    :conn: stats store
+    :returns: row of attendees, attendees who spoke (at any point), attendees
+              whose first talk came after their first meeting attended, and
+              the average number of meetings attended before that first talk
+
+    """
+    return conn.execute(
+        """
+        SELECT COUNT(*) AS attendees,
+            COUNT(first_spoke) AS speakers,
+            SUM(first_spoke > first_attended) AS converted,
+            ROUND(AVG(CASE WHEN first_spoke > first_attended THEN (
+                SELECT COUNT(DISTINCT nanog) FROM attendees a
+                WHERE a.person_key = p.person_key AND a.nanog < p.first_spoke
+            ) END), 1) AS meetings_before_first_talk
+        FROM person_stats p
+        WHERE first_attended IS NOT NULL
+            AND first_attended >= (SELECT MIN(nanog) FROM talks)
+        """
+    ).fetchone()
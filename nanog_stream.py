@@ -0,0 +1,92 @@
+import csv
+import itertools
+import operator
+
+import nanog_columnar
+import nanog_records
+
+# nanog_stream.py
+#
+# streaming CSV helpers for the merge tools.  the large side of a merge is
+# read a NANOG at a time and the merged rows written out as each NANOG is
+# done, so memory use follows the size of the largest meeting rather than the
+# whole archive.  inputs and outputs may be CSV or columnar (parquet / arrow)
+# files, see nanog_columnar.
+#
+
+
+def iter_csv(csv_in):
+    """iter_csv - yields the rows of csv_in as nanog_records.SpeakerRecords"""
+    return nanog_records.read_records(csv_in)
+
+
+def nanog_ordered(csv_in):
+    """nanog_ordered - are the rows of csv_in in (ascending) NANOG order"""
+    reader = nanog_columnar.iter_rows(csv_in)
+    header = next(reader, [])
+    if "NANOG" not in header:
+        return True
+    col = header.index("NANOG")
+
+    last = None
+    for row in reader:
+        nanog = int(row[col])
+        if last is not None and nanog < last:
+            reader.close()
+            return False
+        last = nanog
+
+    return True
+
+
+def nanog_groups(csv_in):
+    """nanog_groups - yields (nanog, list of rows) for each NANOG in csv_in, in
+    ascending NANOG order, rows in file order.  files already in NANOG order
+    (the scrapers' output) are streamed a NANOG at a time, anything else has
+    to be grouped in memory first.
+    """
+    if nanog_ordered(csv_in):
+        for (nanog, rows) in itertools.groupby(
+            iter_csv(csv_in), key=operator.attrgetter("nanog")
+        ):
+            yield (nanog, list(rows))
+        return
+
+    groups = {}
+    for row in iter_csv(csv_in):
+        groups.setdefault(row.nanog, []).append(row)
+    for nanog in sorted(groups):
+        yield (nanog, groups.pop(nanog))
+
+
+def dict_writer(stack, csv_out, fields):
+    """dict_writer - DictWriter for csv_out with the header written, the file
+    is closed along with stack (a contextlib.ExitStack).  returns None where
+    csv_out is None.
+    """
+    if csv_out is None:
+        return None
+
+    csvfile = stack.enter_context(open(csv_out, "w", newline=""))
+    writer = csv.DictWriter(csvfile, fieldnames=fields)
+    writer.writeheader()
+
+    return writer
+
+
+def record_writer(stack, csv_out, fields):
+    """record_writer - returns a callable writing a list of SpeakerRecords to
+    csv_out (CSV, or parquet / arrow, see nanog_columnar) as the given fields.
+    the file is closed along with stack, and the callable is None where csv_out
+    is None.
+    """
+    if csv_out is None:
+        return None
+
+    write_rows = nanog_columnar.table_writer(stack, csv_out, fields)
+    getter = nanog_records.row_getter(fields)
+
+    def write_records(records):
+        write_rows(map(getter, records))
+
+    return write_records
@@ -0,0 +1,405 @@
+import atexit
+import collections
+import contextlib
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+
+# nanog_trace.py
+#
+# per stage timing and counters for the scrapers, merge tools and transcript
+# fetcher.  with --timings a table of the wall time spent in each stage (file
+# read, html parse, table walk, row generation, fuzzy scoring, csv write,
+# network fetch, ...) is printed when the run finishes, --trace FILE also
+# writes every timed call as a chrome trace (chrome://tracing, perfetto).
+#
+# modules list the functions which make up a stage in TRACE_STAGES, a dict of
+# stage names keyed by function name.  the functions are only swapped for
+# timed wrappers once tracing has been switched on (see start()), so a run
+# without it calls the very same functions as before.  the odd block of code
+# which isn't a function of its own is timed with stage(), which hands back a
+# shared no-op context manager while tracing is off.
+#
+# stages nest, a stage's self time leaves out the time spent in the stages it
+# calls.  generator functions are timed each time they're resumed, so a stage
+# which streams its rows is charged for producing them, not for the time its
+# consumer takes.
+#
+
+# summary order for the common stages, anything else follows in name order
+STAGES = [
+    "file read",
+    "cache read",
+    "html parse",
+    "pdf extract",
+    "table walk",
+    "row generation",
+    "index build",
+    "fuzzy scoring",
+    "csv write",
+    "cache write",
+    "file write",
+    "rate limit",
+    "network fetch",
+]
+
+ENABLED = False
+
+# path for the chrome trace, None to only keep the totals
+TRACE_FILE = None
+
+# per stage totals: {"calls", "total", "self"}, times in seconds
+STAGE_TOTALS = {}
+
+# named counts (rows written, fuzzy matches, retries, etc.)
+COUNTS = collections.Counter()
+
+# chrome trace "complete" events, only kept with a TRACE_FILE
+EVENTS = []
+
+STARTED = None
+
+LOCK = threading.Lock()
+
+# the stages open in each thread, innermost last
+OPEN_STAGES = threading.local()
+
+NULL_STAGE = contextlib.nullcontext()
+
+
+def add_arguments(parser):
+    """add_arguments - adds the --timings and --trace options to an
+    argparse.ArgumentParser
+    """
+    parser.add_argument(
+        "--timings",
+        help="print the time spent in each stage (file read, html parse, etc.)",
+        dest="timings",
+        action="store_true",
+        required=False,
+    )
+    parser.add_argument(
+        "--trace",
+        help="write a chrome trace of the stages to TRACE (implies --timings)",
+        dest="trace_file",
+        action="store",
+        required=False,
+    )
+
+
+def start(args, *modules):
+    """start - switches tracing on if the command line asked for it, see
+    add_arguments().  the summary (and trace file) are written when the
+    process exits.
+
+    :args: parsed arguments
+    :modules: modules whose TRACE_STAGES functions are to be timed
+    :returns: whether tracing is on
+
+    """
+    if not (args.timings or args.trace_file):
+        return False
+
+    enable(args.trace_file)
+    for module in modules:
+        instrument(module)
+    atexit.register(finish)
+
+    return True
+
+
+def enable(trace_file=None):
+    """enable - switches tracing on, from here on stage(), wrap() and
+    instrument() time things.
+    """
+    global ENABLED, TRACE_FILE, STARTED
+    ENABLED = True
+    TRACE_FILE = trace_file
+    STARTED = time.perf_counter()
+
+
+def instrument(module):
+    """instrument - swaps each of the module's TRACE_STAGES functions for a
+    timed wrapper, see wrap().  calls made through the module's globals (or
+    module.function) are timed from here on.
+
+    :module: module, or a module's globals() dict
+
+    """
+    namespace = module
+    if not isinstance(namespace, dict):
+        namespace = vars(module)
+
+    for (name, stage_name) in namespace.get("TRACE_STAGES", {}).items():
+        namespace[name] = wrap(stage_name, namespace[name])
+
+
+def wrap(stage_name, func):
+    """wrap - timed version of func, charging its calls to stage_name.  func
+    is handed back as it is while tracing is off.  generator functions are
+    timed across each of their resumes.
+    """
+    if not ENABLED:
+        return func
+
+    if inspect.isgeneratorfunction(func):
+
+        @functools.wraps(func)
+        def traced_generator(*args, **kwargs):
+            rows = func(*args, **kwargs)
+            record_call(stage_name)
+            try:
+                while True:
+                    opened = enter(stage_name)
+                    try:
+                        row = next(rows)
+                    except StopIteration:
+                        return
+                    finally:
+                        leave(opened)
+                    yield row
+            finally:
+                rows.close()
+
+        return traced_generator
+
+    @functools.wraps(func)
+    def traced(*args, **kwargs):
+        record_call(stage_name)
+        opened = enter(stage_name)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            leave(opened)
+
+    return traced
+
+
+def stage(stage_name):
+    """stage - context manager timing a block of code as stage_name, a shared
+    no-op while tracing is off.
+    """
+    if not ENABLED:
+        return NULL_STAGE
+
+    return timed_stage(stage_name)
+
+
+@contextlib.contextmanager
+def timed_stage(stage_name):
+    """timed_stage - see stage()"""
+    record_call(stage_name)
+    opened = enter(stage_name)
+    try:
+        yield
+    finally:
+        leave(opened)
+
+
+def count(name, n=1):
+    """count - adds n to the named counter"""
+    if ENABLED:
+        with LOCK:
+            COUNTS[name] += n
+
+
+def counted(name, rows):
+    """counted - rows, counting each row taken from it under name.  rows is
+    handed back as it is while tracing is off.
+    """
+    if not ENABLED:
+        return rows
+
+    return count_rows(name, rows)
+
+
+def count_rows(name, rows):
+    """count_rows - see counted()"""
+    n = 0
+    try:
+        for row in rows:
+            n += 1
+            yield row
+    finally:
+        count(name, n)
+
+
+def record_call(stage_name):
+    """record_call - counts a call to stage_name"""
+    with LOCK:
+        totals = STAGE_TOTALS.setdefault(
+            stage_name, {"calls": 0, "total": 0.0, "self": 0.0}
+        )
+        totals["calls"] += 1
+
+
+def enter(stage_name):
+    """enter - opens stage_name in this thread, returns the open stage for
+    leave()
+    """
+    stack = getattr(OPEN_STAGES, "stack", None)
+    if stack is None:
+        stack = OPEN_STAGES.stack = []
+
+    # name, start time, time spent in nested stages
+    opened = [stage_name, time.perf_counter(), 0.0]
+    stack.append(opened)
+
+    return opened
+
+
+def leave(opened):
+    """leave - closes a stage opened with enter(), charging its time"""
+    end = time.perf_counter()
+    (stage_name, begin, nested) = opened
+    elapsed = end - begin
+
+    stack = OPEN_STAGES.stack
+    stack.pop()
+    if stack:
+        stack[-1][2] += elapsed
+
+    with LOCK:
+        totals = STAGE_TOTALS[stage_name]
+        totals["total"] += elapsed
+        totals["self"] += elapsed - nested
+        if TRACE_FILE is not None:
+            EVENTS.append(
+                {
+                    "name": stage_name,
+                    "cat": "stage",
+                    "ph": "X",
+                    "ts": begin * 1e6,
+                    "dur": elapsed * 1e6,
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                }
+            )
+
+
+def worker_settings():
+    """worker_settings - what a worker process needs to carry on tracing, for
+    init_worker().  None while tracing is off.
+    """
+    if not ENABLED:
+        return None
+
+    return {"trace_file": TRACE_FILE}
+
+
+def init_worker(settings, *modules):
+    """init_worker - switches tracing on in a worker process, from the
+    parent's worker_settings().  workers started with fork inherit it, those
+    started with spawn or forkserver import everything afresh with tracing
+    off.
+
+    :settings: worker_settings() from the parent
+    :modules: modules (or globals() dicts) whose TRACE_STAGES functions are to
+              be timed
+
+    """
+    if settings is None or ENABLED:
+        return
+
+    enable(settings["trace_file"])
+    for module in modules:
+        instrument(module)
+
+
+def take():
+    """take - hands over (and resets) this process's totals, counts and
+    events, for a worker process to return to its parent (see merge()).
+    None while tracing is off.
+    """
+    if not ENABLED:
+        return None
+
+    with LOCK:
+        taken = {
+            "stages": dict(STAGE_TOTALS),
+            "counts": dict(COUNTS),
+            "events": list(EVENTS),
+        }
+        STAGE_TOTALS.clear()
+        COUNTS.clear()
+        EVENTS.clear()
+
+    return taken
+
+
+def merge(taken):
+    """merge - adds a worker process's take() to this process's totals"""
+    if taken is None:
+        return
+
+    with LOCK:
+        for (stage_name, worker_totals) in taken["stages"].items():
+            totals = STAGE_TOTALS.setdefault(
+                stage_name, {"calls": 0, "total": 0.0, "self": 0.0}
+            )
+            for (k, v) in worker_totals.items():
+                totals[k] += v
+        COUNTS.update(taken["counts"])
+        EVENTS.extend(taken["events"])
+
+
+def stage_order(stage_name):
+    """stage_order - sort key putting the stages in STAGES order"""
+    if stage_name in STAGES:
+        return (STAGES.index(stage_name), "")
+
+    return (len(STAGES), stage_name)
+
+
+def print_summary(out=sys.stderr):
+    """print_summary - table of the calls and time taken by each stage, and the
+    counters.  self time leaves out any nested stages, the percentage is of
+    the wall time.  the stage times are summed across threads and worker
+    processes so they can add up to more than the wall time.
+    """
+    wall = time.perf_counter() - STARTED
+    print(f"stage timings ({wall:.3f}s wall):", file=out)
+    print(
+        f"  {'stage':<16} {'calls':>9} {'total s':>10} {'self s':>10} {'self %':>7}",
+        file=out,
+    )
+    for stage_name in sorted(STAGE_TOTALS, key=stage_order):
+        totals = STAGE_TOTALS[stage_name]
+        share = 100 * totals["self"] / wall if wall > 0 else 0.0
+        print(
+            f"  {stage_name:<16} {totals['calls']:>9} {totals['total']:>10.3f} "
+            f"{totals['self']:>10.3f} {share:>6.1f}%",
+            file=out,
+        )
+
+    if COUNTS:
+        print("counters:", file=out)
+        for (name, n) in sorted(COUNTS.items()):
+            print(f"  {name}: {n}", file=out)
+
+
+def write_trace(trace_file):
+    """write_trace - writes the stage events as a chrome trace (JSON object
+    format), the counters go along as metadata.
+    """
+    trace = {
+        "traceEvents": EVENTS,
+        "displayTimeUnit": "ms",
+        "otherData": {"counts": dict(COUNTS)},
+    }
+    with open(trace_file, "w", encoding="utf-8") as f:
+        json.dump(trace, f)
+
+
+def finish():
+    """finish - prints the summary and writes the trace file, registered with
+    atexit by start()
+    """
+    print_summary()
+    if TRACE_FILE is not None:
+        write_trace(TRACE_FILE)
+        print(f"trace written: {TRACE_FILE}", file=sys.stderr)
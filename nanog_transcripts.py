@@ -0,0 +1,346 @@
+import datetime
+import hashlib
+import json
+import sqlite3
+import zlib
+
+from youtube_transcript_api.formatters import TextFormatter
+
+# nanog_transcripts.py
+#
+# SQLite backed store for the youtube transcripts, in place of a directory
+# holding a text file per NANOG/video.
+#
+# - transcripts: one row per video id with the fetch status ("captured" or
+#   "unavailable"), fetch timestamp, transcript language and the error for
+#   unavailable transcripts.
+# - blobs: zlib compressed content, addressed by the sha256 of the
+#   uncompressed content.  captured transcripts reference the timed segments
+#   (JSON), or only the text for transcripts imported from a directory.
+#   a blob is deleted once a refetch leaves no transcript referencing it.
+# - video_nanogs: which NANOGs reference each video.
+# - video_talks: the agenda talks (NANOG, speaker, title) for each video.
+#   the NANOGs are stored as integers, so they sort numerically.
+# - segments_fts: FTS5 full-text index over the transcripts, a row per timed
+#   segment so that hits carry the offset into the video.  it's updated as
+#   transcripts are recorded; reindex() rebuilds it for stores created before
+#   the index existed.
+#
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS transcripts (
+    video_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    fetched TEXT NOT NULL,
+    language TEXT,
+    segments TEXT REFERENCES blobs (sha256),
+    text TEXT REFERENCES blobs (sha256),
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS video_nanogs (
+    video_id TEXT NOT NULL,
+    nanog INTEGER NOT NULL,
+    PRIMARY KEY (video_id, nanog)
+);
+CREATE TABLE IF NOT EXISTS video_talks (
+    video_id TEXT NOT NULL,
+    nanog INTEGER NOT NULL,
+    speaker TEXT NOT NULL,
+    title TEXT NOT NULL,
+    PRIMARY KEY (video_id, nanog, speaker, title)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5 (
+    text,
+    video_id UNINDEXED,
+    start UNINDEXED,
+    tokenize = 'porter unicode61'
+);
+"""
+
+CAPTURED = "captured"
+UNAVAILABLE = "unavailable"
+
+DEEP_LINK_BASE = "https://youtu.be/"
+
+
+def open_store(db_path):
+    """open_store - open (creating if need be) the transcript store"""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+
+    return conn
+
+
+def put_blob(conn, data):
+    """put_blob - store data, returns its content address"""
+    sha256 = hashlib.sha256(data).hexdigest()
+    conn.execute(
+        "INSERT OR IGNORE INTO blobs (sha256, data) VALUES (?, ?)",
+        (sha256, zlib.compress(data)),
+    )
+
+    return sha256
+
+
+def get_blob(conn, sha256):
+    """get_blob - returns the content stored under sha256"""
+    row = conn.execute("SELECT data FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+
+    return zlib.decompress(row["data"])
+
+
+def drop_blobs(conn, refs):
+    """drop_blobs - delete the blobs in refs which no transcript references
+    any longer.  blobs are shared between transcripts with the same content,
+    so they're only deleted once nothing points at them.
+    """
+    for sha256 in set(refs) - {None}:
+        conn.execute(
+            "DELETE FROM blobs WHERE sha256 = ? AND NOT EXISTS ("
+            "SELECT 1 FROM transcripts WHERE segments = ? OR text = ?)",
+            (sha256, sha256, sha256),
+        )
+
+
+def has_transcript(conn, video_id):
+    """has_transcript - is there an entry (captured or not) for video_id"""
+    row = conn.execute(
+        "SELECT 1 FROM transcripts WHERE video_id = ?", (video_id,)
+    ).fetchone()
+
+    return row is not None
+
+
+def link_nanogs(conn, video_id, nanogs):
+    """link_nanogs - note the NANOGs which reference video_id"""
+    conn.executemany(
+        "INSERT OR IGNORE INTO video_nanogs (video_id, nanog) VALUES (?, ?)",
+        [(video_id, int(nanog)) for nanog in nanogs],
+    )
+
+
+def link_talks(conn, video_id, talks):
+    """link_talks - note the agenda talks for video_id
+
+    :conn: transcript store
+    :video_id: youtube video id
+    :talks: list of (NANOG, speaker, title) tuples
+    :returns: nothing
+
+    """
+    conn.executemany(
+        "INSERT OR IGNORE INTO video_talks (video_id, nanog, speaker, title) "
+        "VALUES (?, ?, ?, ?)",
+        [(video_id, int(nanog), speaker, title) for (nanog, speaker, title) in talks],
+    )
+
+
+def index_transcript(conn, video_id, segments=None, text=None):
+    """index_transcript - replace the search index entries for video_id.  timed
+    segments are indexed a row per segment, transcripts with only text (no
+    timings) a row per line.
+
+    :conn: transcript store
+    :video_id: youtube video id
+    :segments: list of the timed transcript segments
+    :text: transcript text, where there are no segments
+    :returns: nothing
+
+    """
+    conn.execute("DELETE FROM segments_fts WHERE video_id = ?", (video_id,))
+
+    if segments is not None:
+        rows = [(s["text"], video_id, s["start"]) for s in segments]
+    elif text is not None:
+        rows = [(line, video_id, None) for line in text.splitlines() if line.strip()]
+    else:
+        rows = []
+
+    conn.executemany(
+        "INSERT INTO segments_fts (text, video_id, start) VALUES (?, ?, ?)", rows
+    )
+
+
+def reindex(conn):
+    """reindex - rebuild the search index from the stored transcripts, returns
+    the number of transcripts indexed.
+    """
+    conn.execute("DELETE FROM segments_fts")
+
+    indexed = 0
+    for entry in conn.execute(
+        "SELECT * FROM transcripts WHERE status = ? ORDER BY video_id", (CAPTURED,)
+    ).fetchall():
+        segments = transcript_segments(conn, entry)
+        text = None
+        if segments is None:
+            text = transcript_text(conn, entry)
+        index_transcript(conn, entry["video_id"], segments=segments, text=text)
+        indexed += 1
+    conn.commit()
+
+    return indexed
+
+
+def record_transcript(
+    conn,
+    video_id,
+    nanogs,
+    status,
+    segments=None,
+    text=None,
+    language=None,
+    error=None,
+    fetched=None,
+):
+    """record_transcript - add or replace the entry for video_id, deleting
+    any of the replaced entry's blobs which are no longer referenced
+
+    :conn: transcript store
+    :video_id: youtube video id
+    :nanogs: list of the NANOGs referencing the video
+    :status: CAPTURED or UNAVAILABLE
+    :segments: list of the timed transcript segments
+    :text: formatted transcript text, where there are no segments
+    :language: transcript language code
+    :error: error details for unavailable transcripts
+    :fetched: ISO 8601 fetch timestamp, defaults to now
+    :returns: nothing
+
+    """
+    if fetched is None:
+        fetched = datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+    segments_ref = None
+    if segments is not None:
+        segments_ref = put_blob(conn, json.dumps(segments).encode("utf-8"))
+
+    text_ref = None
+    if text is not None:
+        text_ref = put_blob(conn, text.encode("utf-8"))
+
+    old = conn.execute(
+        "SELECT segments, text FROM transcripts WHERE video_id = ?", (video_id,)
+    ).fetchone()
+
+    conn.execute(
+        "INSERT OR REPLACE INTO transcripts "
+        "(video_id, status, fetched, language, segments, text, error) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (video_id, status, fetched, language, segments_ref, text_ref, error),
+    )
+    if old is not None:
+        drop_blobs(conn, [old["segments"], old["text"]])
+    link_nanogs(conn, video_id, nanogs)
+    if status == CAPTURED:
+        index_transcript(conn, video_id, segments=segments, text=text)
+    else:
+        index_transcript(conn, video_id)
+    conn.commit()
+
+    return
+
+
+def transcript_segments(conn, entry):
+    """transcript_segments - timed segments for a transcripts row, or None for
+    entries that only have text.
+    """
+    if entry["segments"] is None:
+        return None
+
+    return json.loads(get_blob(conn, entry["segments"]))
+
+
+def transcript_text(conn, entry):
+    """transcript_text - formatted text for a transcripts row, the same as the
+    directory layout's transcript files.
+    """
+    if entry["text"] is not None:
+        return get_blob(conn, entry["text"]).decode("utf-8")
+    if entry["segments"] is not None:
+        return TextFormatter().format_transcript(transcript_segments(conn, entry))
+
+    return ""
+
+
+def iter_transcripts(conn):
+    """iter_transcripts - yields (transcripts row, list of NANOGs) for every
+    video in the store, ordered by video id.
+    """
+    for entry in conn.execute("SELECT * FROM transcripts ORDER BY video_id"):
+        nanogs = [
+            r["nanog"]
+            for r in conn.execute(
+                "SELECT nanog FROM video_nanogs WHERE video_id = ? ORDER BY nanog",
+                (entry["video_id"],),
+            )
+        ]
+        yield (entry, nanogs)
+
+
+def deep_link(video_id, start=None):
+    """deep_link - youtube link to video_id, starting start seconds in"""
+    if start is None:
+        return DEEP_LINK_BASE + video_id
+
+    return DEEP_LINK_BASE + video_id + "?t=" + str(int(start))
+
+
+def video_talks(conn, video_id):
+    """video_talks - the (NANOG, speaker, title) talks for video_id.  videos
+    without any talk details fall back to their NANOGs, with a blank speaker
+    and title.
+    """
+    talks = [
+        (r["nanog"], r["speaker"], r["title"])
+        for r in conn.execute(
+            "SELECT nanog, speaker, title FROM video_talks WHERE video_id = ? "
+            "ORDER BY nanog, title, speaker",
+            (video_id,),
+        )
+    ]
+    if talks:
+        return talks
+
+    return [
+        (r["nanog"], "", "")
+        for r in conn.execute(
+            "SELECT nanog FROM video_nanogs WHERE video_id = ? ORDER BY nanog",
+            (video_id,),
+        )
+    ]
+
+
+def search(conn, query, limit=20):
+    """search - full-text search over the transcript segments
+
+    :conn: transcript store
+    :query: FTS5 query, e.g. 'flowspec' or '"segment routing" NOT srv6'
+    :limit: max number of hits to return
+    :returns: list of hit dicts, best match first, with the video_id, start
+              offset (seconds, None for untimed transcripts), deep link,
+              matching segment text and the talks for the video
+
+    """
+    hits = []
+    for r in conn.execute(
+        "SELECT video_id, start, text FROM segments_fts "
+        "WHERE segments_fts MATCH ? ORDER BY rank LIMIT ?",
+        (query, limit),
+    ):
+        hits.append(
+            {
+                "video_id": r["video_id"],
+                "start": r["start"],
+                "link": deep_link(r["video_id"], r["start"]),
+                "text": r["text"],
+                "talks": video_talks(conn, r["video_id"]),
+            }
+        )
+
+    return hits
@@ -0,0 +1,28 @@
+import re
+
+# nanog_youtube.py
+#
+# the agendas reference the same video in a number of forms (youtu.be/ID,
+# youtu.be/ID?list=..., youtube.com/watch?v=ID&index=..., etc.).  these reduce
+# them to the video id, or a single canonical URL.
+#
+
+VIDEO_ID_RE = re.compile(r"(?:v=|be/)(.*?)(?:\&|\?|$)")
+
+
+def video_id(url):
+    """video_id - returns the youtube video id for url, or None if it's not a
+    youtube URL we recognize.
+    """
+    m = VIDEO_ID_RE.search(url.strip())
+
+    if m and m.group(1) != "":
+        return m.group(1)
+
+
+def normalize_youtube(url):
+    """normalize_youtube - returns the canonical URL for a youtube video"""
+    vid = video_id(url)
+
+    if vid:
+        return "http://youtube.com/watch?v=" + vid
@@ -0,0 +1,26 @@
+import importlib.util
+import os.path
+import sys
+
+# conftest.py
+#
+# shared set up for the tests: the repo's modules are importable, and
+# load_script() imports the hyphenated scripts (nanog-agenda.py, etc.).
+#
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+
+def load_script(name):
+    """load_script - import one of the repo's (hyphenated) scripts as a module"""
+    path = os.path.join(REPO_DIR, name)
+    spec = importlib.util.spec_from_file_location(
+        name.replace("-", "_").removesuffix(".py"), path
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
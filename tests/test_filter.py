@@ -0,0 +1,27 @@
+import nanog_filter
+
+# test_filter.py
+#
+# the agenda skip rules keep the meaning of the regexes they replaced: ^ and $
+# anchor to the whole title / speaker, not to each line of it.
+#
+
+SKIP_RULES = nanog_filter.compile_rules(nanog_filter.load_rules())
+
+
+def test_anchors_match_whole_text():
+    assert nanog_filter.match_rule(SKIP_RULES, "title", "Lunch") == "lunch"
+    assert nanog_filter.match_rule(SKIP_RULES, "title", "Social at the pub") == "social"
+    assert nanog_filter.match_rule(SKIP_RULES, "speaker", "Sponsor") == "sponsor"
+
+    assert nanog_filter.match_rule(SKIP_RULES, "title", "BGP\nlunch") is None
+    assert nanog_filter.match_rule(SKIP_RULES, "title", "Peering\nsocial") is None
+    assert nanog_filter.match_rule(SKIP_RULES, "speaker", "Jane Doe\nsponsor") is None
+
+
+def test_unanchored_patterns_match_anywhere():
+    assert nanog_filter.match_rule(SKIP_RULES, "title", "Coffee Break") == "break"
+    assert nanog_filter.match_rule(SKIP_RULES, "speaker", "On your own") == (
+        "on-your-own"
+    )
+    assert nanog_filter.match_rule(SKIP_RULES, "title", "Routing security") is None
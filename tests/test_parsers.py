@@ -0,0 +1,86 @@
+import os.path
+
+import pytest
+
+import nanog_batch
+import nanog_html
+import nanog_layouts
+from conftest import REPO_DIR, load_script
+
+# test_parsers.py
+#
+# every bs4 tree builder in nanog_html.PARSERS has to produce the same rows
+# over the checked-in agendas/ and attendees/ corpus, html.parser being the
+# reference.
+#
+
+AGENDA = load_script("nanog-agenda.py")
+ATTENDEES = load_script("nanog-attendees.py")
+
+URL_BASE = "archive.nanog.org"
+
+AGENDA_FILES = nanog_batch.find_nanog_files(
+    os.path.join(REPO_DIR, "agendas"), AGENDA.AGENDA_FILE_RE, range(1000)
+)
+
+# the pdf lists go through tabula-java rather than bs4
+ATTENDEE_FILES = {
+    nanog: path
+    for (nanog, path) in nanog_batch.find_nanog_files(
+        os.path.join(REPO_DIR, "attendees"), ATTENDEES.ATTENDEES_FILE_RE, range(1000)
+    ).items()
+    if nanog_layouts.resolve(ATTENDEES.ATTENDEE_LAYOUTS, nanog)["format"] == "html"
+}
+
+
+def installed(parser):
+    """installed - pytest param for parser, skipped when it isn't installed"""
+    if parser == "html.parser":
+        return pytest.param(parser)
+
+    try:
+        __import__(parser)
+    except ImportError:
+        return pytest.param(
+            parser, marks=pytest.mark.skip(reason=f"{parser} isn't installed")
+        )
+
+    return pytest.param(parser)
+
+
+BACKENDS = [installed(p) for p in nanog_html.PARSERS if p != "html.parser"]
+
+
+def agenda_rows(nanog, parser):
+    return list(
+        AGENDA.get_agenda_tables(
+            AGENDA_FILES[nanog], nanog, URL_BASE, AGENDA.ORIGIN, parser
+        )
+    )
+
+
+def attendee_rows(nanog, parser):
+    layout = nanog_layouts.resolve(ATTENDEES.ATTENDEE_LAYOUTS, nanog)
+
+    return ATTENDEES.get_attendees_table(ATTENDEE_FILES[nanog], nanog, layout, parser)
+
+
+def test_corpus_present():
+    assert len(AGENDA_FILES) > 50
+    assert len(ATTENDEE_FILES) > 40
+
+
+@pytest.mark.parametrize("parser", BACKENDS)
+@pytest.mark.parametrize("nanog", sorted(AGENDA_FILES))
+def test_agenda_backends_agree(nanog, parser):
+    reference = agenda_rows(nanog, "html.parser")
+
+    assert agenda_rows(nanog, parser) == reference
+
+
+@pytest.mark.parametrize("parser", BACKENDS)
+@pytest.mark.parametrize("nanog", sorted(ATTENDEE_FILES))
+def test_attendee_backends_agree(nanog, parser):
+    reference = attendee_rows(nanog, "html.parser")
+
+    assert attendee_rows(nanog, parser) == reference
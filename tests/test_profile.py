@@ -0,0 +1,192 @@
+import json
+import multiprocessing
+import os.path
+import pstats
+import subprocess
+import sys
+
+import pytest
+
+from conftest import REPO_DIR
+from test_trace import START_METHOD_RUNNER
+
+# test_profile.py
+#
+# --profile covers the work handed to the transcript fetcher's threads and
+# the agenda --jobs worker processes, whichever way the workers are started.
+# the profiler is process wide, so it's only ever started in a subprocess.
+#
+
+AGENDA = os.path.join(REPO_DIR, "nanog-agenda.py")
+TRANSCRIPTS = os.path.join(REPO_DIR, "nanog-get-youtube-transcript.py")
+
+# profiles call()s made from a thread pool and a process pool started with
+# the method in argv[1] (only the standard library, so it runs on any python)
+CALL_RUNNER = """
+import argparse, concurrent.futures, multiprocessing, sys
+sys.path.insert(0, sys.argv[3])
+import nanog_profile
+
+def work(n):
+    return sum(i * i for i in range(n))
+
+def task(n):
+    return (nanog_profile.call(work, n), nanog_profile.take())
+
+if __name__ == "__main__":
+    multiprocessing.set_start_method(sys.argv[1])
+    nanog_profile.start(argparse.Namespace(profile="cprofile"), sys.argv[2], "x")
+    with concurrent.futures.ThreadPoolExecutor(4) as pool:
+        list(pool.map(lambda n: nanog_profile.call(work, n), [10000] * 8))
+    with multiprocessing.Pool(
+        2,
+        initializer=nanog_profile.init_worker,
+        initargs=(nanog_profile.worker_settings(),),
+    ) as pool:
+        for (_, taken) in pool.imap(task, [10000] * 4):
+            nanog_profile.merge(taken)
+"""
+
+
+def profiled_functions(profile_file):
+    """profiled_functions - dict of call counts keyed by function name for a
+    cProfile profile, or of sample counts for a folded (sampling) one
+    """
+    functions = {}
+    if profile_file.endswith(".prof"):
+        for ((_, _, name), stat) in pstats.Stats(profile_file).stats.items():
+            functions[name] = functions.get(name, 0) + stat[1]
+        return functions
+
+    with open(profile_file, encoding="utf-8") as f:
+        for line in f:
+            (stack, n) = line.rsplit(" ", 1)
+            for frame in set(stack.split(";")):
+                name = frame.split(" ")[0]
+                functions[name] = functions.get(name, 0) + int(n)
+
+    return functions
+
+
+@pytest.mark.parametrize("start_method", multiprocessing.get_all_start_methods())
+def test_call_nested_in_cprofile(tmp_path, start_method):
+    runner = tmp_path / "runner.py"
+    runner.write_text(CALL_RUNNER)
+    subprocess.run(
+        [
+            sys.executable,
+            str(runner),
+            start_method,
+            str(tmp_path / "out.csv"),
+            REPO_DIR,
+        ],
+        cwd=tmp_path,
+        check=True,
+        capture_output=True,
+    )
+
+    # 8 calls from the threads, 4 from the worker processes
+    assert profiled_functions(str(tmp_path / "out.prof"))["work"] == 12
+
+
+@pytest.mark.parametrize("profiler", ["cprofile", "sampling"])
+def test_transcript_threads_profiled(tmp_path, profiler):
+    stubs = tmp_path / "stubs"
+    stubs.mkdir()
+    with open(tmp_path / "talks.csv", "w") as f:
+        for n in range(12):
+            f.write(f"70,speaker,org,talk {n},https://youtu.be/vid{n:04}\n")
+            segments = [{"text": "x " * 20000, "start": 0.0, "duration": 1.0}]
+            (stubs / f"vid{n:04}.json").write_text(json.dumps(segments))
+    outdir = tmp_path / "out"
+    outdir.mkdir()
+
+    subprocess.run(
+        [
+            sys.executable,
+            TRANSCRIPTS,
+            str(tmp_path / "talks.csv"),
+            "--outdir",
+            str(outdir),
+            "--stub-dir",
+            str(stubs),
+            "--workers",
+            "4",
+            "--rate",
+            "1000",
+            f"--profile={profiler}",
+        ],
+        cwd=tmp_path,
+        check=True,
+        capture_output=True,
+    )
+
+    extension = {"cprofile": ".prof", "sampling": ".folded"}[profiler]
+    functions = profiled_functions(
+        str(outdir / ("nanog-get-youtube-transcript" + extension))
+    )
+    if profiler == "cprofile":
+        assert functions["getYoutubeTranscript"] == 12
+    else:
+        assert "main" in functions
+
+
+@pytest.mark.parametrize("profiler", ["cprofile", "sampling"])
+@pytest.mark.parametrize("start_method", multiprocessing.get_all_start_methods())
+def test_agenda_workers_profiled(tmp_path, start_method, profiler):
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            START_METHOD_RUNNER,
+            start_method,
+            AGENDA,
+            "--range",
+            "13-20",
+            "--glob",
+            os.path.join(REPO_DIR, "agendas"),
+            "--url",
+            "archive.nanog.org",
+            "--csv",
+            str(tmp_path / "agendas.csv"),
+            "--no-cache",
+            "--jobs",
+            "2",
+            f"--profile={profiler}",
+        ],
+        cwd=tmp_path,
+        check=True,
+        capture_output=True,
+    )
+
+    extension = {"cprofile": ".prof", "sampling": ".folded"}[profiler]
+    functions = profiled_functions(str(tmp_path / ("agendas" + extension)))
+
+    # the agendas are only parsed in the workers
+    if profiler == "cprofile":
+        assert functions["load_soup"] == 8
+    else:
+        assert functions.get("process_agenda_table", 0) > 0
+
+
+def test_batch_profile_named_after_default_csv(tmp_path):
+    subprocess.run(
+        [
+            sys.executable,
+            AGENDA,
+            "--range",
+            "13-14",
+            "--glob",
+            os.path.join(REPO_DIR, "agendas"),
+            "--url",
+            "archive.nanog.org",
+            "--no-cache",
+            "--profile",
+        ],
+        cwd=tmp_path,
+        check=True,
+        capture_output=True,
+    )
+
+    # no --csv, so the profile goes alongside the agendas-13-14.csv default
+    assert sorted(os.listdir(tmp_path)) == ["agendas-13-14.csv", "agendas-13-14.prof"]
@@ -0,0 +1,85 @@
+import json
+import multiprocessing
+import os.path
+import subprocess
+import sys
+
+import pytest
+
+import nanog_trace
+from conftest import REPO_DIR
+
+# test_trace.py
+#
+# nanog_trace is a no-op until it's switched on, and the agenda --jobs workers
+# hand their stage timings back whichever way they're started.  tracing is
+# only ever switched on in a subprocess, it's process wide.
+#
+
+AGENDA = os.path.join(REPO_DIR, "nanog-agenda.py")
+
+# runs a script (argv[2:]) with the multiprocessing start method in argv[1]
+START_METHOD_RUNNER = """
+import multiprocessing, os, runpy, sys
+multiprocessing.set_start_method(sys.argv[1])
+sys.argv = sys.argv[2:]
+sys.path.insert(0, os.path.dirname(sys.argv[0]))
+runpy.run_path(sys.argv[0], run_name="__main__")
+"""
+
+
+def test_disabled_is_a_no_op():
+    assert not nanog_trace.ENABLED
+
+    def parse():
+        pass
+
+    assert nanog_trace.wrap("html parse", parse) is parse
+    assert nanog_trace.stage("html parse") is nanog_trace.NULL_STAGE
+    rows = iter([])
+    assert nanog_trace.counted("rows written", rows) is rows
+    assert nanog_trace.take() is None
+
+
+@pytest.mark.parametrize("start_method", multiprocessing.get_all_start_methods())
+def test_agenda_workers_timed(tmp_path, start_method):
+    trace_file = tmp_path / "trace.json"
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            START_METHOD_RUNNER,
+            start_method,
+            AGENDA,
+            "--range",
+            "13-20",
+            "--glob",
+            os.path.join(REPO_DIR, "agendas"),
+            "--url",
+            "archive.nanog.org",
+            "--csv",
+            str(tmp_path / "agendas.csv"),
+            "--no-cache",
+            "--jobs",
+            "2",
+            "--trace",
+            str(trace_file),
+        ],
+        cwd=tmp_path,
+        check=True,
+        capture_output=True,
+    )
+
+    with open(trace_file, encoding="utf-8") as f:
+        trace = json.load(f)
+
+    events = {}
+    for event in trace["traceEvents"]:
+        events.setdefault(event["name"], set()).add(event["pid"])
+
+    # 8 agendas parsed (and walked) in the workers, written out by the parent
+    html_parse = [e for e in trace["traceEvents"] if e["name"] == "html parse"]
+    assert len(html_parse) == 8
+    assert "table walk" in events and "row generation" in events
+    assert events["csv write"].isdisjoint(events["html parse"])
+    assert trace["otherData"]["counts"]["rows written"] > 0
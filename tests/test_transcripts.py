@@ -0,0 +1,247 @@
+import collections
+import csv
+import json
+import os
+import os.path
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+from youtube_transcript_api import _errors
+
+from conftest import REPO_DIR, load_script
+
+# test_transcripts.py
+#
+# the transcript fetcher against the local stub provider (--stub-dir), and a
+# flaky one that fails with TooManyRequests before it gives up the transcript.
+#
+
+TRANSCRIPTS = load_script("nanog-get-youtube-transcript.py")
+
+SCRIPT = os.path.join(REPO_DIR, "nanog-get-youtube-transcript.py")
+
+SEGMENTS = [
+    {"text": "welcome to nanog", "start": 0.0, "duration": 2.0},
+    {"text": "next up, bgp", "start": 2.0, "duration": 3.0},
+]
+
+# (NANOG, video id, stubbed).  vid0002 shows up at two meetings.
+VIDEOS = [
+    (70, "vid0000", True),
+    (70, "vid0001", False),
+    (71, "vid0002", True),
+    (72, "vid0002", True),
+    (72, "vid0003", True),
+    (73, "vid0004", False),
+    (73, "vid0005", True),
+    (74, "vid0006", True),
+]
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(TRANSCRIPTS, "BACKOFF", 0.0)
+
+
+@pytest.fixture
+def stub_dir(tmp_path):
+    stubs = tmp_path / "stubs"
+    stubs.mkdir()
+    for (_, vid, stubbed) in VIDEOS:
+        if stubbed:
+            (stubs / f"{vid}.json").write_text(
+                json.dumps([dict(s, text=f"{vid}: {s['text']}") for s in SEGMENTS])
+            )
+
+    return stubs
+
+
+@pytest.fixture
+def talks_csv(tmp_path):
+    path = tmp_path / "talks.csv"
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        for (nanog, vid, _) in VIDEOS:
+            writer.writerow(
+                [nanog, "speaker", "org", f"talk {vid}", f"https://youtu.be/{vid}"]
+            )
+
+    return path
+
+
+def counting(provider):
+    """counting - provider, counting its calls per video id in .calls"""
+    calls = collections.Counter()
+
+    def get_transcript(video_id):
+        calls[video_id] += 1
+        return provider(video_id)
+
+    get_transcript.calls = calls
+
+    return get_transcript
+
+
+def flaky_provider(failures):
+    """flaky_provider - serves SEGMENTS after failing each video's first
+    failures requests with TooManyRequests
+    """
+    calls = collections.Counter()
+
+    def get_transcript(video_id):
+        calls[video_id] += 1
+        if calls[video_id] <= failures:
+            raise _errors.TooManyRequests(video_id)
+        return (SEGMENTS, "en")
+
+    get_transcript.calls = calls
+
+    return get_transcript
+
+
+def run_fetcher(cwd, talks_csv, stub_dir, outdir, workers):
+    os.makedirs(outdir)
+    subprocess.run(
+        [
+            sys.executable,
+            SCRIPT,
+            str(talks_csv),
+            "--outdir",
+            str(outdir),
+            "--stub-dir",
+            str(stub_dir),
+            "--workers",
+            str(workers),
+        ],
+        cwd=cwd,
+        check=True,
+    )
+
+
+def transcript_files(outdir):
+    """transcript_files - dict of the captured transcripts' contents, and the
+    error files (tracebacks, so just the names)
+    """
+    files = {}
+    for name in sorted(os.listdir(outdir)):
+        if name.startswith("errors-"):
+            files[name] = None
+        else:
+            with open(os.path.join(outdir, name), encoding="utf-8") as f:
+                files[name] = f.read()
+
+    return files
+
+
+def test_workers_match_serial(tmp_path, talks_csv, stub_dir):
+    run_fetcher(tmp_path, talks_csv, stub_dir, tmp_path / "serial", 1)
+    run_fetcher(tmp_path, talks_csv, stub_dir, tmp_path / "workers", 4)
+
+    serial = transcript_files(tmp_path / "serial")
+    assert serial == transcript_files(tmp_path / "workers")
+
+    # a file per (NANOG, video), errors for the videos without a stub
+    assert len(serial) == len(VIDEOS)
+    for (nanog, vid, stubbed) in VIDEOS:
+        if stubbed:
+            assert f"{vid}: welcome to nanog" in serial[f"nanog-{nanog}-{vid}.txt"]
+        else:
+            assert f"errors-{nanog}-{vid}.txt" in serial
+
+
+def test_rerun_skips_existing(tmp_path, stub_dir):
+    provider = counting(TRANSCRIPTS.stub_provider(str(stub_dir)))
+    for vid in ["vid0000", "vid0001"]:
+        TRANSCRIPTS.getYoutubeTranscript(
+            str(tmp_path), [70], vid, f"https://youtu.be/{vid}", provider
+        )
+    assert os.path.exists(tmp_path / "nanog-70-vid0000.txt")
+    assert os.path.exists(tmp_path / "errors-70-vid0001.txt")
+
+    provider.calls.clear()
+    messages = []
+    for vid in ["vid0000", "vid0001"]:
+        messages += TRANSCRIPTS.getYoutubeTranscript(
+            str(tmp_path), [70], vid, f"https://youtu.be/{vid}", provider
+        )
+
+    assert not provider.calls
+    assert messages[0].startswith("transcript previously captured: vid0000")
+    assert messages[1].startswith("error transcript previously unavailable: vid0001")
+
+
+def test_transient_errors_retried(tmp_path):
+    provider = flaky_provider(TRANSCRIPTS.RETRIES)
+    messages = TRANSCRIPTS.getYoutubeTranscript(
+        str(tmp_path), [70, 71], "vid0000", "https://youtu.be/vid0000", provider
+    )
+
+    # fetched once for both NANOGs, after RETRIES failures
+    assert provider.calls["vid0000"] == TRANSCRIPTS.RETRIES + 1
+    assert sorted(os.listdir(tmp_path)) == [
+        "nanog-70-vid0000.txt",
+        "nanog-71-vid0000.txt",
+    ]
+    assert all(m.startswith("captured transcript:") for m in messages)
+
+
+def test_transient_errors_leave_no_error_file(tmp_path):
+    provider = flaky_provider(TRANSCRIPTS.RETRIES + 1)
+    messages = TRANSCRIPTS.getYoutubeTranscript(
+        str(tmp_path), [70], "vid0000", "https://youtu.be/vid0000", provider
+    )
+
+    # out of retries, nothing is written so the next run tries again
+    assert provider.calls["vid0000"] == TRANSCRIPTS.RETRIES + 1
+    assert os.listdir(tmp_path) == []
+    assert messages == [
+        "transient error capturing transcript: vid0000 TooManyRequests - "
+        "https://youtu.be/vid0000"
+    ]
+
+    messages = TRANSCRIPTS.getYoutubeTranscript(
+        str(tmp_path), [70], "vid0000", "https://youtu.be/vid0000", provider
+    )
+    assert os.listdir(tmp_path) == ["nanog-70-vid0000.txt"]
+
+
+def test_token_bucket_rate():
+    limiter = TRANSCRIPTS.TokenBucket(50, burst=1)
+
+    begin = time.monotonic()
+    for _ in range(11):
+        limiter.acquire()
+
+    # the first token is there already, the other 10 come at 50 per second
+    assert time.monotonic() - begin >= 10 / 50 * 0.95
+
+
+def test_token_bucket_shared_across_threads():
+    limiter = TRANSCRIPTS.TokenBucket(50, burst=4)
+
+    def acquire():
+        for _ in range(6):
+            limiter.acquire()
+
+    begin = time.monotonic()
+    threads = [threading.Thread(target=acquire) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 24 requests, the burst of 4 up front and 20 more at 50 per second
+    assert time.monotonic() - begin >= 20 / 50 * 0.95
+
+
+def test_token_bucket_burst():
+    limiter = TRANSCRIPTS.TokenBucket(1, burst=5)
+
+    begin = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+
+    assert time.monotonic() - begin < 0.5